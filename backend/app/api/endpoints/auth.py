@@ -9,23 +9,27 @@ from app.core.auth import (
     get_password_hash,
     verify_password,
     create_access_token,
-    get_current_user
+    get_current_user,
+    user_cache,
+    user_claims
 )
 from app.core.config import get_settings
-from app.core.database import get_supabase_client
+from supabase import AsyncClient
+from app.core.database import get_auth_client
 
 router = APIRouter(prefix="/auth", tags=["认证"])
 settings = get_settings()
 
 
 @router.post("/register", response_model=Token)
-async def register(user_data: UserCreate):
+async def register(
+    user_data: UserCreate,
+    supabase: AsyncClient = Depends(get_auth_client)
+):
     """用户注册"""
-    supabase = get_supabase_client()
-    
     try:
         # 使用Supabase Auth创建用户
-        response = supabase.auth.sign_up({
+        response = await supabase.auth.sign_up({
             "email": user_data.email,
             "password": user_data.password
         })
@@ -38,7 +42,7 @@ async def register(user_data: UserCreate):
         
         # 创建访问令牌
         access_token = create_access_token(
-            data={"sub": str(response.user.id)},
+            data=user_claims(response.user),
             expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
         )
         
@@ -64,13 +68,14 @@ async def register(user_data: UserCreate):
 
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    supabase: AsyncClient = Depends(get_auth_client)
+):
     """用户登录"""
-    supabase = get_supabase_client()
-    
     try:
         # 使用Supabase Auth登录
-        response = supabase.auth.sign_in_with_password({
+        response = await supabase.auth.sign_in_with_password({
             "email": form_data.username,  # OAuth2PasswordRequestForm使用username字段
             "password": form_data.password
         })
@@ -84,7 +89,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         
         # 创建访问令牌
         access_token = create_access_token(
-            data={"sub": str(response.user.id)},
+            data=user_claims(response.user),
             expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
         )
         
@@ -111,13 +116,14 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 
 @router.post("/logout", response_model=MessageResponse)
-async def logout(current_user=Depends(get_current_user)):
+async def logout(
+    current_user: User = Depends(get_current_user),
+    supabase: AsyncClient = Depends(get_auth_client)
+):
     """用户登出"""
-    supabase = get_supabase_client()
-    
     try:
         # Supabase登出
-        supabase.auth.sign_out()
+        await supabase.auth.sign_out()
         
         return MessageResponse(
             message="登出成功",
@@ -132,34 +138,24 @@ async def logout(current_user=Depends(get_current_user)):
 
 
 @router.get("/me", response_model=User)
-async def get_me(current_user=Depends(get_current_user)):
+async def get_me(current_user: User = Depends(get_current_user)):
     """获取当前用户信息"""
-    return User(
-        id=current_user.id,
-        email=current_user.email,
-        created_at=current_user.created_at
-    )
+    return current_user
 
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(current_user=Depends(get_current_user)):
+async def refresh_token(current_user: User = Depends(get_current_user)):
     """刷新访问令牌"""
     # 创建新的访问令牌
     access_token = create_access_token(
-        data={"sub": str(current_user.id)},
+        data=user_claims(current_user),
         expires_delta=timedelta(minutes=settings.access_token_expire_minutes)
     )
     
-    user = User(
-        id=current_user.id,
-        email=current_user.email,
-        created_at=current_user.created_at
-    )
-    
     return Token(
         access_token=access_token,
         token_type="bearer",
-        user=user
+        user=current_user
     )
 
 
@@ -167,15 +163,14 @@ async def refresh_token(current_user=Depends(get_current_user)):
 async def change_password(
     old_password: str,
     new_password: str,
-    current_user=Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    supabase: AsyncClient = Depends(get_auth_client)
 ):
     """修改密码"""
-    supabase = get_supabase_client()
-    
     # 验证旧密码
     try:
         # 尝试用旧密码登录来验证
-        supabase.auth.sign_in_with_password({
+        await supabase.auth.sign_in_with_password({
             "email": current_user.email,
             "password": old_password
         })
@@ -187,7 +182,7 @@ async def change_password(
     
     # 更新密码
     try:
-        response = supabase.auth.update_user({
+        response = await supabase.auth.update_user({
             "password": new_password
         })
         
@@ -196,6 +191,7 @@ async def change_password(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="密码修改失败"
             )
+        user_cache.invalidate(str(current_user.id))
         
         return MessageResponse(
             message="密码修改成功",
@@ -211,13 +207,14 @@ async def change_password(
 
 
 @router.post("/forgot-password", response_model=MessageResponse)
-async def forgot_password(email: str):
+async def forgot_password(
+    email: str,
+    supabase: AsyncClient = Depends(get_auth_client)
+):
     """发送密码重置邮件"""
-    supabase = get_supabase_client()
-    
     try:
         # 发送密码重置邮件
-        supabase.auth.reset_password_email(email)
+        await supabase.auth.reset_password_email(email)
         
         return MessageResponse(
             message="密码重置邮件已发送，请查收",
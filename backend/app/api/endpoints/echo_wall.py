@@ -1,89 +1,62 @@
 """
 回音壁API端点
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
+from fastapi import (
+    APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response,
+    WebSocket, WebSocketDisconnect, status
+)
+from typing import List, Optional, Tuple
 from uuid import UUID
-import random
+import hashlib
+import json
+import time
 from datetime import datetime, timedelta
 from app.schemas import (
     EchoWall,
     EchoWallCreate,
     EchoMatch,
-    MessageResponse
+    MessageResponse,
+    PublicEchoWall
 )
 from app.core.auth import get_current_user_id
-from app.core.database import get_supabase_client
+from app.core.cache import ResponseCache, get_response_cache
+from app.core.config import get_settings
+from app.core.pagination import SINCE_CURSOR_HEADER, decode_cursor, paginate
+from app.core.responses import trusted_json
+from app.repositories import (
+    EchoWallRepository,
+    EchoMatchRepository,
+    get_echo_wall_repository,
+    get_echo_match_repository
+)
+from app.services.emotion import Lexicon, analyze_emotion, current_lexicon
+from app.services.event_hub import event_hub, user_topic
+from app.services.matching import try_match_echo
+from app.services.notifications import notify_matches
+from app.services.recent_feed import (
+    RECENT_TOPIC, echo_cursor, recent_feed
+)
+from app.services.text_features import encode_features
+from app.services.match_index import match_index
+from app.services.match_worker import MatchJob, match_worker
 
 router = APIRouter(prefix="/echo-wall", tags=["回音壁"])
+settings = get_settings()
 
-
-# 情感标签及其相关/对应标签
-EMOTION_MATCHES = {
-    "lonely": ["understanding", "companionship", "warm"],
-    "sad": ["comfort", "hope", "encouragement"],
-    "anxious": ["calm", "peace", "reassurance"],
-    "happy": ["joy", "celebration", "gratitude"],
-    "nostalgic": ["memories", "understanding", "shared"],
-    "confused": ["clarity", "guidance", "support"],
-    "hopeful": ["inspiration", "dreams", "possibility"],
-    "grateful": ["appreciation", "kindness", "blessing"],
-    "love": ["affection", "care", "connection"],
-    "regret": ["forgiveness", "acceptance", "growth"]
-}
-
-
-def analyze_emotion(content: str) -> str:
-    """简单的情感分析，返回情感标签"""
-    # 定义关键词映射
-    emotion_keywords = {
-        "lonely": ["孤独", "寂寞", "一个人", "孤单", "无人"],
-        "sad": ["难过", "伤心", "悲伤", "哭", "痛苦"],
-        "anxious": ["焦虑", "紧张", "不安", "担心", "害怕"],
-        "happy": ["开心", "快乐", "幸福", "高兴", "愉快"],
-        "nostalgic": ["怀念", "想念", "回忆", "从前", "过去"],
-        "confused": ["迷茫", "困惑", "不知道", "疑惑", "不明白"],
-        "hopeful": ["希望", "期待", "愿望", "梦想", "未来"],
-        "grateful": ["感谢", "感恩", "谢谢", "感激", "珍惜"],
-        "love": ["爱", "喜欢", "心动", "情", "恋"],
-        "regret": ["后悔", "遗憾", "错过", "可惜", "懊悔"]
-    }
-    
-    # 计算每个情感的匹配度
-    emotion_scores = {}
-    for emotion, keywords in emotion_keywords.items():
-        score = sum(1 for keyword in keywords if keyword in content)
-        if score > 0:
-            emotion_scores[emotion] = score
-    
-    # 返回得分最高的情感，如果没有匹配则返回"neutral"
-    if emotion_scores:
-        return max(emotion_scores, key=emotion_scores.get)
-    return "neutral"
-
-
-def find_matching_emotion(emotion_tag: str) -> List[str]:
-    """找到匹配的情感标签"""
-    if emotion_tag in EMOTION_MATCHES:
-        return EMOTION_MATCHES[emotion_tag]
-    
-    # 反向查找
-    for key, values in EMOTION_MATCHES.items():
-        if emotion_tag in values:
-            return [key] + [v for v in values if v != emotion_tag]
-    
-    # 如果没有特定匹配，返回所有可能的标签
-    return list(EMOTION_MATCHES.keys())
+# 最近回音响应缓存的命名空间
+RECENT_CACHE = "recent_echoes"
 
 
 @router.post("/", response_model=EchoWall)
 async def create_echo(
     echo: EchoWallCreate,
-    user_id: UUID = Depends(get_current_user_id)
+    background_tasks: BackgroundTasks,
+    user_id: UUID = Depends(get_current_user_id),
+    echoes: EchoWallRepository = Depends(get_echo_wall_repository),
+    matches: EchoMatchRepository = Depends(get_echo_match_repository),
+    cache: ResponseCache = Depends(get_response_cache)
 ):
-    """发送一个呼喊到回音壁"""
-    supabase = get_supabase_client()
-    
+    """发送一个呼喊到回音壁，匹配在响应返回后进行"""
     # 如果没有提供情感标签，进行简单的情感分析
     emotion_tag = echo.emotion_tag
     if not emotion_tag:
@@ -94,83 +67,46 @@ async def create_echo(
         "content": echo.content,
         "emotion_tag": emotion_tag,
         "user_id": str(user_id),
-        "is_matched": False
+        "is_matched": False,
+        "features": encode_features(echo.content)
     }
     
     try:
-        response = supabase.table("echo_wall").insert(data).execute()
-        created_echo = response.data[0]
-        
-        # 异步尝试匹配（这里简化处理，实际可以用后台任务）
-        await try_match_echo(created_echo["id"], emotion_tag, str(user_id))
-        
-        return created_echo
+        created_echo = await echoes.create(data)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"发送呼喊失败: {str(e)}"
         )
+    recent_feed.add(created_echo)
+    await cache.invalidate(RECENT_CACHE)
 
-
-async def try_match_echo(echo_id: str, emotion_tag: str, user_id: str):
-    """尝试为新的呼喊找到匹配"""
-    supabase = get_supabase_client()
-    
-    try:
-        # 找到可以匹配的情感标签
-        matching_emotions = find_matching_emotion(emotion_tag)
-        
-        # 查找可匹配的回音（不是自己的，未被匹配的）
-        potential_matches = []
-        for emotion in matching_emotions:
-            response = (
-                supabase.table("echo_wall")
-                .select("*")
-                .eq("emotion_tag", emotion)
-                .eq("is_matched", False)
-                .neq("user_id", user_id)
-                .neq("id", echo_id)
-                .limit(10)
-                .execute()
-            )
-            potential_matches.extend(response.data)
-        
-        if potential_matches:
-            # 随机选择一个进行匹配
-            matched_echo = random.choice(potential_matches)
-            
-            # 创建匹配记录
-            match_data = {
-                "echo_id": echo_id,
-                "matched_echo_id": matched_echo["id"]
-            }
-            supabase.table("echo_matches").insert(match_data).execute()
-            
-            # 更新两个回音的匹配状态
-            supabase.table("echo_wall").update({"is_matched": True}).eq("id", echo_id).execute()
-            supabase.table("echo_wall").update({"is_matched": True}).eq("id", matched_echo["id"]).execute()
-            
-    except Exception as e:
-        # 匹配失败不影响主流程
-        print(f"匹配失败: {str(e)}")
+    # 匹配不阻塞响应：批量模式下等待定期求解，否则优先交给后台工作者，再否则作为后台任务在响应后执行
+    job = MatchJob(created_echo["id"], emotion_tag, str(user_id), data["features"])
+    if settings.match_mode == "batch":
+        match_index.add(job.echo_id, job.emotion_tag, job.user_id, job.features)
+    elif settings.match_mode != "worker" or not match_worker.submit(job):
+        background_tasks.add_task(
+            try_match_echo, echoes, matches,
+            job.echo_id, job.emotion_tag, job.user_id, job.enqueued_at, job.features
+        )
+    return created_echo
 
 
 @router.get("/my-echoes", response_model=List[EchoWall])
 async def get_my_echoes(
-    user_id: UUID = Depends(get_current_user_id)
+    response: Response,
+    user_id: UUID = Depends(get_current_user_id),
+    limit: int = Query(settings.page_default_size, ge=1, le=settings.page_max_size),
+    cursor: Optional[str] = None,
+    echoes: EchoWallRepository = Depends(get_echo_wall_repository)
 ):
-    """获取我的所有呼喊"""
-    supabase = get_supabase_client()
-    
+    """获取我的呼喊，下一页游标在X-Next-Cursor响应头中"""
+    page_cursor = decode_cursor(cursor)
     try:
-        response = (
-            supabase.table("echo_wall")
-            .select("*")
-            .eq("user_id", str(user_id))
-            .order("created_at", desc=True)
-            .execute()
-        )
-        return response.data
+        rows = await echoes.list_by_user(str(user_id), limit + 1, page_cursor)
+        rows = paginate(rows, limit, response, key=lambda e: (e["created_at"], e["id"]))
+        return trusted_json(rows, response)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -180,168 +116,167 @@ async def get_my_echoes(
 
 @router.get("/my-matches", response_model=List[EchoMatch])
 async def get_my_matches(
-    user_id: UUID = Depends(get_current_user_id)
+    response: Response,
+    user_id: UUID = Depends(get_current_user_id),
+    limit: int = Query(settings.page_default_size, ge=1, le=settings.page_max_size),
+    cursor: Optional[str] = None,
+    embed: bool = False,
+    matches: EchoMatchRepository = Depends(get_echo_match_repository)
 ):
-    """获取我的回音匹配"""
-    supabase = get_supabase_client()
-    
+    """获取我的回音匹配
+
+    按匹配时间倒序分页，下一页游标在X-Next-Cursor响应头中；
+    embed=true时附带双方回音内容（对方回音不含user_id）。
+    """
+    page_cursor = decode_cursor(cursor)
     try:
-        # 先获取用户的所有呼喊
-        echo_response = (
-            supabase.table("echo_wall")
-            .select("id")
-            .eq("user_id", str(user_id))
-            .execute()
-        )
-        
-        if not echo_response.data:
-            return []
-        
-        echo_ids = [echo["id"] for echo in echo_response.data]
-        
-        # 获取所有相关的匹配
-        matches = []
-        
-        # 作为echo_id的匹配
-        for echo_id in echo_ids:
-            response = (
-                supabase.table("echo_matches")
-                .select("*, echo_wall!echo_matches_echo_id_fkey(*), echo_wall!echo_matches_matched_echo_id_fkey(*)")
-                .eq("echo_id", echo_id)
-                .execute()
-            )
-            matches.extend(response.data)
-        
-        # 作为matched_echo_id的匹配
-        for echo_id in echo_ids:
-            response = (
-                supabase.table("echo_matches")
-                .select("*, echo_wall!echo_matches_echo_id_fkey(*), echo_wall!echo_matches_matched_echo_id_fkey(*)")
-                .eq("matched_echo_id", echo_id)
-                .execute()
-            )
-            matches.extend(response.data)
-        
-        # 去重并格式化
-        seen = set()
-        unique_matches = []
-        for match in matches:
-            if match["id"] not in seen:
-                seen.add(match["id"])
-                # 格式化响应
-                formatted_match = {
-                    "id": match["id"],
-                    "echo_id": match["echo_id"],
-                    "matched_echo_id": match["matched_echo_id"],
-                    "matched_at": match["matched_at"]
-                }
-                unique_matches.append(formatted_match)
-        
-        return unique_matches
+        # 一次查询取出我作为任一方参与的匹配，多取一条用于判断是否有下一页
+        rows = await matches.list_for_user(str(user_id), limit + 1, page_cursor, embed)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"获取匹配失败: {str(e)}"
         )
+    return paginate(rows, limit, response, key=lambda m: (m["matched_at"], m["id"]))
 
 
-@router.get("/recent", response_model=List[EchoWall])
-async def get_recent_echoes(limit: int = 20):
-    """获取最近的回音（公共展示）"""
-    supabase = get_supabase_client()
-    
+@router.get("/recent", response_model=List[PublicEchoWall])
+async def get_recent_echoes(
+    response: Response,
+    limit: int = Query(20, ge=1, le=settings.page_max_size),
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    echoes: EchoWallRepository = Depends(get_echo_wall_repository),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    """获取最近的回音（公共展示）
+
+    默认按时间倒序分页，下一页游标在X-Next-Cursor响应头中；第一页同时返回X-Since-Cursor。
+    传入since=<X-Since-Cursor>时只返回比它新的回音（按时间正序），
+    新的X-Since-Cursor在响应头中，返回满limit条时应立即再取一次。
+    优先从内存缓冲读取，缓冲未就绪或不足时查询数据库（结果经过共享缓存，发送新呼喊时失效）。
+    """
+    page_cursor = decode_cursor(cursor)
+    since_cursor = decode_cursor(since)
+    time_threshold = (datetime.utcnow() - timedelta(seconds=settings.recent_feed_horizon)).isoformat()
+
+    if since_cursor is not None:
+        try:
+            rows = recent_feed.since(since_cursor, limit) if recent_feed.ready else None
+            if rows is None:
+                rows = await echoes.list_newer(time_threshold, since_cursor, limit)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"获取最近回音失败: {str(e)}"
+            )
+        rows = rows[:limit]
+        response.headers[SINCE_CURSOR_HEADER] = echo_cursor(rows[-1]) if rows else since
+        return trusted_json(rows, response)
+
     try:
-        # 获取最近24小时内的回音
-        time_threshold = (datetime.utcnow() - timedelta(hours=24)).isoformat()
-        
-        response = (
-            supabase.table("echo_wall")
-            .select("*")
-            .gte("created_at", time_threshold)
-            .order("created_at", desc=True)
-            .limit(limit)
-            .execute()
-        )
-        
-        # 匿名化处理 - 移除user_id
-        echoes = response.data
-        for echo in echoes:
-            echo["user_id"] = None  # 匿名化
-        
-        return echoes
+        rows = recent_feed.page(limit, page_cursor) if recent_feed.ready else None
+        if rows is None:
+            # 只查询公共展示的列，不取user_id
+            rows = await cache.get_or_load(
+                RECENT_CACHE, f"{limit}:{cursor or ''}",
+                lambda: echoes.list_recent(time_threshold, limit + 1, page_cursor)
+            )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"获取最近回音失败: {str(e)}"
         )
+    if page_cursor is None and rows:
+        response.headers[SINCE_CURSOR_HEADER] = echo_cursor(rows[0])
+    rows = paginate(rows, limit, response, key=lambda e: (e["created_at"], e["id"]))
+    return trusted_json(rows, response)
 
 
-@router.get("/emotions", response_model=List[dict])
-async def get_emotion_tags():
-    """获取所有可用的情感标签"""
-    tags = []
-    
-    # 主要情感
-    for emotion in EMOTION_MATCHES.keys():
-        tags.append({
-            "value": emotion,
-            "label": emotion.title(),
-            "type": "primary"
-        })
-    
-    # 相关情感
-    all_related = set()
-    for related_list in EMOTION_MATCHES.values():
-        all_related.update(related_list)
-    
-    for emotion in all_related:
-        if emotion not in EMOTION_MATCHES:
-            tags.append({
-                "value": emotion,
-                "label": emotion.title(),
-                "type": "secondary"
-            })
-    
+def _build_emotion_tags(lexicon: Lexicon) -> Tuple[bytes, str]:
+    """生成情感标签列表的响应体和ETag"""
+    tags = [
+        {
+            "value": tag,
+            "label": tag.title(),
+            "type": "primary" if tag in lexicon.matches else "secondary"
+        }
+        for tag in lexicon.tags
+    ]
     # 中性
-    tags.append({
-        "value": "neutral",
-        "label": "Neutral",
-        "type": "default"
-    })
-    
-    return tags
+    tags.append({"value": "neutral", "label": "Neutral", "type": "default"})
+    body = json.dumps(tags, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return body, '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match中是否包含当前ETag（弱比较）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+# (词典, 响应体, ETag)，词典重新加载后在下一次请求时重建
+_emotion_tags: Optional[Tuple[Lexicon, bytes, str]] = None
+
+
+@router.get("/emotions", response_model=List[dict])
+async def get_emotion_tags(request: Request):
+    """获取所有可用的情感标签
+
+    响应体按当前词典预先生成，带ETag；客户端携带相同的If-None-Match时返回304。
+    """
+    global _emotion_tags
+    lexicon = current_lexicon()
+    if _emotion_tags is None or _emotion_tags[0] is not lexicon:
+        _emotion_tags = (lexicon, *_build_emotion_tags(lexicon))
+    _, body, etag = _emotion_tags
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.emotion_tags_max_age}"
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.post("/manual-match", response_model=MessageResponse)
 async def create_manual_match(
     echo_id: UUID,
     matched_echo_id: UUID,
-    user_id: UUID = Depends(get_current_user_id)
+    user_id: UUID = Depends(get_current_user_id),
+    echoes: EchoWallRepository = Depends(get_echo_wall_repository),
+    matches: EchoMatchRepository = Depends(get_echo_match_repository)
 ):
     """手动创建一个匹配（用于测试或特殊情况）"""
-    supabase = get_supabase_client()
-    
     # 验证两个回音都存在且至少有一个属于当前用户
     try:
-        echo1 = supabase.table("echo_wall").select("*").eq("id", str(echo_id)).single().execute()
-        echo2 = supabase.table("echo_wall").select("*").eq("id", str(matched_echo_id)).single().execute()
+        echo1 = await echoes.get(str(echo_id), projection="owner")
+        echo2 = await echoes.get(str(matched_echo_id), projection="owner")
         
-        if str(echo1.data["user_id"]) != str(user_id) and str(echo2.data["user_id"]) != str(user_id):
+        if str(echo1["user_id"]) != str(user_id) and str(echo2["user_id"]) != str(user_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="无权创建此匹配"
             )
         
-        # 创建匹配
-        match_data = {
-            "echo_id": str(echo_id),
-            "matched_echo_id": str(matched_echo_id)
-        }
-        supabase.table("echo_matches").insert(match_data).execute()
-        
-        # 更新匹配状态
-        supabase.table("echo_wall").update({"is_matched": True}).eq("id", str(echo_id)).execute()
-        supabase.table("echo_wall").update({"is_matched": True}).eq("id", str(matched_echo_id)).execute()
+        # 认领双方、创建匹配并更新匹配状态
+        match = await matches.create(str(echo_id), str(matched_echo_id))
+        if match is None:
+            return MessageResponse(
+                message="回音已被匹配",
+                success=False,
+                data={"echo_id": str(echo_id), "matched_echo_id": str(matched_echo_id)}
+            )
+        match_index.discard(str(echo_id))
+        match_index.discard(str(matched_echo_id))
+        await notify_matches(echoes, [match], {
+            str(echo_id): str(echo1["user_id"]),
+            str(matched_echo_id): str(echo2["user_id"])
+        })
         
         return MessageResponse(
             message="匹配创建成功",
@@ -354,4 +289,88 @@ async def create_manual_match(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"创建匹配失败: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+def _websocket_token(websocket: WebSocket) -> Optional[str]:
+    """从Authorization头或token查询参数中取出访问令牌（浏览器WebSocket无法设置请求头）"""
+    authorization = websocket.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    return websocket.query_params.get("token")
+
+
+@router.websocket("/stream")
+async def stream_events(websocket: WebSocket):
+    """实时推送当前用户的匹配和信箱解锁事件
+
+    连接时用现有的JWT认证（Authorization: Bearer 或 ?token=），认证失败以1008关闭。
+    事件为JSON：{"type": "match", ...}、{"type": "capsule_unlocked", ...}；
+    空闲时定期发送{"type": "ping"}。推送跟不上时较早的事件会被丢弃，
+    此时先发送{"type": "resync"}，客户端应重新拉取一次 /my-matches。
+    """
+    token = _websocket_token(websocket)
+    try:
+        user_id = await get_current_user_id(token) if token else None
+    except HTTPException:
+        user_id = None
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = event_hub.subscribe(user_topic(user_id))
+    try:
+        while True:
+            event = await subscription.get(timeout=settings.stream_ping_interval)
+            if subscription.overflowed:
+                subscription.overflowed = False
+                await websocket.send_json({"type": "resync"})
+            await websocket.send_json(event if event is not None else {"type": "ping"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_hub.unsubscribe(subscription)
+
+
+@router.websocket("/recent/stream")
+async def stream_recent_echoes(websocket: WebSocket):
+    """实时推送新的匿名回音（公开，无需认证）
+
+    可带 ?since=<X-Since-Cursor>，先补发比它新的回音再推送实时事件。
+    事件为JSON：{"type": "echo", "cursor": ..., "echo": {...}}；空闲时定期发送{"type": "ping"}。
+    无法补齐或推送跟不上时发送{"type": "resync"}，客户端应重新拉取一次 /recent。
+    """
+    try:
+        since_cursor = decode_cursor(websocket.query_params.get("since"))
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    # 先订阅再补发，补发期间产生的新回音不会丢失；已补发过的按ID跳过
+    subscription = event_hub.subscribe(RECENT_TOPIC)
+    try:
+        sent = set()
+        if since_cursor is not None:
+            backlog = recent_feed.since(since_cursor, settings.event_queue_size)
+            if backlog is None or len(backlog) > settings.event_queue_size:
+                await websocket.send_json({"type": "resync"})
+            else:
+                for entry in backlog:
+                    await websocket.send_json({"type": "echo", "cursor": echo_cursor(entry), "echo": entry})
+                sent = {entry["id"] for entry in backlog}
+        while True:
+            event = await subscription.get(timeout=settings.stream_ping_interval)
+            if subscription.overflowed:
+                subscription.overflowed = False
+                await websocket.send_json({"type": "resync"})
+            if event is None:
+                await websocket.send_json({"type": "ping"})
+            elif event["echo"]["id"] not in sent:
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_hub.unsubscribe(subscription)
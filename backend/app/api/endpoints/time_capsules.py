@@ -1,45 +1,79 @@
 """
 时空信箱API端点
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from typing import List, Optional, Union
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
 from app.schemas import (
     TimeCapsule, 
     TimeCapsuleCreate, 
     TimeCapsuleUpdate,
+    TimeCapsuleBatch,
+    TimeCapsuleBatchItem,
+    TimeCapsuleBatchResult,
+    TimeCapsuleSaved,
+    TimeCapsuleSummary,
     MessageResponse
 )
 from app.core.auth import get_current_user_id
-from app.core.database import get_supabase_client
+from app.core.cache import ResponseCache, get_response_cache
+from app.core.config import get_settings
+from app.core.pagination import decode_cursor, paginate
+from app.core.responses import trusted_json
+from app.repositories import (
+    TimeCapsuleRepository,
+    EchoWallRepository,
+    get_time_capsule_repository,
+    get_echo_wall_repository
+)
+from app.services.event_hub import event_hub, user_topic
+from app.services.notifications import unlock_event
+from app.services.unlock_rules import evaluate_batch, stored_condition
+from app.services.unlock_scheduler import unlock_scheduler
 
 router = APIRouter(prefix="/time-capsules", tags=["时空信箱"])
+settings = get_settings()
 
+# 公共回音廊响应缓存的命名空间
+PUBLIC_CACHE = "public_capsules"
 
-@router.post("/", response_model=TimeCapsule)
-async def create_time_capsule(
-    capsule: TimeCapsuleCreate,
-    user_id: UUID = Depends(get_current_user_id)
-):
-    """创建新的时空信箱"""
-    supabase = get_supabase_client()
-    
-    # 准备数据
+
+def _capsule_row(capsule: TimeCapsuleCreate, user_id: UUID) -> dict:
+    """把创建请求转为要插入的行"""
     capsule_data = capsule.dict()
     # 将datetime对象转换为ISO格式字符串
     if capsule_data.get("unlock_date"):
         capsule_data["unlock_date"] = capsule_data["unlock_date"].isoformat()
     
-    data = {
+    return {
         **capsule_data,
         "user_id": str(user_id),
         "status": "locked"
     }
+
+
+def _with_condition(row: dict) -> dict:
+    """编译信箱的解锁条件（结果缓存供解锁检查复用），在响应中说明条件是否按自由备注保存"""
+    condition = stored_condition(row.get("unlock_condition"))
+    if not condition.text:
+        return row
+    return {**row, "condition_is_note": not condition.evaluable, "condition_error": condition.error}
+
+
+@router.post("/", response_model=TimeCapsuleSaved)
+async def create_time_capsule(
+    capsule: TimeCapsuleCreate,
+    user_id: UUID = Depends(get_current_user_id),
+    capsules: TimeCapsuleRepository = Depends(get_time_capsule_repository)
+):
+    """创建新的时空信箱"""
+    data = _capsule_row(capsule, user_id)
     
     try:
-        response = supabase.table("time_capsules").insert(data).execute()
-        return response.data[0]
+        created = await capsules.create(data)
+        unlock_scheduler.schedule(created["id"], created.get("unlock_date"))
+        return _with_condition(created)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -47,20 +81,150 @@ async def create_time_capsule(
         )
 
 
-@router.get("/", response_model=List[TimeCapsule])
-async def get_my_capsules(
+async def _explain_failures(
+    capsules: TimeCapsuleRepository,
+    capsule_ids: List[str],
+    user_id: UUID,
+    wrong_state: str
+) -> dict:
+    """批量操作失败时，用一次查询区分信箱不存在、无权操作和状态不符"""
+    rows = {row["id"]: row for row in await capsules.get_statuses(capsule_ids)}
+    reasons = {}
+    for capsule_id in capsule_ids:
+        row = rows.get(capsule_id)
+        if row is None:
+            reasons[capsule_id] = "时空信箱不存在"
+        elif str(row["user_id"]) != str(user_id):
+            reasons[capsule_id] = "无权操作此时空信箱"
+        else:
+            reasons[capsule_id] = wrong_state
+    return reasons
+
+
+async def _insert_capsules(
+    capsules: TimeCapsuleRepository,
+    rows: List[dict]
+) -> List[Union[dict, Exception]]:
+    """多行插入；整批失败时逐条插入，返回与rows一一对应的插入后的行或异常"""
+    if not rows:
+        return []
+    try:
+        return await capsules.create_many(rows)
+    except Exception as e:
+        if len(rows) == 1:
+            return [e]
+    outcomes: List[Union[dict, Exception]] = []
+    for row in rows:
+        try:
+            outcomes.append(await capsules.create(row))
+        except Exception as e:
+            outcomes.append(e)
+    return outcomes
+
+
+@router.post("/batch", response_model=TimeCapsuleBatchResult)
+async def batch_capsules(
+    batch: TimeCapsuleBatch,
     user_id: UUID = Depends(get_current_user_id),
-    status: Optional[str] = None
+    capsules: TimeCapsuleRepository = Depends(get_time_capsule_repository),
+    cache: ResponseCache = Depends(get_response_cache)
 ):
-    """获取我的时空信箱列表"""
-    supabase = get_supabase_client()
+    """批量创建、删除和发布时空信箱
+
+    按创建、删除、发布的顺序执行，每类操作各用一次数据库调用（多行插入或按ID列表更新/删除），
+    多行插入失败时改为逐条插入，results中按条目返回结果，单个条目失败不影响其他条目。
+    删除和发布列表中重复的ID只执行一次，之后出现的条目标记为失败。
+    """
+    total = len(batch.create) + len(batch.delete) + len(batch.publish)
+    if total > settings.capsule_batch_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多操作 {settings.capsule_batch_max_size} 个信箱"
+        )
     
+    results: List[TimeCapsuleBatchItem] = []
+    created: List[dict] = []
+    
+    try:
+        # 创建：一次插入
+        rows = [_capsule_row(capsule, user_id) for capsule in batch.create]
+        for index, row in enumerate(await _insert_capsules(capsules, rows)):
+            if isinstance(row, Exception):
+                results.append(TimeCapsuleBatchItem(
+                    action="create", index=index, success=False, message=f"创建时空信箱失败: {str(row)}"
+                ))
+                continue
+            row = _with_condition(row)
+            created.append(row)
+            unlock_scheduler.schedule(row["id"], row.get("unlock_date"))
+            results.append(TimeCapsuleBatchItem(
+                action="create", index=index, success=True, id=row["id"], message=row.get("condition_error")
+            ))
+        
+        # 删除和发布：按ID列表各执行一次，失败的条目再一起查询原因
+        changed = False
+        for action, ids, wrong_state in (
+            ("delete", batch.delete, "时空信箱不存在或无权删除"),
+            ("publish", batch.publish, "只有解锁的信箱才能发布到公共回音廊"),
+        ):
+            ids = [str(capsule_id) for capsule_id in ids]
+            if not ids:
+                continue
+            unique = list(dict.fromkeys(ids))
+            if action == "delete":
+                done = set(await capsules.delete_owned_many(unique, str(user_id)))
+            else:
+                done = set(await capsules.publish_many(unique, str(user_id), datetime.utcnow().isoformat()))
+            changed = changed or bool(done)
+            failed = [capsule_id for capsule_id in unique if capsule_id not in done]
+            reasons = await _explain_failures(capsules, failed, user_id, wrong_state) if failed else {}
+            seen = set()
+            for index, capsule_id in enumerate(ids):
+                if capsule_id in seen:
+                    results.append(TimeCapsuleBatchItem(
+                        action=action, index=index, id=capsule_id, success=False, message="重复的信箱ID"
+                    ))
+                    continue
+                seen.add(capsule_id)
+                results.append(TimeCapsuleBatchItem(
+                    action=action, index=index, id=capsule_id,
+                    success=capsule_id in done, message=reasons.get(capsule_id)
+                ))
+        if changed:
+            await cache.invalidate(PUBLIC_CACHE)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"批量操作失败: {str(e)}"
+        )
+    
+    order = {"create": 0, "delete": 1, "publish": 2}
+    results.sort(key=lambda item: (order[item.action], item.index))
+    return TimeCapsuleBatchResult(results=results, created=created)
+
+
+@router.get("/", response_model=List[Union[TimeCapsule, TimeCapsuleSummary]])
+async def get_my_capsules(
+    response: Response,
+    user_id: UUID = Depends(get_current_user_id),
+    capsule_status: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(settings.page_default_size, ge=1, le=settings.page_max_size),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    capsules: TimeCapsuleRepository = Depends(get_time_capsule_repository)
+):
+    """获取我的时空信箱列表，下一页游标在X-Next-Cursor响应头中
+
+    summary=true时只返回内容预览（content_preview），完整内容按需通过 /{capsule_id} 获取。
+    """
+    page_cursor = decode_cursor(cursor)
     try:
-        query = supabase.table("time_capsules").select("*").eq("user_id", str(user_id))
-        if status:
-            query = query.eq("status", status)
-        response = query.order("created_at", desc=True).execute()
-        return response.data
+        rows = await capsules.list_by_user(
+            str(user_id), limit + 1, page_cursor, capsule_status,
+            projection="summary" if summary else "detail"
+        )
+        rows = paginate(rows, limit, response, key=lambda c: (c["created_at"], c["id"]))
+        return trusted_json(rows, response)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -68,22 +232,29 @@ async def get_my_capsules(
         )
 
 
-@router.get("/public", response_model=List[TimeCapsule])
-async def get_public_capsules():
-    """获取公开的时空信箱（回音廊）"""
-    supabase = get_supabase_client()
-    
+@router.get("/public", response_model=List[Union[TimeCapsule, TimeCapsuleSummary]])
+async def get_public_capsules(
+    response: Response,
+    limit: int = Query(settings.page_default_size, ge=1, le=settings.page_max_size),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    capsules: TimeCapsuleRepository = Depends(get_time_capsule_repository),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    """获取公开的时空信箱（回音廊），下一页游标在X-Next-Cursor响应头中
+
+    summary=true时只返回内容预览（content_preview），完整内容按需通过 /{capsule_id} 获取。
+    结果经过共享缓存，发布或删除信箱时失效。
+    """
+    page_cursor = decode_cursor(cursor)
+    projection = "summary" if summary else "detail"
     try:
-        response = (
-            supabase.table("time_capsules")
-            .select("*")
-            .eq("is_public", True)
-            .eq("status", "public")
-            .order("updated_at", desc=True)
-            .limit(50)
-            .execute()
+        rows = await cache.get_or_load(
+            PUBLIC_CACHE, f"{projection}:{limit}:{cursor or ''}",
+            lambda: capsules.list_public(limit + 1, page_cursor, projection)
         )
-        return response.data
+        rows = paginate(rows, limit, response, key=lambda c: (c["updated_at"], c["id"]))
+        return trusted_json(rows, response)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -94,21 +265,12 @@ async def get_public_capsules():
 @router.get("/{capsule_id}", response_model=TimeCapsule)
 async def get_capsule(
     capsule_id: UUID,
-    user_id: UUID = Depends(get_current_user_id)
+    user_id: UUID = Depends(get_current_user_id),
+    capsules: TimeCapsuleRepository = Depends(get_time_capsule_repository)
 ):
     """获取特定的时空信箱"""
-    supabase = get_supabase_client()
-    
     try:
-        response = (
-            supabase.table("time_capsules")
-            .select("*")
-            .eq("id", str(capsule_id))
-            .single()
-            .execute()
-        )
-        
-        capsule = response.data
+        capsule = await capsules.get(str(capsule_id))
         
         # 检查权限：只能查看自己的信箱或公开的信箱
         if str(capsule["user_id"]) != str(user_id) and not (
@@ -129,197 +291,188 @@ async def get_capsule(
         )
 
 
-@router.put("/{capsule_id}", response_model=TimeCapsule)
+def _check_outcome(outcome: str) -> None:
+    """把条件更新的not_found/forbidden结果转为HTTP错误"""
+    if outcome == "not_found":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="时空信箱不存在"
+        )
+    if outcome == "forbidden":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权操作此时空信箱"
+        )
+
+
+@router.put("/{capsule_id}", response_model=TimeCapsuleSaved)
 async def update_capsule(
     capsule_id: UUID,
     capsule_update: TimeCapsuleUpdate,
-    user_id: UUID = Depends(get_current_user_id)
+    user_id: UUID = Depends(get_current_user_id),
+    capsules: TimeCapsuleRepository = Depends(get_time_capsule_repository),
+    cache: ResponseCache = Depends(get_response_cache)
 ):
     """更新时空信箱"""
-    supabase = get_supabase_client()
-    
-    # 检查信箱是否存在且属于当前用户
-    try:
-        existing = (
-            supabase.table("time_capsules")
-            .select("*")
-            .eq("id", str(capsule_id))
-            .eq("user_id", str(user_id))
-            .single()
-            .execute()
-        )
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="时空信箱不存在或无权修改"
-        )
-    
-    # 更新数据
     update_data = capsule_update.dict(exclude_unset=True)
+    if update_data.get("unlock_date"):
+        update_data["unlock_date"] = update_data["unlock_date"].isoformat()
     update_data["updated_at"] = datetime.utcnow().isoformat()
     
+    # 归属检查和更新在同一次调用中完成
     try:
-        response = (
-            supabase.table("time_capsules")
-            .update(update_data)
-            .eq("id", str(capsule_id))
-            .execute()
-        )
-        return response.data[0]
+        outcome, updated = await capsules.update_checked(str(capsule_id), str(user_id), update_data)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"更新时空信箱失败: {str(e)}"
         )
+    _check_outcome(outcome)
+    
+    if updated["status"] == "locked":
+        unlock_scheduler.schedule(updated["id"], updated.get("unlock_date"))
+    # 内容或公开状态可能变化，公开列表需要重新加载
+    await cache.invalidate(PUBLIC_CACHE)
+    return _with_condition(updated)
 
 
 @router.post("/{capsule_id}/unlock", response_model=MessageResponse)
 async def unlock_capsule(
     capsule_id: UUID,
-    user_id: UUID = Depends(get_current_user_id)
+    user_id: UUID = Depends(get_current_user_id),
+    capsules: TimeCapsuleRepository = Depends(get_time_capsule_repository),
+    echoes: EchoWallRepository = Depends(get_echo_wall_repository)
 ):
-    """解锁时空信箱"""
-    supabase = get_supabase_client()
-    
-    # 获取信箱信息
+    """解锁时空信箱
+
+    只设置了解锁时间的信箱一次调用即可完成检查和解锁；
+    带解锁条件的信箱先判断条件，再做一次带状态检查的更新。
+    """
+    now = datetime.now(timezone.utc)
+    changes = {"status": "unlocked", "updated_at": now.isoformat()}
     try:
-        response = (
-            supabase.table("time_capsules")
-            .select("*")
-            .eq("id", str(capsule_id))
-            .eq("user_id", str(user_id))
-            .single()
-            .execute()
-        )
-        capsule = response.data
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="时空信箱不存在或无权操作"
+        outcome, capsule = await capsules.update_checked(
+            str(capsule_id), str(user_id), changes,
+            expected_status=["locked"], due_before=now.isoformat()
         )
-    
-    # 检查解锁条件
-    if capsule["status"] != "locked":
-        return MessageResponse(message="时空信箱已经解锁")
-    
-    can_unlock = False
-    unlock_message = ""
-    
-    # 检查时间条件
-    if capsule["unlock_date"]:
-        unlock_date = datetime.fromisoformat(capsule["unlock_date"].replace("Z", "+00:00"))
-        if datetime.utcnow() >= unlock_date:
-            can_unlock = True
-            unlock_message = "时间已到，信箱解锁成功"
-        else:
-            unlock_message = f"时间未到，请等到 {unlock_date.strftime('%Y-%m-%d %H:%M')} 后再试"
-    
-    # 如果有特殊条件，这里可以添加更多逻辑
-    if capsule["unlock_condition"] and not can_unlock:
-        # 这里可以根据具体条件判断
-        # 暂时只做示例
-        unlock_message = f"解锁条件：{capsule['unlock_condition']}"
-    
-    if can_unlock:
-        # 更新状态为解锁
-        try:
-            supabase.table("time_capsules").update({
-                "status": "unlocked",
-                "updated_at": datetime.utcnow().isoformat()
-            }).eq("id", str(capsule_id)).execute()
-            
+        _check_outcome(outcome)
+        if outcome == "ok":
+            event_hub.publish(user_topic(user_id), unlock_event(str(capsule_id)))
             return MessageResponse(
-                message=unlock_message,
+                message="时间已到，信箱解锁成功",
                 success=True,
                 data={"capsule_id": str(capsule_id)}
             )
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"解锁失败: {str(e)}"
+        
+        if capsule["status"] != "locked":
+            return MessageResponse(
+                message="时空信箱已经解锁",
+                data={"capsule_id": str(capsule_id), "status": capsule["status"]}
             )
-    else:
-        return MessageResponse(
-            message=unlock_message,
-            success=False
+        
+        # 时间未到或带有解锁条件
+        if await evaluate_batch([capsule], capsules, echoes, now):
+            outcome, capsule = await capsules.update_checked(
+                str(capsule_id), str(user_id), changes, expected_status=["locked"]
+            )
+            _check_outcome(outcome)
+            if outcome == "ok":
+                event_hub.publish(user_topic(user_id), unlock_event(str(capsule_id)))
+                return MessageResponse(
+                    message="解锁条件已满足，信箱解锁成功",
+                    success=True,
+                    data={"capsule_id": str(capsule_id)}
+                )
+            return MessageResponse(
+                message="时空信箱已经解锁",
+                data={"capsule_id": str(capsule_id), "status": capsule["status"]}
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"解锁失败: {str(e)}"
         )
+    
+    condition = stored_condition(capsule["unlock_condition"])
+    unlock_date = capsule["unlock_date"] and datetime.fromisoformat(capsule["unlock_date"].replace("Z", "+00:00"))
+    if unlock_date and unlock_date.tzinfo is None:
+        unlock_date = unlock_date.replace(tzinfo=timezone.utc)
+    if unlock_date and now < unlock_date:
+        unlock_message = f"时间未到，请等到 {unlock_date.strftime('%Y-%m-%d %H:%M')} 后再试"
+    elif condition.evaluable:
+        unlock_message = f"解锁条件尚未满足：{condition.text}"
+    elif condition.text:
+        unlock_message = f"解锁条件：{condition.text}"
+    else:
+        unlock_message = "该信箱没有设置解锁时间或条件"
+    return MessageResponse(
+        message=unlock_message,
+        success=False,
+        data={"capsule_id": str(capsule_id), "status": capsule["status"]}
+    )
 
 
 @router.post("/{capsule_id}/publish", response_model=MessageResponse)
 async def publish_capsule(
     capsule_id: UUID,
-    user_id: UUID = Depends(get_current_user_id)
+    user_id: UUID = Depends(get_current_user_id),
+    capsules: TimeCapsuleRepository = Depends(get_time_capsule_repository),
+    cache: ResponseCache = Depends(get_response_cache)
 ):
     """将时空信箱发布到公共回音廊"""
-    supabase = get_supabase_client()
-    
-    # 检查信箱是否存在且属于当前用户
+    # 只有解锁的信箱才能发布，归属和状态检查与更新在同一次调用中完成
     try:
-        response = (
-            supabase.table("time_capsules")
-            .select("*")
-            .eq("id", str(capsule_id))
-            .eq("user_id", str(user_id))
-            .single()
-            .execute()
+        outcome, capsule = await capsules.update_checked(
+            str(capsule_id), str(user_id),
+            {
+                "status": "public",
+                "is_public": True,
+                "updated_at": datetime.utcnow().isoformat()
+            },
+            expected_status=["unlocked"]
         )
-        capsule = response.data
-    except Exception:
+    except Exception as e:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="时空信箱不存在或无权操作"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"发布失败: {str(e)}"
         )
+    _check_outcome(outcome)
     
-    # 只有解锁的信箱才能发布
-    if capsule["status"] != "unlocked":
+    if outcome == "wrong_state":
         return MessageResponse(
             message="只有解锁的信箱才能发布到公共回音廊",
-            success=False
+            success=False,
+            data={"capsule_id": str(capsule_id), "status": capsule["status"]}
         )
     
-    # 更新为公开状态
-    try:
-        supabase.table("time_capsules").update({
-            "status": "public",
-            "is_public": True,
-            "updated_at": datetime.utcnow().isoformat()
-        }).eq("id", str(capsule_id)).execute()
-        
-        return MessageResponse(
-            message="成功发布到公共回音廊",
-            success=True,
-            data={"capsule_id": str(capsule_id)}
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"发布失败: {str(e)}"
-        )
+    await cache.invalidate(PUBLIC_CACHE)
+    return MessageResponse(
+        message="成功发布到公共回音廊",
+        success=True,
+        data={"capsule_id": str(capsule_id)}
+    )
 
 
 @router.delete("/{capsule_id}", response_model=MessageResponse)
 async def delete_capsule(
     capsule_id: UUID,
-    user_id: UUID = Depends(get_current_user_id)
+    user_id: UUID = Depends(get_current_user_id),
+    capsules: TimeCapsuleRepository = Depends(get_time_capsule_repository),
+    cache: ResponseCache = Depends(get_response_cache)
 ):
     """删除时空信箱"""
-    supabase = get_supabase_client()
-    
     try:
         # 只能删除自己的信箱
-        response = (
-            supabase.table("time_capsules")
-            .delete()
-            .eq("id", str(capsule_id))
-            .eq("user_id", str(user_id))
-            .execute()
-        )
+        deleted = await capsules.delete_owned(str(capsule_id), str(user_id))
         
-        if not response.data:
+        if not deleted:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="时空信箱不存在或无权删除"
             )
+        await cache.invalidate(PUBLIC_CACHE)
         
         return MessageResponse(
             message="时空信箱已删除",
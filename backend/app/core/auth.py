@@ -1,16 +1,27 @@
 """
 认证相关工具函数
 """
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Hashable, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer
 from app.core.config import get_settings
 from app.core.database import get_supabase_client
+from app.core.metrics import metrics
+from app.schemas import User
 from uuid import UUID
 
+try:
+    import jwt as pyjwt
+except ImportError:  # 可选依赖，未安装时使用python-jose
+    pyjwt = None
+
 settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
@@ -26,6 +37,63 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class ExpiringLRUCache:
+    """容量有上限（LRU）且条目有过期时间的缓存，命中情况计入指标"""
+
+    def __init__(self, name: str, max_size: int):
+        self.name = name
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] > time.time():
+                self._items.move_to_end(key)
+                metrics.incr(f"{self.name}_hits_total")
+                return item[1]
+            if item is not None:
+                del self._items[key]
+        metrics.incr(f"{self.name}_misses_total")
+        return None
+
+    def set(self, key: Hashable, value: Any, expires_at: float) -> None:
+        """写入条目，expires_at为Unix时间戳"""
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "max_size": self.max_size}
+
+
+# 旧令牌查询到的用户信息，按用户ID缓存
+user_cache = ExpiringLRUCache("user_cache", settings.user_cache_max_size)
+metrics.register_collector("user_cache", user_cache.stats)
+# 已验证签名的令牌载荷，按令牌摘要缓存，到exp为止
+token_cache = ExpiringLRUCache("token_cache", settings.token_cache_max_size)
+metrics.register_collector("token_cache", token_cache.stats)
+
+
+def user_claims(user) -> dict:
+    """生成写入访问令牌的用户声明，使后续请求无需再查询用户信息"""
+    created_at = user.created_at
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    return {"sub": str(user.id), "email": user.email, "created_at": created_at}
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
     to_encode = data.copy()
@@ -38,29 +106,79 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """获取当前用户"""
+def _jwt_decode(token: str) -> dict:
+    """验证签名和过期时间，失败时抛出JWTError"""
+    if settings.jwt_backend == "pyjwt" and pyjwt is not None:
+        try:
+            return pyjwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        except pyjwt.PyJWTError as e:
+            raise JWTError(str(e))
+    return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+
+
+def decode_access_token(token: str) -> dict:
+    """解码访问令牌，同一令牌在过期前只验证一次签名
+
+    返回的载荷在多个请求间共享，调用方不能修改。
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = _jwt_decode(token)
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            token_cache.set(digest, payload, exp)
+    return payload
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    """获取当前用户
+
+    令牌中带有email和created_at声明时直接由令牌构造用户；
+    旧格式的令牌才查询Supabase，结果进入用户缓存。
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        payload = decode_access_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
+    if payload.get("email") and payload.get("created_at"):
+        # 声明由本服务签发，跳过邮箱格式等校验，只做类型转换
+        try:
+            return User.model_construct(
+                id=UUID(user_id),
+                email=payload["email"],
+                created_at=datetime.fromisoformat(payload["created_at"])
+            )
+        except ValueError:
+            raise credentials_exception
+    
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
     supabase = get_supabase_client()
     try:
-        response = supabase.auth.admin.get_user_by_id(user_id)
+        response = await supabase.auth.admin.get_user_by_id(user_id)
         if not response:
             raise credentials_exception
-        return response.user
+        user = User(
+            id=response.user.id,
+            email=response.user.email,
+            created_at=response.user.created_at
+        )
     except Exception:
         raise credentials_exception
+    user_cache.set(user_id, user, time.time() + settings.user_cache_ttl)
+    return user
 
 
 async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> UUID:
@@ -71,7 +189,7 @@ async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> UUID:
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        payload = decode_access_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
@@ -0,0 +1,174 @@
+"""
+公共列表的共享响应缓存
+
+缓存条目在TTL内直接返回；过期后的一段时间内先返回旧值，同时在后台刷新
+（stale-while-revalidate）。同一进程内对同一个键的并发加载会合并为一次查询。
+失效通过递增命名空间版本号实现，不需要遍历删除键，Redis后端同样适用。
+"""
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+settings = get_settings()
+
+
+class MemoryBackend:
+    """进程内缓存后端"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[float, Any]] = {}
+        self._prune_at = 1024
+
+    async def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.monotonic()
+        self._data[key] = (now + ttl, value)
+        if len(self._data) >= self._prune_at:
+            # 失效后的旧版本键不会再被读取，按条目数增长定期清理过期条目
+            self._data = {k: v for k, v in self._data.items() if v[0] >= now}
+            self._prune_at = max(1024, len(self._data) * 2)
+
+    async def incr(self, key: str) -> int:
+        _, value = self._data.get(key, (0, 0))
+        self._data[key] = (float("inf"), value + 1)
+        return value + 1
+
+    async def close(self) -> None:
+        self._data.clear()
+
+
+class RedisBackend:
+    """Redis兼容的缓存后端，值以JSON存储
+
+    client可以是redis.asyncio.Redis或任何实现了get/set(px=)/incr/aclose的兼容客户端。
+    """
+
+    def __init__(self, client=None, url: Optional[str] = None):
+        if client is None:
+            try:
+                from redis import asyncio as redis_asyncio
+            except ImportError as e:
+                raise RuntimeError("使用Redis缓存后端需要安装redis包：pip install 'backend[redis]'") from e
+            client = redis_asyncio.from_url(url or "redis://localhost:6379/0")
+        self.client = client
+
+    async def get(self, key: str) -> Any:
+        raw = await self.client.get(key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self.client.set(key, json.dumps(value, default=str), px=int(ttl * 1000))
+
+    async def incr(self, key: str) -> int:
+        return int(await self.client.incr(key))
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def _log_refresh_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        metrics.incr("cache_refresh_errors_total")
+        print(f"缓存后台刷新失败: {str(task.exception())}")
+
+
+class ResponseCache:
+    """带TTL、过期后台刷新和请求合并的缓存"""
+
+    def __init__(self, backend, ttl: float, stale_ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def _version(self, namespace: str) -> int:
+        return int(await self.backend.get(f"cache:{namespace}:version") or 0)
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        key: str,
+        loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """返回缓存值，必要时调用loader加载；loader的结果必须可JSON序列化"""
+        version = await self._version(namespace)
+        cache_key = f"cache:{namespace}:{version}:{key}"
+        entry = await self.backend.get(cache_key)
+        if entry is not None:
+            age = time.time() - entry["stored_at"]
+            if age < self.ttl:
+                metrics.incr("cache_hits_total")
+                return entry["value"]
+            # 已过期但仍在容忍窗口内：返回旧值，后台刷新
+            metrics.incr("cache_stale_hits_total")
+            self._load(cache_key, loader).add_done_callback(_log_refresh_error)
+            return entry["value"]
+        metrics.incr("cache_misses_total")
+        return await asyncio.shield(self._load(cache_key, loader))
+
+    def _load(self, cache_key: str, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """启动或复用同一个键的加载任务"""
+        task = self._inflight.get(cache_key)
+        if task is not None:
+            metrics.incr("cache_coalesced_total")
+            return task
+
+        async def run():
+            try:
+                value = await loader()
+                await self.backend.set(
+                    cache_key,
+                    {"stored_at": time.time(), "value": value},
+                    self.ttl + self.stale_ttl
+                )
+                return value
+            finally:
+                self._inflight.pop(cache_key, None)
+
+        task = asyncio.create_task(run())
+        self._inflight[cache_key] = task
+        return task
+
+    async def invalidate(self, namespace: str) -> None:
+        """使某个命名空间下的所有缓存失效
+
+        写入已经成功后才调用，失败时只记录：缓存最多在ttl + stale_ttl后自然过期，不应让写请求报错。
+        """
+        try:
+            await self.backend.incr(f"cache:{namespace}:version")
+        except Exception as e:
+            metrics.incr("cache_invalidation_errors_total")
+            print(f"缓存失效失败: {str(e)}")
+            return
+        metrics.incr("cache_invalidations_total")
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+def create_backend():
+    """按配置创建缓存后端"""
+    if settings.cache_backend == "redis":
+        return RedisBackend(url=settings.cache_redis_url)
+    return MemoryBackend()
+
+
+response_cache = ResponseCache(create_backend(), settings.cache_ttl, settings.cache_stale_ttl)
+
+
+def get_response_cache() -> ResponseCache:
+    """响应缓存依赖"""
+    return response_cache
@@ -2,6 +2,7 @@
 配置文件 - 从环境变量加载应用配置
 """
 from functools import lru_cache
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -12,16 +13,110 @@ class Settings(BaseSettings):
     supabase_anon_key: str
     # 可选：服务角色密钥（用于后端服务端访问，绕过RLS）
     supabase_service_role_key: str | None = None
+    # Supabase连接池配置（进程内共享，超时单位为秒）
+    supabase_pool_max_connections: int = 20
+    supabase_pool_max_keepalive: int = 10
+    supabase_pool_keepalive_expiry: float = 30.0
+    supabase_timeout: float = 10.0
+    supabase_connect_timeout: float = 5.0
 
     # JWT配置
     secret_key: str = "change-this-secret-key-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # 签名验证实现：jose（python-jose）或pyjwt（PyJWT，更快；未安装时仍用jose）
+    jwt_backend: Literal["jose", "pyjwt"] = "jose"
+    # 已验证令牌缓存的容量
+    token_cache_max_size: int = 10000
+    # 旧令牌（不含用户声明）查询到的用户信息缓存，过期时间单位为秒
+    user_cache_max_size: int = 10000
+    user_cache_ttl: float = 300.0
+
+    # 回音匹配配置
+    # background: 每条呼喊用FastAPI BackgroundTasks单独匹配
+    # worker: 进入队列，由后台工作者按微批次批量匹配
+    # batch: 插入时不匹配，由批量匹配定期对全部未匹配呼喊求解
+    match_mode: Literal["background", "worker", "batch"] = "background"
+    match_batch_size: int = 50
+    match_batch_window: float = 0.05
+    match_max_retries: int = 3
+    match_queue_size: int = 10000
+    # 未匹配呼喊的内存索引（容量为条目数，核对间隔单位为秒）
+    match_index_enabled: bool = True
+    match_index_max_size: int = 100000
+    match_index_check_interval: float = 300.0
+    # 按文本相似度挑选候选（需要NumPy），相似度在排序分数中的权重（标签权重为0~1）
+    match_similarity_enabled: bool = True
+    match_similarity_weight: float = 1.0
+    # 批量匹配（match_mode=batch，需要NumPy）：间隔（秒）、每次载入的呼喊上限和各项权重
+    match_solver_interval: float = 60.0
+    match_solver_max_pool: int = 20000
+    match_solver_compatibility_weight: float = 1.0
+    match_solver_age_weight: float = 1.0
+    match_solver_similarity_weight: float = 0.5
+    match_solver_age_horizon: float = 21600.0
+    match_solver_top_k: int = 5
+
+    # 时空信箱定时解锁（每批解锁数量、堆中最多保留的解锁时间数、重新载入间隔秒数）
+    unlock_scheduler_enabled: bool = True
+    unlock_batch_size: int = 500
+    unlock_schedule_max_size: int = 100000
+    unlock_reload_interval: float = 300.0
+    # 带解锁条件的信箱的检查间隔（秒）
+    unlock_condition_interval: float = 60.0
+
+    # 实时推送：每个连接最多积压的事件数、空闲时的心跳间隔（秒）
+    event_queue_size: int = 100
+    stream_ping_interval: float = 30.0
+
+    # 最近回音的内存缓冲：时间窗口（秒）、容量和从数据库刷新的间隔（秒）
+    recent_feed_enabled: bool = True
+    recent_feed_horizon: float = 86400.0
+    recent_feed_max_size: int = 10000
+    recent_feed_refresh_interval: float = 60.0
+
+    # 情感词典文件（为空时使用内置词典）及检查文件更新的间隔（秒，0表示不自动重新加载）
+    emotion_lexicon_path: str | None = None
+    emotion_lexicon_reload_interval: float = 30.0
+    # 情感标签列表允许客户端缓存的时间（秒），过期后凭ETag重新验证
+    emotion_tags_max_age: int = 300
+
+    # 批量操作接口单次请求的最大条目数
+    capsule_batch_max_size: int = 100
+
+    # 分页配置
+    page_default_size: int = 50
+    page_max_size: int = 100
+
+    # 公共列表响应缓存（memory: 进程内；redis: 多个进程共享）
+    # cache_ttl内直接返回缓存，之后cache_stale_ttl内先返回旧值并在后台刷新，单位为秒
+    cache_backend: Literal["memory", "redis"] = "memory"
+    cache_redis_url: str | None = None
+    cache_ttl: float = 5.0
+    cache_stale_ttl: float = 30.0
+
+    # 生产服务进程（python main.py）：工作进程数（0表示按可用CPU数）、监听队列长度、
+    # 空闲keep-alive连接保持时间和关闭时等待进行中请求的时间（秒）
+    # 实时推送和内存缓冲都是进程内的，默认单进程；多进程的限制见README「生产运行」
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: int = 1
+    server_backlog: int = 2048
+    server_keepalive_timeout: int = 75
+    server_graceful_timeout: int = 20
+    server_access_log: bool = False
+    # 关闭时等待后台匹配、批量匹配和解锁完成当前工作的时间（秒）
+    background_drain_timeout: float = 10.0
+    # 多个工作进程时，只有取得该文件锁的进程运行批量匹配和定时解锁（为空表示每个进程都运行）
+    background_lock_path: str | None = None
+    # 由python main.py在启动多个工作进程时设置：其他进程也会写入，进程内索引和缓冲不能视为完整
+    server_multi_process: bool = False
 
     # 应用配置
     app_name: str = "Echo"
     app_version: str = "1.0.0"
-    debug: bool = True
+    # 开发模式：python main.py 以单进程自动重载运行
+    debug: bool = False
 
     # Pydantic Settings v2 配置
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
@@ -1,20 +1,142 @@
 """
-Supabase客户端初始化
+Supabase客户端初始化与连接池管理
 """
-from supabase import create_client, Client
+import time
+from typing import Optional
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
 from app.core.config import get_settings
+from app.core.metrics import metrics
 
 settings = get_settings()
 
 
-def get_supabase_client() -> Client:
-    """获取Supabase客户端实例
+class _PooledTransport(httpx.AsyncHTTPTransport):
+    """带统计的HTTP传输层，记录并发请求数和请求耗时"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        metrics.incr("supabase_requests_total")
+        started = time.perf_counter()
+        try:
+            return await super().handle_async_request(request)
+        except httpx.HTTPError:
+            metrics.incr("supabase_request_errors_total")
+            raise
+        finally:
+            metrics.observe("supabase_request_seconds", time.perf_counter() - started)
+            self.in_flight -= 1
+
+    def pool_stats(self) -> dict:
+        """当前连接池状态"""
+        connections = list(self._pool.connections)
+        return {
+            "connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+            "in_flight_requests": self.in_flight,
+            "max_connections": settings.supabase_pool_max_connections,
+        }
+
+
+class SupabasePool:
+    """进程级共享的Supabase客户端
+
+    所有请求共用同一个带keep-alive连接池的异步httpx客户端，
+    避免每次请求都重新创建客户端和建立TLS连接，也不会阻塞事件循环。
+    """
+
+    def __init__(self):
+        self._transport: Optional[_PooledTransport] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._client: Optional[AsyncClient] = None
+
+    def open(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        """创建共享的HTTP连接池和服务端客户端
+
+        transport参数用于在压测或本地调试时替换底层传输层。
+        """
+        if self._client is not None:
+            return
+        if transport is None:
+            self._transport = _PooledTransport(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=settings.supabase_pool_max_connections,
+                    max_keepalive_connections=settings.supabase_pool_max_keepalive,
+                    keepalive_expiry=settings.supabase_pool_keepalive_expiry,
+                ),
+            )
+            transport = self._transport
+        self._http_client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(
+                settings.supabase_timeout,
+                connect=settings.supabase_connect_timeout,
+            ),
+            follow_redirects=True,
+        )
+        self._client = self._create_client()
+        metrics.register_collector("supabase_pool", self.stats)
+
+    async def close(self) -> None:
+        """关闭连接池"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._transport = None
+        self._http_client = None
+        self._client = None
+
+    def _create_client(self) -> AsyncClient:
+        key = settings.supabase_service_role_key or settings.supabase_anon_key
+        return AsyncClient(
+            settings.supabase_url,
+            key,
+            options=AsyncClientOptions(
+                httpx_client=self._http_client,
+                auto_refresh_token=False,
+                persist_session=False,
+            ),
+        )
+
+    @property
+    def client(self) -> AsyncClient:
+        if self._client is None:
+            self.open()
+        return self._client
+
+    def auth_client(self) -> AsyncClient:
+        """为用户认证流程创建独立会话的客户端
+
+        登录、注册等操作会修改客户端上的会话状态，不能在共享客户端上执行；
+        这里只新建轻量的客户端对象，底层仍复用共享连接池。
+        """
+        if self._client is None:
+            self.open()
+        return self._create_client()
+
+    def stats(self) -> dict:
+        if self._transport is None:
+            return {"connections": 0, "idle_connections": 0, "in_flight_requests": 0}
+        return self._transport.pool_stats()
+
+
+supabase_pool = SupabasePool()
+
+
+def get_supabase_client() -> AsyncClient:
+    """获取共享的Supabase客户端实例
 
     优先使用服务角色密钥（如果提供），以确保服务端在RLS开启的环境下
     拥有必要的读写权限。否则退回到anon key。
     """
-    key = settings.supabase_service_role_key or settings.supabase_anon_key
-    return create_client(
-        settings.supabase_url,
-        key
-    )
\ No newline at end of file
+    return supabase_pool.client
+
+
+def get_auth_client() -> AsyncClient:
+    """获取用于用户认证流程的Supabase客户端"""
+    return supabase_pool.auth_client()
@@ -0,0 +1,58 @@
+"""
+进程内运行指标
+"""
+import threading
+from typing import Callable, Dict
+
+
+class Metrics:
+    """计数器、仪表和耗时观测的简单注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        """累加计数器"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """设置仪表当前值"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """记录一次观测值（如耗时，单位秒）"""
+        with self._lock:
+            timing = self._timings.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            timing["count"] += 1
+            timing["sum"] += value
+            timing["max"] = max(timing["max"], value)
+
+    def register_collector(self, name: str, collector: Callable[[], Dict[str, float]]) -> None:
+        """注册一个在导出时才计算的指标组"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> dict:
+        """导出所有指标"""
+        with self._lock:
+            data = {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": {k: dict(v) for k, v in self._timings.items()},
+            }
+            collectors = dict(self._collectors)
+        for name, collector in collectors.items():
+            try:
+                data[name] = collector()
+            except Exception as e:
+                data[name] = {"error": str(e)}
+        return data
+
+
+metrics = Metrics()
@@ -0,0 +1,58 @@
+"""
+游标（keyset）分页工具
+
+游标是对排序键的不透明编码，客户端只需原样回传响应头中的下一页游标。
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Callable, List, Optional
+from uuid import UUID
+
+from fastapi import HTTPException, Response, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# 增量读取时下一次请求应带的since游标
+SINCE_CURSOR_HEADER = "X-Since-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """把排序键编码为游标"""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[list]:
+    """解析 [时间戳, id] 形式的游标，格式不正确时返回400
+
+    游标的值会被拼进查询过滤条件，这里严格校验类型以防注入。
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        return [timestamp, str(UUID(row_id))]
+    except (binascii.Error, ValueError, TypeError, AttributeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+
+
+def paginate(
+    rows: List[dict],
+    limit: int,
+    response: Response,
+    key: Callable[[dict], tuple]
+) -> List[dict]:
+    """截取一页数据，并在还有下一页时设置下一页游标响应头
+
+    rows应按limit + 1条查询，多出的一条只用来判断是否还有下一页。
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(rows[-1]))
+    return rows
@@ -0,0 +1,36 @@
+"""
+JSON响应
+
+安装orjson时（pip install "backend[fast-json]"）用它序列化响应，否则退回标准库json。
+高频列表接口返回的是结构已由查询列固定的数据库行，用trusted_json直接序列化，
+跳过响应模型的逐行校验（response_model仍用于生成接口文档）。
+其他接口保持FastAPI的默认响应：新版FastAPI按响应模型直接序列化，比先转字典再用orjson更快。
+"""
+from typing import Any
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """优先使用orjson的JSON响应"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+
+def trusted_json(content: Any, response: Response) -> FastJSONResponse:
+    """直接序列化可信的数据库行，带上依赖注入的response上已设置的响应头（如分页游标）"""
+    headers = {
+        name: value for name, value in response.headers.items()
+        if name != "content-length"
+    }
+    return FastJSONResponse(content, status_code=response.status_code or 200, headers=headers)
@@ -0,0 +1,89 @@
+"""
+生产服务进程配置
+
+python main.py 在非debug模式下用uvicorn自带的进程管理器启动工作进程（默认一个）：
+事件循环和HTTP解析使用uvloop/httptools（uvicorn[standard]已包含），
+工作进程意外退出时自动重启，收到SIGTERM后停止接受新连接、等待进行中的请求，
+再执行各进程的lifespan关闭流程（后台匹配和解锁在那里收尾）。
+
+每个工作进程有自己的内存状态（匹配索引、最近回音缓冲、事件订阅、进程内响应缓存）。
+多个工作进程时：定时的批量匹配和解锁只需要一个进程运行，由文件锁选出；
+匹配索引和最近回音缓冲看不到其他进程写入的呼喊，不再视为完整，查询退回数据库；
+事件订阅没有跨进程转发，WebSocket连接只能收到所在进程产生的事件。
+"""
+import os
+import tempfile
+from typing import Optional
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+_lock_file = None
+
+
+def worker_count() -> int:
+    """工作进程数：未配置时取当前进程可用的CPU数"""
+    if settings.server_workers > 0:
+        return settings.server_workers
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def server_options() -> dict:
+    """uvicorn.run的参数"""
+    if settings.debug:
+        return {
+            "host": settings.server_host,
+            "port": settings.server_port,
+            "reload": True,
+        }
+    workers = worker_count()
+    if workers > 1:
+        # 工作进程是新启动的解释器，通过环境变量拿到同一个锁文件和多进程标记
+        os.environ["SERVER_MULTI_PROCESS"] = "true"
+        if not settings.background_lock_path:
+            os.environ["BACKGROUND_LOCK_PATH"] = os.path.join(
+                tempfile.gettempdir(), f"echo-background-{settings.server_port}.lock"
+            )
+    return {
+        "host": settings.server_host,
+        "port": settings.server_port,
+        "workers": workers,
+        # auto在安装了uvloop/httptools时使用它们，Windows上退回asyncio
+        "loop": "auto",
+        "http": "auto",
+        "backlog": settings.server_backlog,
+        # 比nginx到上游的空闲连接保持得久，避免复用到刚被关闭的连接
+        "timeout_keep_alive": settings.server_keepalive_timeout,
+        "timeout_graceful_shutdown": settings.server_graceful_timeout,
+        "access_log": settings.server_access_log,
+        "proxy_headers": True,
+    }
+
+
+def acquire_background_lock(path: Optional[str] = None) -> bool:
+    """尝试取得后台任务的文件锁，成功的进程负责只需运行一份的后台任务
+
+    锁随进程退出释放，重启的工作进程会重新争取。未配置锁文件或平台不支持时视为取得。
+    """
+    global _lock_file
+    path = path or settings.background_lock_path
+    if not path:
+        return True
+    if _lock_file is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:
+        return True
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _lock_file = lock_file
+    return True
@@ -0,0 +1,40 @@
+"""
+异步数据访问层
+"""
+from fastapi import Depends
+from supabase import AsyncClient
+from app.core.database import get_supabase_client
+from app.repositories.time_capsules import TimeCapsuleRepository
+from app.repositories.echo_wall import EchoWallRepository
+from app.repositories.echo_matches import EchoMatchRepository
+
+
+def get_time_capsule_repository(
+    client: AsyncClient = Depends(get_supabase_client)
+) -> TimeCapsuleRepository:
+    """时空信箱仓库依赖"""
+    return TimeCapsuleRepository(client)
+
+
+def get_echo_wall_repository(
+    client: AsyncClient = Depends(get_supabase_client)
+) -> EchoWallRepository:
+    """回音壁仓库依赖"""
+    return EchoWallRepository(client)
+
+
+def get_echo_match_repository(
+    client: AsyncClient = Depends(get_supabase_client)
+) -> EchoMatchRepository:
+    """匹配记录仓库依赖"""
+    return EchoMatchRepository(client)
+
+
+__all__ = [
+    "TimeCapsuleRepository",
+    "EchoWallRepository",
+    "EchoMatchRepository",
+    "get_time_capsule_repository",
+    "get_echo_wall_repository",
+    "get_echo_match_repository",
+]
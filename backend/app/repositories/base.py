@@ -0,0 +1,33 @@
+"""
+数据访问层基类
+"""
+from typing import Optional
+from supabase import AsyncClient
+
+
+class BaseRepository:
+    """基于异步Supabase客户端的表访问基类"""
+
+    table_name: str = ""
+
+    def __init__(self, client: AsyncClient):
+        self.client = client
+
+    @property
+    def table(self):
+        """当前表的查询构造器"""
+        return self.client.table(self.table_name)
+
+    @staticmethod
+    def after_cursor(query, column: str, cursor: Optional[list]):
+        """按 (column, id) 倒序分页时，过滤出游标之后的行"""
+        if not cursor:
+            return query
+        value, last_id = cursor
+        return query.or_(f'{column}.lt."{value}",and({column}.eq."{value}",id.lt.{last_id})')
+
+    @staticmethod
+    def before_cursor(query, column: str, cursor: list):
+        """按 (column, id) 正序读取增量时，过滤出比游标更新的行"""
+        value, last_id = cursor
+        return query.or_(f'{column}.gt."{value}",and({column}.eq."{value}",id.gt.{last_id})')
@@ -0,0 +1,59 @@
+"""
+情感匹配记录数据访问
+"""
+from typing import List, Optional, Tuple
+from app.repositories.base import BaseRepository
+
+
+class EchoMatchRepository(BaseRepository):
+    """echo_matches表的异步访问"""
+
+    table_name = "echo_matches"
+
+    async def create(self, echo_id: str, matched_echo_id: str) -> Optional[dict]:
+        """认领两条呼喊并创建匹配记录
+
+        通过数据库函数create_echo_match（见sql/echo_matching.sql）在同一事务内完成，
+        只需一次网络往返。任一方已被匹配或正被其他事务认领时不创建，返回None。
+        """
+        response = await self.client.rpc("create_echo_match", {
+            "p_echo_id": echo_id,
+            "p_matched_echo_id": matched_echo_id
+        }).execute()
+        if isinstance(response.data, list):
+            return response.data[0] if response.data else None
+        return response.data or None
+
+    async def create_many(self, pairs: List[Tuple[str, str]]) -> List[dict]:
+        """一次写入多对匹配，返回实际创建的记录
+
+        通过数据库函数create_echo_matches完成；任一方已被匹配（或正被其他事务锁定）的配对会被跳过。
+        各配对中的呼喊不能重复。
+        """
+        if not pairs:
+            return []
+        response = await self.client.rpc("create_echo_matches", {
+            "p_pairs": [{"echo_id": echo_id, "matched_echo_id": matched_id} for echo_id, matched_id in pairs]
+        }).execute()
+        return response.data or []
+
+    async def list_for_user(
+        self,
+        user_id: str,
+        limit: int,
+        cursor: Optional[list] = None,
+        embed: bool = False
+    ) -> List[dict]:
+        """一次查询获取用户参与的所有匹配（作为任一方），按匹配时间倒序
+
+        cursor为上一页最后一条的 [matched_at, id]；通过数据库函数get_user_echo_matches实现。
+        """
+        matched_at, match_id = cursor or (None, None)
+        response = await self.client.rpc("get_user_echo_matches", {
+            "p_user_id": user_id,
+            "p_limit": limit,
+            "p_cursor_matched_at": matched_at,
+            "p_cursor_id": match_id,
+            "p_embed": embed
+        }).execute()
+        return response.data
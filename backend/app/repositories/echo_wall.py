@@ -0,0 +1,135 @@
+"""
+回音壁数据访问
+"""
+from typing import Dict, List, Optional
+from app.repositories.base import BaseRepository
+
+# 各查询取用的列，只取用到的列
+ECHO_PROJECTIONS = {
+    # EchoWall响应模型
+    "detail": "id, user_id, content, emotion_tag, is_matched, created_at",
+    # PublicEchoWall：公共展示不取user_id
+    "public": "id, content, emotion_tag, is_matched, created_at",
+    # 归属检查
+    "owner": "id, user_id",
+    # 匹配时从数据库挑选候选（认领失败时按user_id放回匹配索引）
+    "candidate": "id, user_id, emotion_tag, features",
+    # 批量匹配和匹配索引
+    "unmatched": "id, user_id, emotion_tag, features, created_at",
+}
+
+
+class EchoWallRepository(BaseRepository):
+    """echo_wall表的异步访问"""
+
+    table_name = "echo_wall"
+
+    async def create(self, data: dict) -> dict:
+        """插入一条呼喊并返回插入后的行"""
+        response = await self.table.insert(data).execute()
+        return response.data[0]
+
+    async def get(self, echo_id: str, projection: str = "detail") -> dict:
+        """按ID获取呼喊（projection为ECHO_PROJECTIONS中的列组），不存在时抛出异常"""
+        response = await (
+            self.table.select(ECHO_PROJECTIONS[projection]).eq("id", echo_id).single().execute()
+        )
+        return response.data
+
+    async def list_by_user(self, user_id: str, limit: int, cursor: Optional[list] = None) -> List[dict]:
+        """获取用户的呼喊，按 (created_at, id) 倒序分页"""
+        query = self.table.select(ECHO_PROJECTIONS["detail"]).eq("user_id", user_id)
+        query = self.after_cursor(query, "created_at", cursor)
+        response = await (
+            query
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return response.data
+
+    async def list_unmatched(self, limit: int) -> List[dict]:
+        """获取尚未匹配的呼喊（仅匹配所需的列），按创建时间正序"""
+        response = await (
+            self.table
+            .select(ECHO_PROJECTIONS["unmatched"])
+            .eq("is_matched", False)
+            .order("created_at")
+            .limit(limit)
+            .execute()
+        )
+        return response.data
+
+    async def filter_unmatched(self, echo_ids: List[str]) -> List[str]:
+        """从给定ID中筛出仍未匹配的呼喊"""
+        response = await (
+            self.table
+            .select("id")
+            .in_("id", echo_ids)
+            .eq("is_matched", False)
+            .execute()
+        )
+        return [row["id"] for row in response.data]
+
+    async def list_recent(self, since: str, limit: int, cursor: Optional[list] = None) -> List[dict]:
+        """获取某时间点之后的呼喊（公共展示的列），按 (created_at, id) 倒序分页"""
+        query = self.table.select(ECHO_PROJECTIONS["public"]).gte("created_at", since)
+        query = self.after_cursor(query, "created_at", cursor)
+        response = await (
+            query
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return response.data
+
+    async def list_newer(self, since: str, cursor: list, limit: int) -> List[dict]:
+        """获取比游标更新（且不早于since）的呼喊（公共展示的列），按 (created_at, id) 正序"""
+        query = self.table.select(ECHO_PROJECTIONS["public"]).gte("created_at", since)
+        query = self.before_cursor(query, "created_at", cursor)
+        response = await (
+            query
+            .order("created_at")
+            .order("id")
+            .limit(limit)
+            .execute()
+        )
+        return response.data
+
+    async def find_unmatched(
+        self,
+        emotion_tags: List[str],
+        exclude_user_id: str,
+        exclude_echo_ids: List[str],
+        limit: int = 10
+    ) -> List[dict]:
+        """一次查询找出若干情感标签下其他用户尚未匹配的呼喊（只含挑选候选所需的列）"""
+        response = await (
+            self.table
+            .select(ECHO_PROJECTIONS["candidate"])
+            .in_("emotion_tag", emotion_tags)
+            .eq("is_matched", False)
+            .neq("user_id", exclude_user_id)
+            .not_.in_("id", exclude_echo_ids)
+            .limit(limit)
+            .execute()
+        )
+        return response.data
+
+    async def get_owners(self, echo_ids: List[str]) -> Dict[str, str]:
+        """一次查询获取多条呼喊的所属用户"""
+        if not echo_ids:
+            return {}
+        response = await self.table.select(ECHO_PROJECTIONS["owner"]).in_("id", echo_ids).execute()
+        return {row["id"]: str(row["user_id"]) for row in response.data}
+
+    async def count_matched_by_users(self, user_ids: List[str]) -> Dict[str, int]:
+        """一次查询统计多个用户被匹配到的呼喊数量"""
+        if not user_ids:
+            return {}
+        response = await self.client.rpc(
+            "count_matched_echoes", {"p_user_ids": user_ids}
+        ).execute()
+        return {str(row["user_id"]): row["matched"] for row in response.data or []}
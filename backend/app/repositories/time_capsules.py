@@ -0,0 +1,206 @@
+"""
+时空信箱数据访问
+"""
+from typing import List, Optional, Tuple
+from app.repositories.base import BaseRepository
+
+_CAPSULE_FIELDS = "id, user_id, title, unlock_date, unlock_condition, is_public, status, created_at, updated_at"
+
+# 各查询取用的列，只取用到的列
+CAPSULE_PROJECTIONS = {
+    # TimeCapsule响应模型
+    "detail": f"{_CAPSULE_FIELDS}, content",
+    # TimeCapsuleSummary：列表摘要只取截断的预览（计算列，见 sql/capsule_preview.sql）
+    "summary": f"{_CAPSULE_FIELDS}, content_preview",
+    # 归属和状态检查
+    "status": "id, user_id, status",
+    # 定时解锁的最小堆
+    "scheduled": "id, unlock_date",
+    # 解锁条件判断
+    "conditional": "id, user_id, unlock_date, unlock_condition",
+}
+
+
+class TimeCapsuleRepository(BaseRepository):
+    """time_capsules表的异步访问"""
+
+    table_name = "time_capsules"
+
+    async def create(self, data: dict) -> dict:
+        """插入一个信箱并返回插入后的行"""
+        response = await self.table.insert(data).execute()
+        return response.data[0]
+
+    async def create_many(self, rows: List[dict]) -> List[dict]:
+        """一次插入多个信箱，返回插入后的行（与rows顺序一致）"""
+        if not rows:
+            return []
+        response = await self.table.insert(rows).execute()
+        return response.data
+
+    async def list_by_user(
+        self,
+        user_id: str,
+        limit: int,
+        cursor: Optional[list] = None,
+        status: Optional[str] = None,
+        projection: str = "detail"
+    ) -> List[dict]:
+        """获取用户的信箱列表，按 (created_at, id) 倒序分页"""
+        query = self.table.select(CAPSULE_PROJECTIONS[projection]).eq("user_id", user_id)
+        if status:
+            query = query.eq("status", status)
+        query = self.after_cursor(query, "created_at", cursor)
+        response = await (
+            query
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return response.data
+
+    async def list_public(
+        self,
+        limit: int,
+        cursor: Optional[list] = None,
+        projection: str = "detail"
+    ) -> List[dict]:
+        """获取已发布到回音廊的信箱，按 (updated_at, id) 倒序分页"""
+        query = self.table.select(CAPSULE_PROJECTIONS[projection]).eq("is_public", True).eq("status", "public")
+        query = self.after_cursor(query, "updated_at", cursor)
+        response = await (
+            query
+            .order("updated_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return response.data
+
+    async def get(self, capsule_id: str) -> dict:
+        """按ID获取信箱，不存在时抛出异常"""
+        response = await (
+            self.table.select(CAPSULE_PROJECTIONS["detail"]).eq("id", capsule_id).single().execute()
+        )
+        return response.data
+
+    async def update_checked(
+        self,
+        capsule_id: str,
+        user_id: str,
+        changes: dict,
+        expected_status: Optional[List[str]] = None,
+        due_before: Optional[str] = None
+    ) -> Tuple[str, Optional[dict]]:
+        """一次往返完成归属和状态检查并更新
+
+        返回 (结果, 行)，结果为ok、not_found、forbidden或wrong_state；
+        ok时行为更新后的信箱，wrong_state时为当前信箱。
+        due_before不为空时还要求信箱没有附加条件且解锁时间不晚于该时间。
+        """
+        response = await self.client.rpc("update_capsule_checked", {
+            "p_capsule_id": capsule_id,
+            "p_user_id": user_id,
+            "p_changes": changes,
+            "p_expected_status": expected_status,
+            "p_due_before": due_before,
+        }).execute()
+        result = response.data[0]
+        return result["outcome"], result["capsule"]
+
+    async def list_scheduled(self, limit: int) -> List[dict]:
+        """按解锁时间升序获取尚未解锁且设置了解锁时间的信箱（只含id和unlock_date）"""
+        response = await (
+            self.table
+            .select(CAPSULE_PROJECTIONS["scheduled"])
+            .eq("status", "locked")
+            .not_.is_("unlock_date", "null")
+            .order("unlock_date")
+            .limit(limit)
+            .execute()
+        )
+        return response.data
+
+    async def unlock_due(self, now: str, limit: int) -> List[str]:
+        """用一次集合更新解锁最多limit个已到期的信箱，返回被解锁的信箱ID"""
+        response = await self.client.rpc(
+            "unlock_due_capsules", {"p_now": now, "p_limit": limit}
+        ).execute()
+        return response.data or []
+
+    async def list_conditional(self, limit: int, after_id: Optional[str] = None) -> List[dict]:
+        """按ID顺序分批获取带解锁条件且尚未解锁的信箱（只含判断所需的列）"""
+        query = (
+            self.table
+            .select(CAPSULE_PROJECTIONS["conditional"])
+            .eq("status", "locked")
+            .not_.is_("unlock_condition", "null")
+        )
+        if after_id:
+            query = query.gt("id", after_id)
+        response = await query.order("id").limit(limit).execute()
+        return response.data
+
+    async def get_statuses(self, capsule_ids: List[str]) -> List[dict]:
+        """一次查询获取多个信箱的所属用户和状态"""
+        if not capsule_ids:
+            return []
+        response = await (
+            self.table
+            .select(CAPSULE_PROJECTIONS["status"])
+            .in_("id", capsule_ids)
+            .execute()
+        )
+        return response.data
+
+    async def unlock_ids(self, capsule_ids: List[str], now: str) -> List[str]:
+        """把仍处于锁定状态的一批信箱解锁，返回实际被解锁的信箱ID"""
+        if not capsule_ids:
+            return []
+        response = await (
+            self.table
+            .update({"status": "unlocked", "updated_at": now})
+            .in_("id", capsule_ids)
+            .eq("status", "locked")
+            .execute()
+        )
+        return [row["id"] for row in response.data]
+
+    async def publish_many(self, capsule_ids: List[str], user_id: str, now: str) -> List[str]:
+        """把属于该用户且已解锁的一批信箱发布到回音廊，返回实际发布的信箱ID"""
+        if not capsule_ids:
+            return []
+        response = await (
+            self.table
+            .update({"status": "public", "is_public": True, "updated_at": now})
+            .in_("id", capsule_ids)
+            .eq("user_id", user_id)
+            .eq("status", "unlocked")
+            .execute()
+        )
+        return [row["id"] for row in response.data]
+
+    async def delete_owned_many(self, capsule_ids: List[str], user_id: str) -> List[str]:
+        """删除属于该用户的一批信箱，返回实际删除的信箱ID"""
+        if not capsule_ids:
+            return []
+        response = await (
+            self.table
+            .delete()
+            .in_("id", capsule_ids)
+            .eq("user_id", user_id)
+            .execute()
+        )
+        return [row["id"] for row in response.data]
+
+    async def delete_owned(self, capsule_id: str, user_id: str) -> List[dict]:
+        """删除属于指定用户的信箱，返回被删除的行"""
+        response = await (
+            self.table
+            .delete()
+            .eq("id", capsule_id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+        return response.data
@@ -3,7 +3,7 @@ Pydantic数据模型定义
 """
 from pydantic import BaseModel, field_validator
 from datetime import datetime
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from uuid import UUID
 import re
 
@@ -99,6 +99,50 @@ class TimeCapsule(TimeCapsuleBase):
         from_attributes = True
 
 
+class TimeCapsuleSaved(TimeCapsule):
+    """创建或更新后的时空信箱，附带解锁条件的编译结果"""
+    # 条件按自由备注保存、不参与自动解锁时为True
+    condition_is_note: bool = False
+    # 条件以关键字开头但无法解析时的原因
+    condition_error: Optional[str] = None
+
+
+class TimeCapsuleSummary(BaseModel):
+    """时空信箱列表摘要：内容只含截断的预览，完整内容通过 GET /time-capsules/{id} 获取"""
+    id: UUID
+    user_id: UUID
+    title: str
+    content_preview: str
+    unlock_date: Optional[datetime] = None
+    unlock_condition: Optional[str] = None
+    is_public: bool = False
+    status: Literal["locked", "unlocked", "public"]
+    created_at: datetime
+    updated_at: datetime
+
+
+class TimeCapsuleBatch(BaseModel):
+    """批量操作时空信箱的请求"""
+    create: List[TimeCapsuleCreate] = []
+    delete: List[UUID] = []
+    publish: List[UUID] = []
+
+
+class TimeCapsuleBatchItem(BaseModel):
+    """批量操作中单个条目的结果，index为该条目在对应列表中的位置"""
+    action: Literal["create", "delete", "publish"]
+    index: int
+    success: bool
+    id: Optional[UUID] = None
+    message: Optional[str] = None
+
+
+class TimeCapsuleBatchResult(BaseModel):
+    """批量操作的结果"""
+    results: List[TimeCapsuleBatchItem]
+    created: List[TimeCapsuleSaved] = []
+
+
 # ============ 回音壁相关模型 ============
 class EchoWallBase(BaseModel):
     """回音壁基础模型"""
@@ -112,9 +156,9 @@ class EchoWallCreate(EchoWallBase):
 
 
 class EchoWall(EchoWallBase):
-    """回音壁响应模型"""
+    """回音壁响应模型（匿名展示时不含user_id）"""
     id: UUID
-    user_id: UUID
+    user_id: Optional[UUID] = None
     is_matched: bool = False
     created_at: datetime
     
@@ -122,6 +166,13 @@ class EchoWall(EchoWallBase):
         from_attributes = True
 
 
+class PublicEchoWall(EchoWallBase):
+    """回音壁公共展示模型（不含user_id）"""
+    id: UUID
+    is_matched: bool = False
+    created_at: datetime
+
+
 # ============ 情感匹配相关模型 ============
 class EchoMatchBase(BaseModel):
     """情感匹配基础模型"""
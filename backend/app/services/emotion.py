@@ -0,0 +1,260 @@
+"""
+情感分析与情感标签匹配
+
+关键词（带权重）、否定词和情感标签的对应关系都来自词典文件（默认为app/data/emotion_lexicon.json），
+加载时编译为只读的Lexicon对象。热更新时先在后台完整构建新对象再替换模块级引用，
+读取方只读取一次引用，不需要加锁，也不会看到更新到一半的词典。
+"""
+import asyncio
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+settings = get_settings()
+
+DEFAULT_LEXICON_PATH = Path(__file__).resolve().parent.parent / "data" / "emotion_lexicon.json"
+
+# 否定词与关键词之间不计入间隔的标点
+_PUNCTUATION = r"\s，。！？、；：,.!?;:"
+
+
+class Lexicon:
+    """编译后的情感词典（只读）
+
+    所有关键词编译为一个正则（长的优先），每次从上一个匹配的下一个字符继续查找，
+    找出每个位置开始的最长关键词，再加上它的前缀中也是关键词的那些，
+    因此互相重叠的关键词都会计入，与逐个子串查找的结果相同。
+    每个关键词无论出现几次只按权重计一次，前面紧跟否定词的出现不计分。
+    """
+
+    def __init__(self, data: dict):
+        self.version = int(data["version"])
+        emotions = data["emotions"]
+        self.emotions: Tuple[str, ...] = tuple(emotions)
+        # 关键词 -> (情感序号, 权重)
+        self._keywords: Dict[str, Tuple[int, float]] = {}
+        for index, emotion in enumerate(self.emotions):
+            for keyword, weight in emotions[emotion]["keywords"].items():
+                self._keywords.setdefault(keyword, (index, float(weight)))
+        if not self._keywords:
+            raise ValueError("词典中没有关键词")
+        ordered = sorted(self._keywords, key=len, reverse=True)
+        self._search = re.compile("|".join(map(re.escape, ordered))).search
+        # 关键词 -> 同一位置开始、也是关键词的较短前缀
+        self._prefixes: Dict[str, Tuple[str, ...]] = {}
+        for keyword in self._keywords:
+            prefixes = tuple(keyword[:end] for end in range(len(keyword) - 1, 0, -1) if keyword[:end] in self._keywords)
+            if prefixes:
+                self._prefixes[keyword] = prefixes
+
+        negations = sorted(data.get("negations", []), key=len, reverse=True)
+        window = int(data.get("negation_window", 0))
+        self._negation_span = (max(map(len, negations)) if negations else 0) + window
+        self._negated = re.compile(
+            "(?:%s)[^%s]{0,%d}$" % ("|".join(map(re.escape, negations)), _PUNCTUATION, window)
+        ).search if negations else None
+
+        # 情感标签 -> ((对应标签, 权重), ...)，按权重从高到低
+        self.matches: Dict[str, Tuple[Tuple[str, float], ...]] = {
+            emotion: tuple(sorted(
+                ((tag, float(weight)) for tag, weight in emotions[emotion].get("matches", {}).items()
+                 if float(weight) > 0),
+                key=lambda edge: -edge[1]
+            ))
+            for emotion in self.emotions
+        }
+        self.related: Dict[str, List[str]] = {
+            emotion: [tag for tag, _ in edges] for emotion, edges in self.matches.items()
+        }
+        self._build_graph(float(data.get("fallback_weight", 0.5)))
+
+    def _build_graph(self, fallback_weight: float) -> None:
+        """预先计算每个标签可以匹配的标签及权重
+
+        主要情感直接取matches；相关情感反向找到所有包含它的主要情感（权重为边权），
+        以及这些主要情感的其他相关情感（权重为两条边权之积）。同一标签取最大权重。
+        不在词典中的标签（如neutral）可以匹配任意主要情感，权重为fallback_weight。
+        """
+        reverse: Dict[str, Dict[str, float]] = {}
+        for emotion, edges in self.matches.items():
+            for tag, weight in edges:
+                if tag in self.matches:
+                    continue
+                targets = reverse.setdefault(tag, {})
+                targets[emotion] = max(targets.get(emotion, 0.0), weight)
+                for sibling, sibling_weight in edges:
+                    if sibling != tag:
+                        combined = weight * sibling_weight
+                        targets[sibling] = max(targets.get(sibling, 0.0), combined)
+
+        order = {tag: i for i, tag in enumerate(list(self.matches) + list(reverse))}
+        self.compatible: Dict[str, Tuple[Tuple[str, float], ...]] = dict(self.matches)
+        for tag, targets in reverse.items():
+            self.compatible[tag] = tuple(sorted(targets.items(), key=lambda edge: (-edge[1], order[edge[0]])))
+        self.tags: Tuple[str, ...] = tuple(order)
+        self._fallback = tuple((emotion, fallback_weight) for emotion in self.emotions)
+        self._matching_tags: Dict[str, Tuple[str, ...]] = {
+            tag: tuple(target for target, _ in edges) for tag, edges in self.compatible.items()
+        }
+        self._fallback_tags = tuple(self.emotions)
+
+        # 两个标签的匹配权重取两个方向中较大的一个
+        self._pair_weights: Dict[Tuple[str, str], float] = {}
+        for tag, edges in self.compatible.items():
+            for target, weight in edges:
+                for key in ((tag, target), (target, tag)):
+                    if weight > self._pair_weights.get(key, 0.0):
+                        self._pair_weights[key] = weight
+        self._fallback_weight = fallback_weight
+
+    @classmethod
+    def load(cls, path) -> "Lexicon":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def keywords(self) -> Dict[str, List[str]]:
+        """各情感的关键词"""
+        result = {emotion: [] for emotion in self.emotions}
+        for keyword, (index, _) in self._keywords.items():
+            result[self.emotions[index]].append(keyword)
+        return result
+
+    def candidates(self, emotion_tag: str) -> Tuple[Tuple[str, float], ...]:
+        """可以匹配的标签及权重，按权重从高到低"""
+        return self.compatible.get(emotion_tag, self._fallback)
+
+    def matching_tags(self, emotion_tag: str) -> Tuple[str, ...]:
+        """可以匹配的标签，按权重从高到低"""
+        return self._matching_tags.get(emotion_tag, self._fallback_tags)
+
+    def compatibility(self, emotion_tag: str, other_tag: str) -> float:
+        """两个标签的匹配权重，不能匹配时为0"""
+        weight = self._pair_weights.get((emotion_tag, other_tag))
+        if weight is not None:
+            return weight
+        # 不在词典中的标签与任意主要情感都能匹配
+        if (emotion_tag not in self.compatible and other_tag in self.matches) or \
+                (other_tag not in self.compatible and emotion_tag in self.matches):
+            return self._fallback_weight
+        return 0.0
+
+    def _weights(self, content: str) -> List[float]:
+        found = {}
+        negated = self._negated
+        search = self._search
+        match = search(content)
+        while match is not None:
+            start = match.start()
+            longest = match.group()
+            keywords = [keyword for keyword in (longest, *self._prefixes.get(longest, ())) if keyword not in found]
+            if keywords and not (
+                negated is not None and start and negated(content, max(0, start - self._negation_span), start)
+            ):
+                for keyword in keywords:
+                    found[keyword] = self._keywords[keyword]
+            # 从下一个字符继续，与这次匹配重叠的关键词也能找到
+            match = search(content, start + 1)
+        weights = [0.0] * len(self.emotions)
+        for index, weight in found.values():
+            weights[index] += weight
+        return weights
+
+    def scores(self, content: str) -> Dict[str, float]:
+        """各情感的得分，只包含得分大于0的情感"""
+        return {self.emotions[i]: w for i, w in enumerate(self._weights(content)) if w > 0}
+
+    def classify(self, content: str) -> str:
+        """得分最高的情感（同分时取靠前的），没有匹配时返回neutral"""
+        weights = self._weights(content)
+        best = max(weights)
+        if best <= 0:
+            return "neutral"
+        return self.emotions[weights.index(best)]
+
+    def classify_many(self, contents: Iterable[str]) -> List[str]:
+        """批量分类"""
+        classify = self.classify
+        return [classify(content) for content in contents]
+
+
+def _lexicon_path() -> Path:
+    return Path(settings.emotion_lexicon_path) if settings.emotion_lexicon_path else DEFAULT_LEXICON_PATH
+
+
+_lexicon = Lexicon.load(_lexicon_path())
+_lexicon_mtime: Optional[float] = os.path.getmtime(_lexicon_path())
+metrics.set_gauge("emotion_lexicon_version", _lexicon.version)
+
+
+def current_lexicon() -> Lexicon:
+    """当前生效的词典"""
+    return _lexicon
+
+
+async def reload_lexicon(path=None) -> Lexicon:
+    """在线程中重新加载词典文件，构建完成后原子替换，文件有误时抛出异常且保留旧词典
+
+    读文件和构建匹配表可能耗时几十毫秒，放到线程里避免阻塞事件循环；
+    替换只是一次全局赋值，请求看到的要么是旧词典要么是新词典。
+    """
+    global _lexicon, _lexicon_mtime
+    path = Path(path) if path else _lexicon_path()
+    mtime = await asyncio.to_thread(os.path.getmtime, path)
+    lexicon = await asyncio.to_thread(Lexicon.load, path)
+    _lexicon, _lexicon_mtime = lexicon, mtime
+    metrics.incr("emotion_lexicon_reloads_total")
+    metrics.set_gauge("emotion_lexicon_version", lexicon.version)
+    return lexicon
+
+
+async def watch_lexicon(interval: float) -> None:
+    """按固定间隔检查词典文件，修改时间变化时重新加载，直到任务被取消"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await asyncio.to_thread(os.path.getmtime, _lexicon_path()) != _lexicon_mtime:
+                lexicon = await reload_lexicon()
+                print(f"情感词典已更新到版本 {lexicon.version}")
+        except Exception as e:
+            metrics.incr("emotion_lexicon_reload_errors_total")
+            print(f"情感词典加载失败: {str(e)}")
+
+
+def emotion_matches() -> Dict[str, List[str]]:
+    """情感标签及其相关/对应标签"""
+    return _lexicon.related
+
+
+def analyze_emotion(content: str) -> str:
+    """简单的情感分析，返回情感标签"""
+    return _lexicon.classify(content)
+
+
+def analyze_emotions(contents: Iterable[str]) -> List[str]:
+    """批量情感分析，返回与contents一一对应的情感标签"""
+    return _lexicon.classify_many(contents)
+
+
+def emotion_scores(content: str) -> Dict[str, float]:
+    """各情感的加权关键词得分"""
+    return _lexicon.scores(content)
+
+
+def find_matching_emotion(emotion_tag: str) -> Tuple[str, ...]:
+    """找到匹配的情感标签，按匹配权重从高到低；未知标签返回所有主要情感"""
+    return _lexicon.matching_tags(emotion_tag)
+
+
+def emotion_candidates(emotion_tag: str) -> Tuple[Tuple[str, float], ...]:
+    """可以匹配的情感标签及权重，按权重从高到低"""
+    return _lexicon.candidates(emotion_tag)
+
+
+def emotion_compatibility(emotion_tag: str, other_tag: str) -> float:
+    """两个情感标签的匹配权重，不能匹配时为0"""
+    return _lexicon.compatibility(emotion_tag, other_tag)
@@ -0,0 +1,91 @@
+"""
+进程内事件发布/订阅
+
+匹配创建、信箱解锁等事件发布到主题（如 user:<用户ID>），由实时推送连接订阅。
+每个订阅有一个有界队列：消费太慢导致队列满时丢弃最旧的事件并标记溢出，
+推送端据此通知客户端重新拉取一次完整数据，发布方永远不会被慢连接阻塞。
+事件只在当前进程内分发，多进程部署时每个连接只能收到所在进程产生的事件。
+"""
+import asyncio
+from typing import Dict, Iterable, Optional, Set
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+settings = get_settings()
+
+
+def user_topic(user_id) -> str:
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """一个连接的订阅，事件按发布顺序进入有界队列"""
+
+    def __init__(self, topics: Iterable[str], max_queue: int):
+        self.topics = frozenset(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        # 自上次取出后是否因队列已满丢弃过事件
+        self.overflowed = False
+
+    def offer(self, event: dict) -> None:
+        """放入一个事件，队列满时丢弃最旧的一个"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.overflowed = True
+            metrics.incr("event_hub_dropped_total")
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """等待下一个事件，超时返回None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventHub:
+    """按主题分发事件"""
+
+    def __init__(self, max_queue: int = 0):
+        self.max_queue = max_queue or settings.event_queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, *topics: str) -> Subscription:
+        subscription = Subscription(topics, self.max_queue)
+        for topic in subscription.topics:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        metrics.incr("event_hub_subscriptions_total")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for topic in subscription.topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def has_subscribers(self, topic: Optional[str] = None) -> bool:
+        """是否有连接订阅了该主题（不传主题时表示是否有任何订阅）"""
+        if topic is None:
+            return bool(self._subscribers)
+        return topic in self._subscribers
+
+    def publish(self, topic: str, event: dict) -> int:
+        """发布事件，返回收到事件的订阅数"""
+        subscribers = self._subscribers.get(topic)
+        if not subscribers:
+            return 0
+        for subscription in subscribers:
+            subscription.offer(event)
+        metrics.incr("event_hub_published_total")
+        return len(subscribers)
+
+    def stats(self) -> dict:
+        connections = set().union(*self._subscribers.values()) if self._subscribers else set()
+        return {"topics": len(self._subscribers), "subscriptions": len(connections)}
+
+
+event_hub = EventHub()
+metrics.register_collector("event_hub", event_hub.stats)
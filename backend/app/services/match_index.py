@@ -0,0 +1,288 @@
+"""
+未匹配呼喊的内存索引
+
+按情感标签分桶保存尚未匹配的呼喊，挑选候选时无需查询数据库。
+索引只是数据库的缓存：启动时从echo_wall预热，插入和匹配时同步更新，
+并定期与数据表核对。容量有上限，索引满后新呼喊不再加入，候选查找退回数据库。
+
+安装NumPy时，每个标签下呼喊的文本特征还按槽位存放在一个矩阵中，挑选候选时对每个可匹配标签
+的矩阵做一次矩阵向量乘法算出余弦相似度，按 标签权重 + 相似度 选出最合适的一条。
+"""
+import asyncio
+from collections import OrderedDict
+from itertools import count
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.repositories import EchoWallRepository
+from app.services.text_features import FEATURE_DIM, decode_features, encode_vector, np, similarity_available
+
+settings = get_settings()
+
+# 每个桶内为跳过同一用户的呼喊最多向后查看的条目数
+_MAX_SCAN_PER_BUCKET = 32
+
+
+class _Entry(NamedTuple):
+    seq: int
+    user_id: str
+    emotion_tag: str
+    # 在特征矩阵中的槽位，未启用相似度时为-1
+    slot: int = -1
+
+
+class _VectorStore:
+    """一个情感标签下呼喊的特征矩阵，槽位复用，容量按需翻倍"""
+
+    def __init__(self):
+        self.vectors = np.zeros((0, FEATURE_DIM), dtype=np.float32)
+        self.users = np.zeros(0, dtype=np.int64)
+        self.active = np.zeros(0, dtype=bool)
+        self.ids: List[Optional[str]] = []
+        # 已使用过的最大槽位数，打分只看这一段
+        self.size = 0
+        self._free: List[int] = []
+
+    def _grow(self) -> None:
+        capacity = max(64, len(self.ids) * 2)
+        for name in ("vectors", "users", "active"):
+            old = getattr(self, name)
+            new = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.ids.extend([None] * (capacity - len(self.ids)))
+
+    def put(self, echo_id: str, user_id: str, vector) -> int:
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self.size >= len(self.ids):
+                self._grow()
+            slot = self.size
+            self.size += 1
+        self.vectors[slot] = 0.0 if vector is None else vector
+        self.users[slot] = hash(user_id)
+        self.active[slot] = True
+        self.ids[slot] = echo_id
+        return slot
+
+    def clear(self, slot: int) -> None:
+        self.active[slot] = False
+        self.ids[slot] = None
+        self._free.append(slot)
+
+    def best(self, user_id: str, query, excluded_slots: Iterable[int]) -> Optional[Tuple[float, str]]:
+        """返回余弦相似度最高的 (相似度, 呼喊ID)，没有候选时返回None"""
+        n = self.size
+        eligible = self.active[:n] & (self.users[:n] != hash(user_id))
+        for slot in excluded_slots:
+            eligible[slot] = False
+        if not eligible.any():
+            return None
+        scores = self.vectors[:n] @ query
+        scores[~eligible] = -np.inf
+        slot = int(np.argmax(scores))
+        return float(scores[slot]), self.ids[slot]
+
+
+class MatchIndex:
+    """按情感标签分桶的未匹配呼喊索引"""
+
+    def __init__(self, max_size: int = 0):
+        self.max_size = max_size or settings.match_index_max_size
+        self._seq = count()
+        self._entries: Dict[str, _Entry] = {}
+        # 情感标签 -> 该标签下呼喊的特征矩阵；为None表示不按相似度挑选
+        self._vectors: Optional[Dict[str, _VectorStore]] = (
+            {} if settings.match_similarity_enabled and similarity_available() else None
+        )
+        # 情感标签 -> 该标签下的呼喊ID（按插入顺序）
+        self._buckets: Dict[str, "OrderedDict[str, None]"] = {}
+        # 核对期间被移除的呼喊，避免核对时用过期的查询结果把它们加回来
+        self._removed: Set[str] = set()
+        self._reconciling = False
+        self.ready = False
+        # 为True表示索引包含数据库中全部未匹配呼喊，找不到候选时可以不再查库
+        self.complete = False
+        # 多个工作进程时其他进程也会写入呼喊，索引永远不视为完整
+        self.shared = settings.server_multi_process
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, echo_id: str) -> bool:
+        return echo_id in self._entries
+
+    def add(self, echo_id: str, emotion_tag: str, user_id: str, features: Optional[str] = None) -> None:
+        """加入一条未匹配的呼喊，features为encode_features的结果"""
+        if echo_id in self._entries:
+            return
+        if len(self._entries) >= self.max_size:
+            # 保留较早的呼喊，新的呼喊只能通过数据库查到
+            self.complete = False
+            metrics.incr("match_index_rejected_total")
+            return
+        slot = -1
+        if self._vectors is not None:
+            store = self._vectors.get(emotion_tag)
+            if store is None:
+                store = self._vectors[emotion_tag] = _VectorStore()
+            slot = store.put(echo_id, user_id, decode_features(features))
+        self._entries[echo_id] = _Entry(next(self._seq), user_id, emotion_tag, slot)
+        self._buckets.setdefault(emotion_tag, OrderedDict())[echo_id] = None
+
+    def get(self, echo_id: str) -> Optional[dict]:
+        """索引中一条呼喊的id、user_id、emotion_tag和features，可以原样传给add放回索引"""
+        entry = self._entries.get(echo_id)
+        if entry is None:
+            return None
+        features = None
+        if entry.slot >= 0:
+            features = encode_vector(self._vectors[entry.emotion_tag].vectors[entry.slot])
+        return {"id": echo_id, "user_id": entry.user_id, "emotion_tag": entry.emotion_tag, "features": features}
+
+    def discard(self, echo_id: str) -> None:
+        """移除一条呼喊（已匹配或已删除）"""
+        entry = self._entries.pop(echo_id, None)
+        if entry is None:
+            return
+        if self._reconciling:
+            self._removed.add(echo_id)
+        if entry.slot >= 0:
+            self._vectors[entry.emotion_tag].clear(entry.slot)
+        bucket = self._buckets.get(entry.emotion_tag)
+        if bucket is not None:
+            bucket.pop(echo_id, None)
+            if not bucket:
+                del self._buckets[entry.emotion_tag]
+
+    def pick(
+        self,
+        candidates: Iterable[Tuple[str, float]],
+        user_id: str,
+        exclude_ids: Iterable[str] = (),
+        features: Optional[str] = None,
+        remove: bool = True
+    ) -> Optional[str]:
+        """在若干(标签, 权重)中挑选候选，remove为True时将其从索引中移除
+
+        提供了features且启用相似度时，在所有可匹配标签下按 标签权重 + 内容相似度 挑选；
+        否则优先选择权重最高的标签，同权重时选择最早进入索引的呼喊。
+        同一用户的呼喊和exclude_ids中的呼喊不会被选中；没有候选时返回None。
+        """
+        excluded = set(exclude_ids)
+        query = decode_features(features) if self._vectors is not None else None
+        if query is not None:
+            best = self._pick_similar(candidates, user_id, excluded, query)
+        else:
+            best = self._pick_oldest(candidates, user_id, excluded)
+        if best is None:
+            metrics.incr("match_index_misses_total")
+            return None
+        metrics.incr("match_index_hits_total")
+        if remove:
+            self.discard(best)
+        return best
+
+    def _pick_similar(self, candidates, user_id: str, excluded: Set[str], query) -> Optional[str]:
+        """只对可匹配标签下的呼喊打分：标签权重 + 相似度权重 * 余弦相似度"""
+        best: Optional[str] = None
+        best_score = float("-inf")
+        for tag, weight in candidates:
+            store = self._vectors.get(tag)
+            if store is None or not self._buckets.get(tag):
+                continue
+            excluded_slots = [
+                self._entries[echo_id].slot for echo_id in excluded
+                if echo_id in self._entries and self._entries[echo_id].emotion_tag == tag
+            ]
+            result = store.best(user_id, query, excluded_slots)
+            if result is None:
+                continue
+            similarity, echo_id = result
+            score = weight + settings.match_similarity_weight * similarity
+            if score > best_score:
+                best, best_score = echo_id, score
+        return best
+
+    def _pick_oldest(self, candidates, user_id: str, excluded: Set[str]) -> Optional[str]:
+        best: Optional[str] = None
+        best_key = None
+        for tag, weight in candidates:
+            bucket = self._buckets.get(tag)
+            if not bucket:
+                continue
+            for scanned, echo_id in enumerate(bucket):
+                if scanned >= _MAX_SCAN_PER_BUCKET:
+                    break
+                entry = self._entries[echo_id]
+                if entry.user_id == user_id or echo_id in excluded:
+                    continue
+                key = (-weight, entry.seq)
+                if best_key is None or key < best_key:
+                    best, best_key = echo_id, key
+                break
+        return best
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "buckets": len(self._buckets),
+            "ready": self.ready,
+            "complete": self.complete,
+            "similarity": self._vectors is not None,
+        }
+
+    async def reconcile(self, echoes: EchoWallRepository) -> dict:
+        """与echo_wall表核对并修正索引
+
+        返回本次核对发现的缺失条目数（表中有、索引中没有）和过期条目数（索引中有、表中已匹配或删除）。
+        """
+        # 查询期间新加入或被移除的条目以索引为准
+        started_seq = next(self._seq)
+        self._removed.clear()
+        self._reconciling = True
+        try:
+            rows = await echoes.list_unmatched(limit=self.max_size + 1)
+        finally:
+            self._reconciling = False
+        complete = len(rows) <= self.max_size
+        rows = rows[:self.max_size]
+        db_ids = {row["id"] for row in rows}
+
+        stale = [
+            echo_id for echo_id, entry in self._entries.items()
+            if echo_id not in db_ids and entry.seq < started_seq
+        ]
+        for echo_id in stale:
+            self.discard(echo_id)
+        missing = [
+            row for row in rows
+            if row["id"] not in self._entries and row["id"] not in self._removed
+        ]
+        for row in missing:
+            self.add(row["id"], row["emotion_tag"], row["user_id"], row.get("features"))
+
+        self._removed.clear()
+        self.complete = complete and not self.shared
+        self.ready = True
+        result = {"missing": len(missing), "stale": len(stale), "size": len(self._entries)}
+        metrics.incr("match_index_checks_total")
+        metrics.set_gauge("match_index_last_missing", len(missing))
+        metrics.set_gauge("match_index_last_stale", len(stale))
+        return result
+
+    async def run_consistency_checks(self, echoes: EchoWallRepository, interval: float) -> None:
+        """按固定间隔核对索引，直到任务被取消"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reconcile(echoes)
+            except Exception as e:
+                print(f"匹配索引核对失败: {str(e)}")
+
+
+match_index = MatchIndex()
+metrics.register_collector("match_index", match_index.stats)
@@ -0,0 +1,258 @@
+"""
+未匹配呼喊的批量匹配
+
+逐条插入时的贪心匹配只看当时能找到的候选：较早的呼喊可能一直等不到更合适的对象，
+热门标签也会被先来的呼喊抢空。批量匹配定期载入全部未匹配呼喊，求一个总权重尽量大的配对：
+
+    权重 = 兼容度权重 * 标签兼容度 + 年龄权重 * 双方平均等待时长（以age_horizon为单位）
+         + 相似度权重 * 文本余弦相似度
+
+年龄分不设上限：等待超过age_horizon后它超过兼容度和相似度的差别，越早的呼喊越优先配对，
+供过于求的标签下滞留的是较新的呼喊，而不是一直等不到对象的旧呼喊。
+
+同一用户的呼喊之间没有边。精确的最大权匹配（带花算法）为O(n³)，池子较大时不可行。
+这里为每条呼喊在每个可匹配标签下按 兼容度 + 相似度 保留top_k个候选（同一标签下的候选年龄分
+相近时不会都指向最早的几条），选定候选后再加上年龄分，按权重从高到低贪心选取；
+候选都被别人占用的呼喊在剩下的呼喊中重新选候选，直到没有可用的边。
+结果是启发式的近似解，不保证最大权匹配的近似比。所有配对通过create_echo_matches一次写入。
+需要NumPy（pip install "backend[similarity]"）。
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.repositories import EchoMatchRepository, EchoWallRepository
+from app.services.emotion import current_lexicon
+from app.services.match_index import match_index
+from app.services.notifications import notify_matches
+from app.services.text_features import FEATURE_DIM, decode_features, np, similarity_available
+
+settings = get_settings()
+
+# 计算相似度时每次参与矩阵乘法的行数，限制临时矩阵的内存
+_CHUNK_ROWS = 1024
+
+
+@dataclass(frozen=True)
+class SolverWeights:
+    """批量匹配的权重参数"""
+    compatibility: float = 1.0
+    age: float = 1.0
+    similarity: float = 0.5
+    # 等待该时长（秒）时年龄分为1，之后继续线性增加
+    age_horizon: float = 21600.0
+    # 每条呼喊在每个可匹配标签下保留的候选边数
+    top_k: int = 5
+
+    @classmethod
+    def from_settings(cls) -> "SolverWeights":
+        return cls(
+            compatibility=settings.match_solver_compatibility_weight,
+            age=settings.match_solver_age_weight,
+            similarity=settings.match_solver_similarity_weight,
+            age_horizon=settings.match_solver_age_horizon,
+            top_k=settings.match_solver_top_k,
+        )
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _candidate_edges(rows_a, rows_b, same_tag: bool, compatibility: float,
+                     vectors, ages, users, weights: SolverWeights):
+    """标签A的每条呼喊到标签B中top_k个候选的边，返回 (权重, A下标, B下标) 三个数组
+
+    候选按 兼容度 + 相似度 挑选，返回的权重再加上双方的年龄分。
+    """
+    k = min(weights.top_k, len(rows_b))
+    found_w, found_i, found_j = [], [], []
+    vectors_b, ages_b, users_b = vectors[rows_b], ages[rows_b], users[rows_b]
+    for start in range(0, len(rows_a), _CHUNK_ROWS):
+        chunk = rows_a[start:start + _CHUNK_ROWS]
+        w = vectors[chunk] @ vectors_b.T
+        w *= weights.similarity
+        w += weights.compatibility * compatibility
+        w[users[chunk][:, None] == users_b[None, :]] = -np.inf
+        if same_tag:
+            # 同标签内只保留 i < j 的边，也去掉自身
+            w[np.arange(len(chunk))[:, None] + start >= np.arange(len(rows_b))[None, :]] = -np.inf
+        if k < len(rows_b):
+            top = np.argpartition(w, len(rows_b) - k, axis=1)[:, len(rows_b) - k:]
+        else:
+            top = np.broadcast_to(np.arange(len(rows_b)), w.shape)
+        top_w = np.take_along_axis(w, top, axis=1)
+        keep = np.isfinite(top_w)
+        edge_i = np.broadcast_to(chunk[:, None], top.shape)[keep]
+        edge_j = rows_b[top[keep]]
+        found_w.append(top_w[keep] + (weights.age / 2) * (ages[edge_i] + ages[edge_j]))
+        found_i.append(edge_i)
+        found_j.append(edge_j)
+    return found_w, found_i, found_j
+
+
+def solve_matching(
+    echoes: List[dict],
+    now: Optional[float] = None,
+    weights: Optional[SolverWeights] = None
+) -> List[Tuple[dict, dict, float]]:
+    """在一批未匹配呼喊中求配对，返回 (较早的呼喊, 较晚的呼喊, 权重) 列表，按权重从高到低
+
+    echoes需包含id、user_id、emotion_tag、created_at，可选features。
+    """
+    if not similarity_available():
+        raise RuntimeError("批量匹配需要安装NumPy")
+    weights = weights or SolverWeights.from_settings()
+    now = time.time() if now is None else now
+    n = len(echoes)
+    if n < 2:
+        return []
+
+    vectors = np.zeros((n, FEATURE_DIM), dtype=np.float32)
+    created = np.empty(n, dtype=np.float64)
+    users = np.empty(n, dtype=np.int64)
+    for i, echo in enumerate(echoes):
+        vector = decode_features(echo.get("features"))
+        if vector is not None:
+            vectors[i] = vector
+        created[i] = _timestamp(echo["created_at"])
+        users[i] = hash(str(echo["user_id"]))
+    ages = np.maximum((now - created) / weights.age_horizon, 0.0).astype(np.float32)
+    tags = [echo["emotion_tag"] for echo in echoes]
+
+    lexicon = current_lexicon()
+    used = bytearray(n)
+    pairs = []
+    remaining = list(range(n))
+    while len(remaining) >= 2:
+        groups: Dict[str, List[int]] = {}
+        for i in remaining:
+            groups.setdefault(tags[i], []).append(i)
+        indices = {tag: np.array(rows, dtype=np.int64) for tag, rows in groups.items()}
+        all_w, all_i, all_j = [], [], []
+        for tag_a, rows_a in indices.items():
+            for tag_b, rows_b in indices.items():
+                compatibility = lexicon.compatibility(tag_a, tag_b)
+                if compatibility <= 0:
+                    continue
+                found = _candidate_edges(
+                    rows_a, rows_b, tag_a == tag_b, compatibility, vectors, ages, users, weights
+                )
+                all_w += found[0]
+                all_i += found[1]
+                all_j += found[2]
+        edge_w = np.concatenate(all_w) if all_w else np.zeros(0)
+        if not len(edge_w):
+            break
+        order = np.argsort(-edge_w, kind="stable")
+        edge_i = np.concatenate(all_i)[order].tolist()
+        edge_j = np.concatenate(all_j)[order].tolist()
+        edge_w = edge_w[order].tolist()
+
+        # 按权重从高到低贪心选边；权重最高的边总能选上，每一轮至少配出一对
+        for w, i, j in zip(edge_w, edge_i, edge_j):
+            if used[i] or used[j]:
+                continue
+            used[i] = used[j] = 1
+            first, second = (i, j) if created[i] <= created[j] else (j, i)
+            pairs.append((echoes[first], echoes[second], w))
+        remaining = [i for i in remaining if not used[i]]
+    pairs.sort(key=lambda pair: pair[2], reverse=True)
+    return pairs
+
+
+class BatchMatcher:
+    """定期对未匹配呼喊做一次批量匹配的后台任务"""
+
+    def __init__(self):
+        self.interval = settings.match_solver_interval
+        self.max_pool = settings.match_solver_max_pool
+        self._task: Optional[asyncio.Task] = None
+        self._echoes: Optional[EchoWallRepository] = None
+        self._matches: Optional[EchoMatchRepository] = None
+        self._last: dict = {}
+        # 正在求解或写入时为True，停止时等这一轮做完
+        self._busy = False
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, echoes: EchoWallRepository, matches: EchoMatchRepository) -> None:
+        """启动后台任务；未安装NumPy时抛出异常，避免批量模式下呼喊一直没有匹配"""
+        if self.running:
+            return
+        if not similarity_available():
+            raise RuntimeError("MATCH_MODE=batch 需要NumPy，请安装 similarity 可选依赖（uv sync --extra similarity）")
+        self._echoes = echoes
+        self._matches = matches
+        self._task = asyncio.create_task(self._run())
+        metrics.register_collector("match_solver", self.stats)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """停止后台任务：空闲时直接取消，正在进行的一轮最多等待timeout秒"""
+        if self._task is None:
+            return
+        self._stopping = True
+        if not self._busy:
+            self._task.cancel()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+        self._task = None
+        self._stopping = False
+
+    async def run_once(self) -> int:
+        """载入未匹配呼喊、求解并一次写入，返回创建的匹配数量"""
+        rows = await self._echoes.list_unmatched(limit=self.max_pool)
+        started = time.perf_counter()
+        # 求解是纯CPU计算，放到线程中避免阻塞事件循环
+        pairs = await asyncio.to_thread(solve_matching, rows)
+        solve_seconds = time.perf_counter() - started
+        created = await self._matches.create_many([(first["id"], second["id"]) for first, second, _ in pairs])
+        for match in created:
+            match_index.discard(match["echo_id"])
+            match_index.discard(match["matched_echo_id"])
+        await notify_matches(
+            self._echoes, created,
+            {echo["id"]: str(echo["user_id"]) for first, second, _ in pairs for echo in (first, second)}
+        )
+        metrics.observe("match_solver_seconds", solve_seconds)
+        metrics.incr("match_solver_runs_total")
+        metrics.incr("matches_created_total", len(created))
+        self._last = {
+            "pool": len(rows),
+            "pairs": len(pairs),
+            "created": len(created),
+            "solve_seconds": round(solve_seconds, 4),
+        }
+        return len(created)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(self.interval)
+            self._busy = True
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"批量匹配失败: {str(e)}")
+            finally:
+                self._busy = False
+
+    def stats(self) -> dict:
+        return {"running": self.running, "last_run": self._last}
+
+
+batch_matcher = BatchMatcher()
@@ -0,0 +1,195 @@
+"""
+后台匹配工作者
+
+新呼喊的ID进入队列，由单独的asyncio任务按微批次取出：
+同一批次内先两两配对，剩余的再到数据库中找候选，冲突时重新入队重试。
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.repositories import EchoWallRepository, EchoMatchRepository
+from app.services.match_index import match_index
+from app.services.matching import match_echo, pair_compatible
+from app.services.notifications import notify_matches
+
+settings = get_settings()
+
+
+@dataclass
+class MatchJob:
+    """一条待匹配的呼喊"""
+    echo_id: str
+    emotion_tag: str
+    user_id: str
+    features: Optional[str] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+    def as_echo(self) -> dict:
+        return {
+            "id": self.echo_id,
+            "emotion_tag": self.emotion_tag,
+            "user_id": self.user_id,
+            "features": self.features,
+            "job": self
+        }
+
+
+class MatchWorker:
+    """按微批次处理匹配队列的后台任务"""
+
+    def __init__(self):
+        self.batch_size = settings.match_batch_size
+        self.batch_window = settings.match_batch_window
+        self.max_retries = settings.match_max_retries
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.match_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._echoes: Optional[EchoWallRepository] = None
+        self._matches: Optional[EchoMatchRepository] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, echoes: EchoWallRepository, matches: EchoMatchRepository) -> None:
+        """启动后台任务"""
+        if self.running:
+            return
+        self._echoes = echoes
+        self._matches = matches
+        self._task = asyncio.create_task(self._run())
+        metrics.register_collector("match_queue", self.stats)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """等待队列处理完毕后停止，超时则直接取消"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def submit(self, job: MatchJob) -> bool:
+        """提交一条呼喊，队列已满或工作者未运行时返回False"""
+        if not self.running:
+            return False
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            metrics.incr("match_queue_rejected_total")
+            return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "running": self.running,
+        }
+
+    async def _collect_batch(self) -> List[MatchJob]:
+        """阻塞等待第一条，再在时间窗口内尽量凑满一批"""
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+            try:
+                await self._process(batch)
+            except Exception as e:
+                print(f"匹配批次处理失败: {str(e)}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _process(self, batch: List[MatchJob]) -> None:
+        started = time.perf_counter()
+        claimed = {job.echo_id for job in batch}
+
+        # 排队期间可能已被其他呼喊选为候选，这些不再需要匹配
+        try:
+            unmatched = set(await self._echoes.filter_unmatched(list(claimed)))
+        except Exception:
+            for job in batch:
+                self._retry(job)
+            return
+        for job in batch:
+            if job.echo_id not in unmatched:
+                match_index.discard(job.echo_id)
+                self._done(job)
+        batch = [job for job in batch if job.echo_id in unmatched]
+
+        pairs, remaining = pair_compatible([job.as_echo() for job in batch])
+
+        # 同批次内可以互相匹配的呼喊直接配对
+        for first, second in pairs:
+            try:
+                match = await self._matches.create(first["id"], second["id"])
+                if match is None:
+                    # 其中一方已被其他进程认领，重试时会被过滤掉
+                    raise RuntimeError("匹配认领失败")
+                await notify_matches(
+                    self._echoes, [match], {echo["id"]: echo["user_id"] for echo in (first, second)}
+                )
+                match_index.discard(first["id"])
+                match_index.discard(second["id"])
+                metrics.incr("matches_created_total")
+                self._done(first["job"])
+                self._done(second["job"])
+            except Exception:
+                self._retry(first["job"])
+                self._retry(second["job"])
+
+        # 剩余的到数据库中寻找候选，排除本批次已占用的呼喊
+        for echo in remaining:
+            job: MatchJob = echo["job"]
+            try:
+                match = await match_echo(
+                    self._echoes, self._matches,
+                    job.echo_id, job.emotion_tag, job.user_id,
+                    exclude_ids=claimed - {job.echo_id},
+                    features=job.features
+                )
+            except Exception:
+                self._retry(job)
+                continue
+            if match:
+                metrics.incr("matches_created_total")
+                claimed.add(match["matched_echo_id"])
+            self._done(job)
+
+        metrics.observe("match_batch_seconds", time.perf_counter() - started)
+        metrics.incr("match_batches_total")
+
+    def _done(self, job: MatchJob) -> None:
+        metrics.observe("match_lag_seconds", time.monotonic() - job.enqueued_at)
+
+    def _retry(self, job: MatchJob) -> None:
+        """冲突或临时错误时重新入队"""
+        metrics.incr("match_conflicts_total")
+        job.attempts += 1
+        if job.attempts > self.max_retries or not self.submit(job):
+            metrics.incr("match_failures_total")
+            self._done(job)
+
+
+match_worker = MatchWorker()
@@ -0,0 +1,170 @@
+"""
+回音匹配
+"""
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.repositories import EchoWallRepository, EchoMatchRepository
+from app.services.emotion import emotion_candidates, emotion_compatibility
+from app.services.match_index import match_index
+from app.services.notifications import notify_matches
+from app.services.text_features import decode_features
+
+settings = get_settings()
+
+
+def pair_compatible(echoes: List[dict]) -> Tuple[List[Tuple[dict, dict]], List[dict]]:
+    """在一批新呼喊之间两两配对
+
+    返回 (配对列表, 未能配对的呼喊)，同一用户的呼喊不会被配对。
+    """
+    pairs = []
+    remaining = []
+    for echo in echoes:
+        # 在等待中的呼喊里选择匹配权重最高的一个，同权重时选择最早的
+        partner, best = None, 0.0
+        for other in remaining:
+            if other["user_id"] == echo["user_id"]:
+                continue
+            weight = emotion_compatibility(echo["emotion_tag"], other["emotion_tag"])
+            if weight > best:
+                partner, best = other, weight
+        if partner is None:
+            remaining.append(echo)
+        else:
+            remaining.remove(partner)
+            pairs.append((partner, echo))
+    return pairs, remaining
+
+
+def _choose_row(rows: List[dict], weights: Dict[str, float], features: Optional[str]) -> dict:
+    """从数据库返回的候选中选择一条
+
+    能按内容打分时选 标签权重 + 相似度 最高的，否则按标签权重随机选择。
+    """
+    query = decode_features(features) if settings.match_similarity_enabled else None
+    if query is not None:
+        vectors = [decode_features(row.get("features")) for row in rows]
+        scores = [
+            weights.get(row["emotion_tag"], 0.0)
+            + (settings.match_similarity_weight * float(vector @ query) if vector is not None else 0.0)
+            for row, vector in zip(rows, vectors)
+        ]
+        return rows[scores.index(max(scores))]
+    return random.choices(rows, weights=[weights.get(row["emotion_tag"], 0.0) for row in rows])[0]
+
+
+async def match_echo(
+    echoes: EchoWallRepository,
+    matches: EchoMatchRepository,
+    echo_id: str,
+    emotion_tag: str,
+    user_id: str,
+    exclude_ids: Iterable[str] = (),
+    features: Optional[str] = None
+) -> Optional[dict]:
+    """为一条呼喊挑选候选并认领创建匹配
+
+    features为呼喊文本的编码特征，提供时按内容相似度参与排序。
+    候选已被其他请求或工作进程认领时排除它、回到索引（或数据库）换一个候选重试，
+    直到认领成功、没有候选或这条呼喊自己已被别人选中；每次冲突都会排除一个候选，循环必然结束。
+    返回创建的匹配记录；没有候选时返回None。数据库错误会直接抛出。
+    """
+    # 找到可以匹配的情感标签及权重（按权重从高到低）
+    candidates = emotion_candidates(emotion_tag)
+    excluded = [echo_id, *exclude_ids]
+
+    while True:
+        candidate = await _find_candidate(echoes, candidates, user_id, excluded, features)
+        if candidate is None:
+            break
+        candidate_id = candidate["id"]
+
+        match_index.discard(echo_id)
+        match_index.discard(candidate_id)
+        try:
+            # 认领双方、创建匹配记录并更新匹配状态（单次原子调用）
+            match = await matches.create(echo_id, candidate_id)
+        except Exception:
+            match_index.add(echo_id, emotion_tag, user_id, features)
+            _restore(candidate)
+            raise
+        if match is not None:
+            await notify_matches(echoes, [match], {echo_id: user_id})
+            return match
+
+        # 认领失败：候选或自己已被其他请求匹配，仍未匹配的候选放回索引
+        metrics.incr("match_claim_conflicts_total")
+        excluded.append(candidate_id)
+        unmatched = await echoes.filter_unmatched([echo_id, candidate_id])
+        if candidate_id in unmatched:
+            _restore(candidate)
+        if echo_id not in unmatched:
+            return None
+
+    # 暂时没有匹配，留在索引中等待后来的呼喊
+    match_index.add(echo_id, emotion_tag, user_id, features)
+    return None
+
+
+def _restore(candidate: dict) -> None:
+    """把没能认领的候选放回索引"""
+    match_index.add(candidate["id"], candidate["emotion_tag"], candidate["user_id"], candidate.get("features"))
+
+
+async def _find_candidate(
+    echoes: EchoWallRepository,
+    candidates: Tuple[Tuple[str, float], ...],
+    user_id: str,
+    excluded: List[str],
+    features: Optional[str]
+) -> Optional[dict]:
+    """优先从内存索引中挑选候选；索引不完整且未命中时再查询数据库
+
+    返回候选的id、user_id、emotion_tag和features，认领失败时用来放回索引。
+    """
+    if match_index.ready:
+        candidate_id = match_index.pick(candidates, user_id, excluded, features, remove=False)
+        if candidate_id is not None:
+            return match_index.get(candidate_id)
+    if not (match_index.ready and match_index.complete):
+        matching_emotions = [tag for tag, _ in candidates]
+        # 一次查询找出所有可匹配的回音（不是自己的，未被匹配的），每个标签约10条候选
+        potential_matches = await echoes.find_unmatched(
+            matching_emotions,
+            user_id,
+            excluded,
+            limit=10 * len(matching_emotions)
+        )
+        if potential_matches:
+            return _choose_row(potential_matches, dict(candidates), features)
+    return None
+
+
+async def try_match_echo(
+    echoes: EchoWallRepository,
+    matches: EchoMatchRepository,
+    echo_id: str,
+    emotion_tag: str,
+    user_id: str,
+    created_at: Optional[float] = None,
+    features: Optional[str] = None
+):
+    """尝试为新的呼喊找到匹配，失败不影响主流程
+
+    created_at为呼喊写入时的time.monotonic()，用于统计匹配延迟。
+    """
+    try:
+        match = await match_echo(echoes, matches, echo_id, emotion_tag, user_id, features=features)
+        if match:
+            metrics.incr("matches_created_total")
+    except Exception as e:
+        # 匹配失败不影响主流程
+        metrics.incr("match_failures_total")
+        print(f"匹配失败: {str(e)}")
+    finally:
+        if created_at is not None:
+            metrics.observe("match_lag_seconds", time.monotonic() - created_at)
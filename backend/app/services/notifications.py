@@ -0,0 +1,72 @@
+"""
+实时推送事件
+
+把新建的匹配和解锁的信箱发布到相关用户的主题（匹配同时更新最近回音缓冲中的状态）。
+没有任何连接订阅时直接返回，
+不做额外查询；推送失败不影响匹配和解锁本身。
+"""
+from typing import Dict, Iterable, List, Optional
+
+from app.repositories import EchoWallRepository, TimeCapsuleRepository
+from app.services.event_hub import event_hub, user_topic
+from app.services.recent_feed import recent_feed
+
+
+def match_event(match: dict, echo_id: str) -> dict:
+    """推送给呼喊echo_id所属用户的匹配事件"""
+    return {"type": "match", "echo_id": echo_id, "match": match}
+
+
+def unlock_event(capsule_id: str) -> dict:
+    return {"type": "capsule_unlocked", "capsule_id": capsule_id}
+
+
+async def notify_matches(
+    echoes: EchoWallRepository,
+    created: Iterable[dict],
+    owners: Optional[Dict[str, str]] = None
+) -> None:
+    """推送匹配给双方用户
+
+    owners为已知的 呼喊ID -> 用户ID，缺少的一次查询补齐。
+    """
+    created = list(created)
+    recent_feed.mark_matched(
+        echo_id for match in created for echo_id in (match["echo_id"], match["matched_echo_id"])
+    )
+    if not created or not event_hub.has_subscribers():
+        return
+    try:
+        owners = dict(owners or {})
+        missing = [
+            echo_id for match in created for echo_id in (match["echo_id"], match["matched_echo_id"])
+            if echo_id not in owners
+        ]
+        if missing:
+            owners.update(await echoes.get_owners(missing))
+        for match in created:
+            for echo_id in (match["echo_id"], match["matched_echo_id"]):
+                if echo_id in owners:
+                    event_hub.publish(user_topic(owners[echo_id]), match_event(match, echo_id))
+    except Exception as e:
+        print(f"匹配推送失败: {str(e)}")
+
+
+async def notify_unlocked(
+    capsules: TimeCapsuleRepository,
+    capsule_ids: List[str],
+    owners: Optional[Dict[str, str]] = None
+) -> None:
+    """推送信箱解锁给所属用户；owners缺少的一次查询补齐"""
+    if not capsule_ids or not event_hub.has_subscribers():
+        return
+    try:
+        owners = dict(owners or {})
+        missing = [capsule_id for capsule_id in capsule_ids if capsule_id not in owners]
+        if missing:
+            owners.update({row["id"]: str(row["user_id"]) for row in await capsules.get_statuses(missing)})
+        for capsule_id in capsule_ids:
+            if capsule_id in owners:
+                event_hub.publish(user_topic(owners[capsule_id]), unlock_event(capsule_id))
+    except Exception as e:
+        print(f"解锁推送失败: {str(e)}")
@@ -0,0 +1,195 @@
+"""
+最近呼喊的内存环形缓冲
+
+按 (created_at, id) 升序保存时间窗口（默认24小时）内的匿名呼喊：发送呼喊时追加，
+超出时间窗口或容量的从头部淘汰。/recent 的分页和 ?since= 增量直接从缓冲读取，
+新呼喊同时发布到recent主题供实时订阅，每个读者的开销只与新呼喊数量有关。
+
+缓冲启动时从数据库载入并定期刷新；多进程部署时其他进程写入的呼喊在下次刷新后出现，
+?since= 增量和翻到缓冲开头的分页改为查询数据库。
+"""
+import asyncio
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.core.pagination import encode_cursor
+from app.repositories import EchoWallRepository
+from app.services.event_hub import event_hub
+
+settings = get_settings()
+
+RECENT_TOPIC = "recent"
+
+Key = Tuple[datetime, str]
+
+
+def public_echo(row: dict) -> dict:
+    """匿名展示用的呼喊：不含user_id和内部列"""
+    return {
+        "id": str(row["id"]),
+        "content": row["content"],
+        "emotion_tag": row.get("emotion_tag"),
+        "is_matched": row.get("is_matched", False),
+        "created_at": row["created_at"],
+    }
+
+
+def _parse_time(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def cursor_key(cursor: list) -> Key:
+    """把decode_cursor的结果转为缓冲中的排序键"""
+    return _parse_time(cursor[0]), str(cursor[1])
+
+
+def echo_cursor(entry: dict) -> str:
+    return encode_cursor(entry["created_at"], entry["id"])
+
+
+class RecentFeed:
+    """最近呼喊的环形缓冲"""
+
+    def __init__(self, max_size: int = 0, horizon: float = 0):
+        self.max_size = max_size or settings.recent_feed_max_size
+        self.horizon = horizon or settings.recent_feed_horizon
+        # 有效数据为 [_start, len) 段，淘汰时只移动起点，积累到一半时再整体压缩
+        self._keys: List[Key] = []
+        self._entries: List[Optional[dict]] = []
+        self._start = 0
+        self._by_id: Dict[str, dict] = {}
+        self.ready = False
+        # 为True表示缓冲包含时间窗口内的全部呼喊（没有因容量淘汰过窗口内的呼喊）
+        self.complete = False
+        # 多个工作进程时其他进程写入的呼喊要到下次刷新才进入缓冲，增量不能从缓冲读取
+        self.shared = settings.server_multi_process
+
+    def __len__(self) -> int:
+        return len(self._keys) - self._start
+
+    def _drop_first(self) -> None:
+        entry = self._entries[self._start]
+        self._by_id.pop(entry["id"], None)
+        self._entries[self._start] = None
+        self._start += 1
+
+    def _expire(self) -> None:
+        threshold = datetime.now(timezone.utc) - timedelta(seconds=self.horizon)
+        while self._start < len(self._keys) and self._keys[self._start][0] < threshold:
+            self._drop_first()
+        if self._start and self._start * 2 >= len(self._keys):
+            del self._keys[:self._start]
+            del self._entries[:self._start]
+            self._start = 0
+
+    def _insert(self, entry: dict) -> bool:
+        if entry["id"] in self._by_id:
+            return False
+        key = (_parse_time(entry["created_at"]), entry["id"])
+        if self._keys and key < self._keys[-1]:
+            position = bisect_right(self._keys, key, lo=self._start)
+            self._keys.insert(position, key)
+            self._entries.insert(position, entry)
+        else:
+            self._keys.append(key)
+            self._entries.append(entry)
+        self._by_id[entry["id"]] = entry
+        if len(self) > self.max_size:
+            self._drop_first()
+            self.complete = False
+        return True
+
+    def add(self, row: dict) -> Optional[dict]:
+        """加入一条新呼喊并发布给订阅者，返回匿名后的条目
+
+        缓冲未载入（或未启用）时只发布不保存。
+        """
+        entry = public_echo(row)
+        if self.ready:
+            if not self._insert(entry):
+                return None
+            self._expire()
+        event_hub.publish(RECENT_TOPIC, {"type": "echo", "cursor": echo_cursor(entry), "echo": entry})
+        return entry
+
+    def mark_matched(self, echo_ids: Iterable[str]) -> None:
+        for echo_id in echo_ids:
+            entry = self._by_id.get(str(echo_id))
+            if entry is not None:
+                entry["is_matched"] = True
+
+    def page(self, limit: int, cursor: Optional[list] = None) -> Optional[List[dict]]:
+        """按 (created_at, id) 倒序取cursor之后的最多limit + 1条
+
+        缓冲不完整且这一页会读到缓冲开头时返回None，由调用方查询数据库。
+        """
+        self._expire()
+        end = len(self._keys) if cursor is None else bisect_left(self._keys, cursor_key(cursor), lo=self._start)
+        begin = max(self._start, end - limit - 1)
+        if begin == self._start and not self.complete and end - begin <= limit:
+            return None
+        return self._entries[begin:end][::-1]
+
+    def since(self, cursor: list, limit: int) -> Optional[List[dict]]:
+        """按 (created_at, id) 升序取比cursor新的最多limit + 1条
+
+        cursor早于缓冲中保留的最早一条且缓冲不完整、或多进程部署时无法保证不漏，返回None。
+        """
+        if self.shared:
+            return None
+        self._expire()
+        key = cursor_key(cursor)
+        if not self.complete and (not len(self) or key < self._keys[self._start]):
+            return None
+        position = bisect_right(self._keys, key, lo=self._start)
+        return self._entries[position:position + limit + 1]
+
+    async def load(self, echoes: EchoWallRepository) -> int:
+        """从数据库重新载入时间窗口内的呼喊，返回新出现的条数（同时发布给订阅者）"""
+        threshold = (datetime.now(timezone.utc) - timedelta(seconds=self.horizon)).isoformat()
+        rows = await echoes.list_recent(threshold, self.max_size + 1)
+        previous, last_key = self._by_id, (self._keys[-1] if len(self) else None)
+        self._keys, self._entries, self._start, self._by_id = [], [], 0, {}
+        self.complete = len(rows) <= self.max_size and not self.shared
+        for row in reversed(rows[:self.max_size]):
+            self._insert(public_echo(row))
+        # 查询期间本进程新写入、查询结果中还没有的呼喊
+        newest = self._keys[-1] if self._keys else None
+        for entry in list(previous.values()):
+            if newest is None or (_parse_time(entry["created_at"]), entry["id"]) > newest:
+                self._insert(entry)
+        self._expire()
+        self.ready = True
+
+        fresh = [
+            entry for entry in self._entries[self._start:]
+            if entry["id"] not in previous and last_key is not None
+            and (_parse_time(entry["created_at"]), entry["id"]) > last_key
+        ]
+        for entry in fresh:
+            event_hub.publish(RECENT_TOPIC, {"type": "echo", "cursor": echo_cursor(entry), "echo": entry})
+        metrics.set_gauge("recent_feed_size", len(self))
+        return len(fresh)
+
+    async def run_refresh(self, echoes: EchoWallRepository, interval: float) -> None:
+        """按固定间隔从数据库刷新，直到任务被取消"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load(echoes)
+            except Exception as e:
+                print(f"最近回音刷新失败: {str(e)}")
+
+    def stats(self) -> dict:
+        return {"size": len(self), "max_size": self.max_size, "ready": self.ready, "complete": self.complete}
+
+
+recent_feed = RecentFeed()
+metrics.register_collector("recent_feed", recent_feed.stats)
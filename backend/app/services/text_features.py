@@ -0,0 +1,81 @@
+"""
+呼喊文本特征
+
+把文本中的字符1~3元组哈希到固定维度的计数向量，L2归一化后量化为int8，
+base64编码后随呼喊一起保存（echo_wall.features列），匹配时按内容相似度给候选排序。
+编码只依赖标准库；解码和批量打分需要NumPy（pip install "backend[similarity]"），
+未安装时similarity_available()为False，匹配退回只按情感标签权重挑选。
+"""
+import base64
+import zlib
+from typing import List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖
+    np = None
+
+# 向量维度，修改后已保存的特征全部失效
+FEATURE_DIM = 128
+_NGRAM_SIZES = (1, 2, 3)
+# 不参与特征的字符（空白和常见标点）
+_SEPARATORS = frozenset(" \t\r\n，。！？、；：,.!?;:\"'“”‘’（）()…~～-—")
+
+
+def similarity_available() -> bool:
+    """是否可以按内容相似度打分"""
+    return np is not None
+
+
+def text_features(content: str) -> List[float]:
+    """文本的归一化特征向量；没有有效字符时为全零向量"""
+    vector = [0.0] * FEATURE_DIM
+    for segment in _segments(content.lower()):
+        for size in _NGRAM_SIZES:
+            for start in range(len(segment) - size + 1):
+                gram = segment[start:start + size]
+                vector[zlib.crc32(gram.encode("utf-8")) % FEATURE_DIM] += 1.0
+    norm = sum(v * v for v in vector) ** 0.5
+    if norm == 0:
+        return vector
+    return [v / norm for v in vector]
+
+
+def _segments(content: str) -> List[str]:
+    """按空白和标点切分，n元组不跨越分隔符"""
+    segments, current = [], []
+    for char in content:
+        if char in _SEPARATORS:
+            if current:
+                segments.append("".join(current))
+                current = []
+        else:
+            current.append(char)
+    if current:
+        segments.append("".join(current))
+    return segments
+
+
+def encode_features(content: str) -> str:
+    """计算特征并编码为可保存的字符串（int8量化后base64）"""
+    quantized = bytes(round(v * 127) & 0xFF for v in text_features(content))
+    return base64.b64encode(quantized).decode("ascii")
+
+
+def encode_vector(vector) -> str:
+    """把decode_features得到的向量重新编码为保存用的字符串（需要NumPy）"""
+    quantized = np.rint(vector * 127).astype(np.int8)
+    return base64.b64encode(quantized.tobytes()).decode("ascii")
+
+
+def decode_features(value: Optional[str]):
+    """解码为float32向量（需要NumPy），值为空或格式不对时返回None"""
+    if np is None or not value:
+        return None
+    try:
+        raw = base64.b64decode(value)
+    except ValueError:
+        return None
+    if len(raw) != FEATURE_DIM:
+        return None
+    return np.frombuffer(raw, dtype=np.int8).astype(np.float32) / 127.0
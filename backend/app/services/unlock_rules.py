@@ -0,0 +1,256 @@
+"""
+解锁条件规则
+
+unlock_condition支持一个小型条件语言，例如：
+
+    after 2026-01-01
+    after 2026-01-01 and capsule 3f2c...e1 unlocked
+    echoes >= 3 or (before 2025-12-31 and not capsule 3f2c...e1 unlocked)
+
+- after/before 日期：当前时间晚于/早于该时间（无时区时按UTC）
+- capsule ID unlocked：同一用户的另一个信箱已解锁或已发布
+- echoes 比较符 数字：用户被匹配到的呼喊数量
+- 用 and/or/not（或 &&/||/!）和括号组合
+
+条件文本编译为闭包后按哈希缓存。不以上述关键字开头或无法解析的文本（如“after my birthday”）
+视为自由备注，照常保存但不参与自动判断。
+批量判断时先收集所有条件引用的信箱和用户，各用一次查询取回状态和计数。
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from app.repositories import EchoWallRepository, TimeCapsuleRepository
+
+_TOKEN = re.compile(r"\s*(?:(\(|\)|>=|<=|==|!=|=|>|<|&&|\|\||!)|([^\s()<>=!&|]+))")
+_KEYWORDS = {"after", "before", "capsule", "echoes", "not", "(", "!"}
+_COMPARE = {
+    ">=": lambda a, b: a >= b,
+    ">": lambda a, b: a > b,
+    "<=": lambda a, b: a <= b,
+    "<": lambda a, b: a < b,
+    "=": lambda a, b: a == b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+}
+
+
+class ConditionError(ValueError):
+    """条件文本无法解析"""
+
+
+@dataclass
+class UnlockContext:
+    """判断条件所需的数据"""
+    now: datetime
+    user_id: str = ""
+    # 信箱ID -> (所属用户ID, 状态)
+    capsules: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    # 用户ID -> 被匹配的呼喊数量
+    echo_counts: Dict[str, int] = field(default_factory=dict)
+
+
+Predicate = Callable[[UnlockContext], bool]
+
+
+@dataclass(frozen=True)
+class CompiledCondition:
+    """编译后的条件；predicate为None表示自由备注"""
+    text: str
+    predicate: Optional[Predicate]
+    capsule_refs: FrozenSet[str] = frozenset()
+    uses_echo_count: bool = False
+    # 以关键字开头但无法解析时的原因（按自由备注保存）
+    error: Optional[str] = None
+
+    @property
+    def evaluable(self) -> bool:
+        return self.predicate is not None
+
+
+def _parse_date(text: str) -> datetime:
+    try:
+        value = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        raise ConditionError(f"无效的日期: {text}")
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class _Parser:
+    """递归下降解析器，直接生成闭包"""
+
+    def __init__(self, text: str):
+        self.tokens = self._tokenize(text)
+        self.pos = 0
+        self.capsule_refs = set()
+        self.uses_echo_count = False
+
+    @staticmethod
+    def _tokenize(text: str) -> List[str]:
+        tokens, pos = [], 0
+        text = text.strip()
+        while pos < len(text):
+            match = _TOKEN.match(text, pos)
+            if not match or match.end() == pos:
+                raise ConditionError(f"无法识别的字符: {text[pos:]}")
+            tokens.append((match.group(1) or match.group(2)))
+            pos = match.end()
+        return tokens
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos].lower() if self.pos < len(self.tokens) else None
+
+    def _next(self) -> str:
+        if self.pos >= len(self.tokens):
+            raise ConditionError("条件不完整")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self) -> Predicate:
+        predicate = self._expr()
+        if self.pos != len(self.tokens):
+            raise ConditionError(f"多余的内容: {' '.join(self.tokens[self.pos:])}")
+        return predicate
+
+    def _expr(self) -> Predicate:
+        terms = [self._term()]
+        while self._peek() in ("or", "||"):
+            self._next()
+            terms.append(self._term())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda ctx: any(t(ctx) for t in terms)
+
+    def _term(self) -> Predicate:
+        factors = [self._factor()]
+        while self._peek() in ("and", "&&"):
+            self._next()
+            factors.append(self._factor())
+        if len(factors) == 1:
+            return factors[0]
+        return lambda ctx: all(f(ctx) for f in factors)
+
+    def _factor(self) -> Predicate:
+        token = self._peek()
+        if token in ("not", "!"):
+            self._next()
+            inner = self._factor()
+            return lambda ctx: not inner(ctx)
+        if token == "(":
+            self._next()
+            inner = self._expr()
+            if self._next() != ")":
+                raise ConditionError("缺少右括号")
+            return inner
+        return self._atom()
+
+    def _atom(self) -> Predicate:
+        keyword = self._next().lower()
+        if keyword == "after":
+            moment = _parse_date(self._next())
+            return lambda ctx: ctx.now >= moment
+        if keyword == "before":
+            moment = _parse_date(self._next())
+            return lambda ctx: ctx.now < moment
+        if keyword == "capsule":
+            raw_id = self._next()
+            try:
+                capsule_id = str(UUID(raw_id))
+            except ValueError:
+                raise ConditionError(f"无效的信箱ID: {raw_id}")
+            if self._next().lower() != "unlocked":
+                raise ConditionError("capsule 条件的格式为: capsule <ID> unlocked")
+            self.capsule_refs.add(capsule_id)
+
+            def other_unlocked(ctx: UnlockContext) -> bool:
+                owner, status = ctx.capsules.get(capsule_id, (None, None))
+                return owner == ctx.user_id and status in ("unlocked", "public")
+            return other_unlocked
+        if keyword == "echoes":
+            op = self._next()
+            if op not in _COMPARE:
+                raise ConditionError(f"无效的比较符: {op}")
+            try:
+                threshold = int(self._next())
+            except ValueError:
+                raise ConditionError("echoes 条件需要整数")
+            compare = _COMPARE[op]
+            self.uses_echo_count = True
+            return lambda ctx: compare(ctx.echo_counts.get(ctx.user_id, 0), threshold)
+        raise ConditionError(f"未知的条件: {keyword}")
+
+
+@lru_cache(maxsize=4096)
+def compile_condition(text: Optional[str]) -> CompiledCondition:
+    """编译条件文本，结果按文本缓存；语法错误时抛出ConditionError"""
+    text = (text or "").strip()
+    first = _TOKEN.match(text)
+    if not first or (first.group(1) or first.group(2) or "").lower() not in _KEYWORDS:
+        return CompiledCondition(text, None)
+    parser = _Parser(text)
+    predicate = parser.parse()
+    return CompiledCondition(text, predicate, frozenset(parser.capsule_refs), parser.uses_echo_count)
+
+
+@lru_cache(maxsize=4096)
+def stored_condition(text: Optional[str]) -> CompiledCondition:
+    """编译保存的条件；无法解析的文本按自由备注处理，不自动判断
+
+    创建和更新信箱时调用一次，编译结果缓存，解锁检查时直接复用。
+    """
+    try:
+        return compile_condition(text)
+    except ConditionError as e:
+        return CompiledCondition((text or "").strip(), None, error=str(e))
+
+
+def check_unlock(capsule: dict, ctx: UnlockContext) -> bool:
+    """判断一个信箱现在能否解锁：解锁时间（如有）已到，且条件（如可判断）成立
+
+    两者都没有时不能自动解锁。
+    """
+    condition = stored_condition(capsule.get("unlock_condition"))
+    unlock_date = capsule.get("unlock_date")
+    if unlock_date is None and not condition.evaluable:
+        return False
+    if unlock_date is not None and ctx.now < _parse_date(unlock_date):
+        return False
+    if condition.evaluable:
+        ctx.user_id = str(capsule["user_id"])
+        return condition.predicate(ctx)
+    return True
+
+
+async def evaluate_batch(
+    capsules: Iterable[dict],
+    capsule_repo: TimeCapsuleRepository,
+    echo_repo: EchoWallRepository,
+    now: Optional[datetime] = None
+) -> List[str]:
+    """批量判断，返回可以解锁的信箱ID
+
+    capsules需包含id、user_id、unlock_date和unlock_condition。
+    条件引用的信箱状态和用户呼喊计数各用一次查询取回。
+    """
+    capsules = list(capsules)
+    refs, counted_users = set(), set()
+    for capsule in capsules:
+        condition = stored_condition(capsule.get("unlock_condition"))
+        refs |= condition.capsule_refs
+        if condition.uses_echo_count:
+            counted_users.add(str(capsule["user_id"]))
+
+    ctx = UnlockContext(now=now or datetime.now(timezone.utc))
+    if refs:
+        rows = await capsule_repo.get_statuses(sorted(refs))
+        ctx.capsules = {row["id"]: (str(row["user_id"]), row["status"]) for row in rows}
+    if counted_users:
+        ctx.echo_counts = await echo_repo.count_matched_by_users(sorted(counted_users))
+
+    return [str(capsule["id"]) for capsule in capsules if check_unlock(capsule, ctx)]
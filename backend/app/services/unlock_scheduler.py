@@ -0,0 +1,187 @@
+"""
+时空信箱定时解锁
+
+启动时把尚未解锁的信箱的解锁时间载入最小堆，后台任务一直睡到堆顶的时间点，
+到期后调用unlock_due_capsules按批次做集合更新，不再轮询数据库。
+堆只决定何时醒来：过期的条目（解锁时间被修改或信箱已删除）醒来后不会解锁任何信箱。
+带解锁条件的信箱由条件规则批量判断，除到期唤醒外还按固定间隔检查一次。
+"""
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.repositories import EchoWallRepository, TimeCapsuleRepository
+from app.services.notifications import notify_unlocked
+from app.services.unlock_rules import evaluate_batch
+
+settings = get_settings()
+
+
+def _timestamp(value) -> float:
+    """把解锁时间（datetime或ISO字符串）转为Unix时间戳，无时区时按UTC处理"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class UnlockScheduler:
+    """按解锁时间唤醒的批量解锁任务"""
+
+    def __init__(self):
+        self.batch_size = settings.unlock_batch_size
+        self.max_size = settings.unlock_schedule_max_size
+        self.reload_interval = settings.unlock_reload_interval
+        self.condition_interval = settings.unlock_condition_interval
+        if settings.server_multi_process:
+            # 只有一个进程运行解锁，其他进程创建的信箱要等重新载入才进入堆
+            self.reload_interval = min(self.reload_interval, self.condition_interval)
+        self._heap: List[Tuple[float, str]] = []
+        # 为False表示还有更晚的解锁时间没有载入堆中
+        self.complete = False
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._capsules: Optional[TimeCapsuleRepository] = None
+        self._echoes: Optional[EchoWallRepository] = None
+        # 正在解锁时为True，停止时等这一轮做完
+        self._busy = False
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, capsules: TimeCapsuleRepository, echoes: EchoWallRepository) -> None:
+        """启动后台任务"""
+        if self.running:
+            return
+        self._capsules = capsules
+        self._echoes = echoes
+        self._task = asyncio.create_task(self._run())
+        metrics.register_collector("unlock_scheduler", self.stats)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """停止后台任务：等待中直接取消，正在进行的解锁最多等待timeout秒"""
+        if self._task is None:
+            return
+        self._stopping = True
+        if not self._busy:
+            self._task.cancel()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+        self._task = None
+        self._stopping = False
+
+    def schedule(self, capsule_id: str, unlock_date) -> None:
+        """登记一个信箱的解锁时间（创建或修改解锁时间后调用）"""
+        if unlock_date is None:
+            return
+        due = _timestamp(unlock_date)
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (due, capsule_id))
+        if len(self._heap) > self.max_size:
+            # 堆已满时丢掉最晚的时间，等下次重新载入
+            self._heap.remove(max(self._heap))
+            heapq.heapify(self._heap)
+            self.complete = False
+        if earliest is None or due < earliest:
+            self._wakeup.set()
+
+    async def reload(self) -> None:
+        """从数据库重新载入最早的一批解锁时间"""
+        rows = await self._capsules.list_scheduled(self.max_size + 1)
+        self.complete = len(rows) <= self.max_size
+        self._heap = [(_timestamp(row["unlock_date"]), row["id"]) for row in rows[:self.max_size]]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    async def sweep(self) -> int:
+        """解锁所有已到期的信箱和条件已满足的信箱，返回解锁数量"""
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            heapq.heappop(self._heap)
+        started = time.perf_counter()
+        now_iso = datetime.fromtimestamp(now, timezone.utc).isoformat()
+        unlocked = 0
+        while True:
+            ids = await self._capsules.unlock_due(now_iso, self.batch_size)
+            unlocked += len(ids)
+            await notify_unlocked(self._capsules, ids)
+            if len(ids) < self.batch_size:
+                break
+        unlocked += await self._sweep_conditions(now_iso)
+        metrics.observe("unlock_sweep_seconds", time.perf_counter() - started)
+        metrics.incr("capsules_unlocked_total", unlocked)
+        metrics.set_gauge("unlock_last_sweep_unlocked", unlocked)
+        return unlocked
+
+    async def _sweep_conditions(self, now_iso: str) -> int:
+        """分批取出带解锁条件的信箱，每批判断一次、解锁一次"""
+        now = datetime.fromisoformat(now_iso)
+        unlocked, after_id, checked = 0, None, 0
+        while True:
+            rows = await self._capsules.list_conditional(self.batch_size, after_id)
+            if not rows:
+                break
+            checked += len(rows)
+            ready = await evaluate_batch(rows, self._capsules, self._echoes, now)
+            ids = await self._capsules.unlock_ids(ready, now_iso)
+            unlocked += len(ids)
+            await notify_unlocked(
+                self._capsules, ids, {str(row["id"]): str(row["user_id"]) for row in rows}
+            )
+            if len(rows) < self.batch_size:
+                break
+            after_id = rows[-1]["id"]
+        metrics.set_gauge("unlock_last_conditions_checked", checked)
+        return unlocked
+
+    async def _run(self) -> None:
+        next_reload = 0.0
+        next_conditions = 0.0
+        while not self._stopping:
+            try:
+                now = time.monotonic()
+                if now >= next_reload or (not self._heap and not self.complete):
+                    await self.reload()
+                    next_reload = now + self.reload_interval
+                # 醒来时间：堆顶到期、下次检查条件或重新载入，或有更早的信箱登记进来
+                timeout = min(next_reload, next_conditions) - now
+                if self._heap:
+                    timeout = min(timeout, self._heap[0][0] - time.time())
+                if timeout > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout)
+                        continue
+                    except asyncio.TimeoutError:
+                        pass
+                if time.monotonic() >= next_conditions or (self._heap and self._heap[0][0] <= time.time()):
+                    self._busy = True
+                    try:
+                        await self.sweep()
+                    finally:
+                        self._busy = False
+                    next_conditions = time.monotonic() + self.condition_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"定时解锁失败: {str(e)}")
+                await asyncio.sleep(min(self.reload_interval, 5.0))
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": len(self._heap),
+            "next_unlock_in": max(0.0, self._heap[0][0] - time.time()) if self._heap else None,
+            "complete": self.complete,
+        }
+
+
+unlock_scheduler = UnlockScheduler()
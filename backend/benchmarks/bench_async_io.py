@@ -0,0 +1,111 @@
+"""
+异步数据访问层压测
+
+对比在async处理函数里调用同步supabase客户端（会阻塞事件循环）
+与改用异步仓库层之后的并发吞吐。数据库由本地PostgREST替身模拟。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_async_io --requests 200 --concurrency 50 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark-anon-key")
+
+from uuid import UUID
+
+import httpx
+from fastapi import Depends, FastAPI
+from supabase import Client, ClientOptions, create_client
+
+from app.core.auth import create_access_token, get_current_user_id
+from benchmarks.postgrest_standin import PostgrestStandIn
+
+
+USER_ID = str(uuid.uuid4())
+
+
+def seed(standin: PostgrestStandIn, count: int = 20) -> None:
+    now = datetime.now(timezone.utc).isoformat()
+    standin.seed("echo_wall", [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": USER_ID,
+            "content": "今天有点孤独",
+            "emotion_tag": "lonely",
+            "is_matched": False,
+            "created_at": now,
+        }
+        for _ in range(count)
+    ])
+
+
+def build_blocking_app(standin: PostgrestStandIn) -> FastAPI:
+    """改造前：async处理函数中调用同步客户端"""
+    client: Client = create_client(
+        os.environ["SUPABASE_URL"],
+        os.environ["SUPABASE_ANON_KEY"],
+        options=ClientOptions(httpx_client=httpx.Client(transport=standin.sync_transport())),
+    )
+    app = FastAPI()
+
+    @app.get("/api/echo-wall/my-echoes")
+    async def my_echoes(user_id: UUID = Depends(get_current_user_id)):
+        response = (
+            client.table("echo_wall")
+            .select("*")
+            .eq("user_id", str(user_id))
+            .order("created_at", desc=True)
+            .execute()
+        )
+        return response.data
+
+    return app
+
+
+def build_async_app(standin: PostgrestStandIn) -> FastAPI:
+    """改造后：应用本身，共享连接池接到替身的异步传输层"""
+    from app.core.database import supabase_pool
+    from main import app
+
+    supabase_pool.open(transport=standin.async_transport())
+    return app
+
+
+async def drive(app: FastAPI, total: int, concurrency: int) -> float:
+    """并发请求并返回每秒完成的请求数"""
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': USER_ID})}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        async def one():
+            async with semaphore:
+                response = await client.get("/api/echo-wall/my-echoes")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return total / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟的数据库往返延迟（秒）")
+    args = parser.parse_args()
+
+    for label, builder in (("同步客户端（改造前）", build_blocking_app), ("异步仓库层（改造后）", build_async_app)):
+        standin = PostgrestStandIn(latency=args.latency)
+        seed(standin)
+        rps = await drive(builder(standin), args.requests, args.concurrency)
+        print(f"{label}: {rps:8.1f} req/s  ({standin.request_count} 次数据库往返)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+"""
+认证依赖微基准
+
+同一个令牌被反复使用时，对比get_current_user_id和get_current_user在
+python-jose与PyJWT两种签名验证实现、开启与关闭已验证令牌缓存下的单次耗时。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_auth --iterations 20000
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark-anon-key")
+
+from app.core import auth
+
+
+async def per_call(dependency, token: str, iterations: int) -> float:
+    """返回单次调用的平均耗时（微秒）"""
+    await dependency(token)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await dependency(token)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    user = SimpleNamespace(id=uuid.uuid4(), email="bench@example.com", created_at=datetime.now(timezone.utc))
+    token = auth.create_access_token(auth.user_claims(user))
+    cache_size = auth.token_cache.max_size
+
+    print(f"{'实现':<8}{'令牌缓存':<8}{'get_current_user_id':>22}{'get_current_user':>20}")
+    for backend in ("jose", "pyjwt"):
+        for cached in (False, True):
+            auth.settings.jwt_backend = backend
+            auth.token_cache.max_size = cache_size if cached else 0
+            auth.token_cache.clear()
+            user_id_us = await per_call(auth.get_current_user_id, token, args.iterations)
+            user_us = await per_call(auth.get_current_user, token, args.iterations)
+            label = "开启" if cached else "关闭"
+            print(f"{backend:<10}{label:<10}{user_id_us:>18.1f} µs{user_us:>17.1f} µs")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""
+情感分析基准
+
+对比逐个关键词子串查找的旧实现与预编译正则匹配器，
+分别测试长文本和一万条短呼喊的批量分类，并统计两者结果的一致比例
+（新实现带关键词权重和否定处理，分类结果不要求完全一致）。
+另外检查去掉否定词后，两者找到的关键词完全相同（包括互相重叠的关键词）。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_emotion --posts 10000 --long-length 5000
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark-anon-key")
+
+from app.services.emotion import DEFAULT_LEXICON_PATH, Lexicon, analyze_emotion, analyze_emotions, current_lexicon
+
+KEYWORDS = current_lexicon().keywords()
+
+_FILLER = "今天天气很好我们去公园散步看到了很多人在跑步晚上回家吃饭然后睡觉"
+
+
+def legacy_analyze_emotion(content: str) -> str:
+    """改造前的实现：每次调用重建关键词表，对每个关键词做一次子串查找，不区分权重和否定"""
+    emotion_keywords = {emotion: list(keywords) for emotion, keywords in KEYWORDS.items()}
+    emotion_scores = {}
+    for emotion, keywords in emotion_keywords.items():
+        score = sum(1 for keyword in keywords if keyword in content)
+        if score > 0:
+            emotion_scores[emotion] = score
+    if emotion_scores:
+        return max(emotion_scores, key=emotion_scores.get)
+    return "neutral"
+
+
+# 部分重叠的关键词：开心/心动、难过/过去、梦想/想念，每个都要计入
+OVERLAP_CASES = [
+    ("开心动，爱", {"happy": 1.0, "love": 2.2}),
+    ("难过去了", {"sad": 1.0, "nostalgic": 0.6}),
+    ("梦想念", {"hopeful": 1.0, "nostalgic": 1.0}),
+]
+
+
+def check_overlaps() -> None:
+    """重叠关键词的回归检查：得分与逐个子串查找一致"""
+    lexicon = current_lexicon()
+    for content, expected in OVERLAP_CASES:
+        found = [keyword for keyword in lexicon._keywords if keyword in content]
+        scores = lexicon.scores(content)
+        for keyword in found:
+            emotion = lexicon.emotions[lexicon._keywords[keyword][0]]
+            assert emotion in scores, f"{content}: 漏掉了关键词 {keyword}"
+        assert scores == expected, f"{content}: {scores} != {expected}"
+
+
+def keywords_agree(texts) -> float:
+    """去掉否定词后，新实现与逐个子串查找给出相同各情感得分的比例"""
+    with open(DEFAULT_LEXICON_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    data["negations"] = []
+    lexicon = Lexicon(data)
+    same = 0
+    for text in texts:
+        expected = {}
+        for keyword, (index, weight) in lexicon._keywords.items():
+            if keyword in text:
+                emotion = lexicon.emotions[index]
+                expected[emotion] = expected.get(emotion, 0.0) + weight
+        scores = lexicon.scores(text)
+        same += scores.keys() == expected.keys() and all(abs(scores[e] - expected[e]) < 1e-9 for e in scores)
+    return same / len(texts)
+
+
+def make_text(rng: random.Random, length: int, density: float) -> str:
+    words = [keyword for keywords in KEYWORDS.values() for keyword in keywords]
+    return "".join(
+        rng.choice(words) if rng.random() < density else rng.choice(_FILLER)
+        for _ in range(length)
+    )
+
+
+def timed(func, *args) -> tuple:
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=10000, help="批量测试的短呼喊数量")
+    parser.add_argument("--post-length", type=int, default=60)
+    parser.add_argument("--long-texts", type=int, default=100)
+    parser.add_argument("--long-length", type=int, default=5000)
+    parser.add_argument("--density", type=float, default=0.01, help="文本中关键词出现的概率（按字符）")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    check_overlaps()
+    rng = random.Random(args.seed)
+    posts = [make_text(rng, args.post_length, args.density) for _ in range(args.posts)]
+    long_texts = [make_text(rng, args.long_length, args.density) for _ in range(args.long_texts)]
+
+    for label, texts in ((f"{args.posts} 条短呼喊", posts), (f"{args.long_texts} 篇长文本", long_texts)):
+        old, old_ms = timed(lambda items: [legacy_analyze_emotion(t) for t in items], texts)
+        single, single_ms = timed(lambda items: [analyze_emotion(t) for t in items], texts)
+        batch, batch_ms = timed(analyze_emotions, texts)
+        agree = sum(a == b for a, b in zip(old, batch)) / len(texts)
+        print(
+            f"{label}: 旧实现 {old_ms:8.1f} ms  逐条 {single_ms:8.1f} ms  批量 {batch_ms:8.1f} ms  "
+            f"结果一致 {agree:.1%}  关键词一致（不含否定） {keywords_agree(texts):.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
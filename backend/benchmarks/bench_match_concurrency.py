@@ -0,0 +1,126 @@
+"""
+并发匹配压力测试
+
+大量新呼喊同时匹配（模拟多个工作进程：不使用进程内索引，候选都从数据库查），
+对比改造前无条件写入的create_echo_match与认领式的create_echo_match，
+检查同一条呼喊是否出现在多条匹配记录中，以及认领冲突后是否还留下本可以互相匹配的呼喊。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_match_concurrency --echoes 500 --pool 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import httpx
+
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark-anon-key")
+
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.core.metrics import metrics
+from app.repositories import EchoMatchRepository, EchoWallRepository
+from app.services.emotion import emotion_compatibility
+from app.services.match_index import match_index
+from app.services.matching import try_match_echo
+from benchmarks.postgrest_standin import PostgrestStandIn, install_sql_functions
+
+_TAGS = ["lonely", "understanding", "companionship"]
+
+
+def install_legacy_create(standin: PostgrestStandIn) -> None:
+    """改造前的create_echo_match：不检查is_matched，直接标记并插入"""
+    def create_echo_match(params: dict):
+        ids = {params["p_echo_id"], params["p_matched_echo_id"]}
+        for row in standin.tables.setdefault("echo_wall", []):
+            if row["id"] in ids:
+                row["is_matched"] = True
+        match = {
+            "id": str(uuid.uuid4()),
+            "echo_id": params["p_echo_id"],
+            "matched_echo_id": params["p_matched_echo_id"],
+            "matched_at": datetime.now(timezone.utc).isoformat(),
+        }
+        standin.tables.setdefault("echo_matches", []).append(match)
+        return [match]
+    standin.register_rpc("create_echo_match", create_echo_match)
+
+
+async def run(label: str, legacy: bool, args) -> None:
+    standin = PostgrestStandIn(latency=args.latency)
+    install_sql_functions(standin)
+    if legacy:
+        install_legacy_create(standin)
+    now = datetime.now(timezone.utc).isoformat()
+    standin.seed("echo_wall", [
+        {
+            "id": str(uuid.uuid4()), "user_id": str(uuid.uuid4()), "content": "候选回音",
+            "emotion_tag": random.choice(_TAGS), "is_matched": False, "created_at": now,
+        }
+        for _ in range(args.pool)
+    ])
+    http = httpx.AsyncClient(transport=standin.async_transport())
+    client = AsyncClient(
+        os.environ["SUPABASE_URL"], os.environ["SUPABASE_ANON_KEY"],
+        options=AsyncClientOptions(httpx_client=http),
+    )
+    echoes, matches = EchoWallRepository(client), EchoMatchRepository(client)
+
+    async def new_echo():
+        user_id = str(uuid.uuid4())
+        tag = random.choice(_TAGS)
+        created = await echoes.create({
+            "content": "新的呼喊", "emotion_tag": tag, "user_id": user_id, "is_matched": False,
+        })
+        await try_match_echo(echoes, matches, created["id"], tag, user_id)
+
+    conflicts_before = metrics.snapshot()["counters"].get("match_claim_conflicts_total", 0)
+    started = time.perf_counter()
+    await asyncio.gather(*(new_echo() for _ in range(args.echoes)))
+    elapsed = time.perf_counter() - started
+    await http.aclose()
+
+    rows = standin.tables.get("echo_matches", [])
+    uses = Counter(echo_id for row in rows for echo_id in (row["echo_id"], row["matched_echo_id"]))
+    duplicated = sum(1 for count in uses.values() if count > 1)
+    matched = sum(1 for row in standin.tables["echo_wall"] if row.get("is_matched"))
+    unmatched = [row for row in standin.tables["echo_wall"] if not row.get("is_matched")]
+    # 剩下的呼喊之间不应还有可以互相匹配的（不同用户且标签兼容）
+    stranded = sum(
+        1
+        for i, first in enumerate(unmatched)
+        for second in unmatched[i + 1:]
+        if first["user_id"] != second["user_id"]
+        and emotion_compatibility(first["emotion_tag"], second["emotion_tag"]) > 0
+    )
+    conflicts = metrics.snapshot()["counters"].get("match_claim_conflicts_total", 0) - conflicts_before
+    print(
+        f"{label}: 匹配记录 {len(rows):>5}  已匹配呼喊 {matched:>5}  未匹配呼喊 {len(unmatched):>4}  "
+        f"可配对却未匹配 {stranded:>4}  出现在多条匹配中的呼喊 {duplicated:>4}  认领冲突 {conflicts:>4}  "
+        f"耗时 {elapsed:.2f} s"
+    )
+    if not legacy:
+        assert duplicated == 0, "同一条呼喊出现在多条匹配中"
+        assert stranded == 0, "认领冲突后留下了可以互相匹配的呼喊"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--echoes", type=int, default=500, help="同时匹配的新呼喊数")
+    parser.add_argument("--pool", type=int, default=50, help="初始未匹配呼喊数")
+    parser.add_argument("--latency", type=float, default=0.005, help="模拟的数据库往返延迟（秒）")
+    args = parser.parse_args()
+    # 多个工作进程各自的索引都不完整，候选全部来自数据库
+    match_index.ready = False
+    await run("无条件写入（改造前）", True, args)
+    await run("认领式写入（改造后）", False, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
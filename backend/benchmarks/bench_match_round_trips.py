@@ -0,0 +1,108 @@
+"""
+回音匹配网络往返压测
+
+对比逐标签查询候选 + 插入 + 两次更新的旧流程，与单次in_查询 + 原子RPC的新流程，
+统计每创建一条呼喊的数据库往返次数和耗时。数据库由本地PostgREST替身模拟。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_match_round_trips --echoes 50 --latency 0.01
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark-anon-key")
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.services.emotion import emotion_matches, find_matching_emotion
+from app.services.matching import try_match_echo
+from app.repositories import EchoMatchRepository, EchoWallRepository
+from benchmarks.postgrest_standin import PostgrestStandIn, install_sql_functions
+
+
+def seed(standin: PostgrestStandIn, pool_size: int) -> None:
+    tags = list(emotion_matches().keys()) + [t for v in emotion_matches().values() for t in v]
+    now = datetime.now(timezone.utc).isoformat()
+    standin.seed("echo_wall", [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "content": "候选回音",
+            "emotion_tag": random.choice(tags),
+            "is_matched": False,
+            "created_at": now,
+        }
+        for _ in range(pool_size)
+    ])
+
+
+async def legacy_match(client: AsyncClient, echo_id: str, emotion_tag: str, user_id: str):
+    """改造前的匹配流程：每个标签一次查询，再插入并分别更新双方"""
+    candidates = []
+    for emotion in find_matching_emotion(emotion_tag):
+        response = await (
+            client.table("echo_wall").select("*")
+            .eq("emotion_tag", emotion).eq("is_matched", False)
+            .neq("user_id", user_id).neq("id", echo_id)
+            .limit(10).execute()
+        )
+        candidates.extend(response.data)
+    if candidates:
+        matched = random.choice(candidates)
+        await client.table("echo_matches").insert({"echo_id": echo_id, "matched_echo_id": matched["id"]}).execute()
+        await client.table("echo_wall").update({"is_matched": True}).eq("id", echo_id).execute()
+        await client.table("echo_wall").update({"is_matched": True}).eq("id", matched["id"]).execute()
+
+
+async def run(label: str, batched: bool, args) -> None:
+    standin = PostgrestStandIn(latency=args.latency)
+    install_sql_functions(standin)
+    seed(standin, args.pool)
+    http = httpx.AsyncClient(transport=standin.async_transport())
+    client = AsyncClient(
+        os.environ["SUPABASE_URL"], os.environ["SUPABASE_ANON_KEY"],
+        options=AsyncClientOptions(httpx_client=http),
+    )
+    echoes, matches = EchoWallRepository(client), EchoMatchRepository(client)
+
+    standin.request_count = 0
+    started = time.perf_counter()
+    for _ in range(args.echoes):
+        user_id = str(uuid.uuid4())
+        # 未知标签会回退到全部主标签，是往返最多的情况
+        emotion_tag = random.choice(["neutral", "lonely", "comfort"])
+        created = await echoes.create({
+            "content": "新的呼喊", "emotion_tag": emotion_tag,
+            "user_id": user_id, "is_matched": False,
+        })
+        if batched:
+            await try_match_echo(echoes, matches, created["id"], emotion_tag, user_id)
+        else:
+            await legacy_match(client, created["id"], emotion_tag, user_id)
+    elapsed = time.perf_counter() - started
+    await http.aclose()
+    print(
+        f"{label}: 每条呼喊 {standin.request_count / args.echoes:5.1f} 次往返，"
+        f"{elapsed / args.echoes * 1000:7.1f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--echoes", type=int, default=50)
+    parser.add_argument("--pool", type=int, default=2000, help="初始未匹配呼喊数")
+    parser.add_argument("--latency", type=float, default=0.01, help="模拟的数据库往返延迟（秒）")
+    args = parser.parse_args()
+    await run("逐标签查询（改造前）", False, args)
+    await run("批量查询+RPC（改造后）", True, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
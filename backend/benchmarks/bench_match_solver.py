@@ -0,0 +1,171 @@
+"""
+批量匹配基准与离线模拟
+
+默认测量solve_matching在不同池子大小下的配对数、总权重和求解耗时，较小的池子另外给出不剪枝的参照；
+--simulate 在合成的呼喊流上离线对比逐条贪心匹配（改造前）和不同间隔的定期批量匹配
+（MATCH_MODE=batch），不访问数据库，统计配对数、平均兼容度与相似度、等待时长和最后滞留的呼喊。
+
+用法（在backend目录下，需要NumPy）：
+    python -m benchmarks.bench_match_solver --sizes 1000,5000,20000
+    python -m benchmarks.bench_match_solver --simulate --hours 24 --rate 300 --intervals 5,30
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+from dataclasses import replace
+
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark-anon-key")
+
+from app.services.emotion import current_lexicon, emotion_candidates
+from app.services.match_index import MatchIndex
+from app.services.match_solver import SolverWeights, solve_matching
+from app.services.text_features import decode_features, encode_features, similarity_available
+from benchmarks.bench_similarity import make_text
+
+
+def make_echoes(rng: random.Random, count: int, users: int, start: float, end: float) -> list:
+    """合成呼喊：标签按长尾分布（含neutral），创建时间在[start, end)内均匀分布并排序"""
+    tags = list(current_lexicon().tags) + ["neutral"]
+    tag_weights = [1.0 / (rank + 1) for rank in range(len(tags))]
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    echoes = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": rng.choice(user_ids),
+            "emotion_tag": rng.choices(tags, tag_weights)[0],
+            "features": encode_features(make_text(rng)),
+            "created_at": rng.uniform(start, end),
+        }
+        for _ in range(count)
+    ]
+    echoes.sort(key=lambda echo: echo["created_at"])
+    return echoes
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def bench_sizes(sizes, seed: int, exact_limit: int) -> None:
+    """池子不超过exact_limit时，另外给出不剪枝（保留全部候选边）时的配对数和总权重作为参照"""
+    rng = random.Random(seed)
+    now = time.time()
+    weights = SolverWeights()
+    print(f"{'池子大小':>10}{'配对数':>10}{'总权重':>12}{'求解耗时':>14}{'不剪枝配对数':>14}{'不剪枝总权重':>12}")
+    for size in sizes:
+        echoes = make_echoes(rng, size, max(2, size // 3), now - 86400, now)
+        started = time.perf_counter()
+        pairs = solve_matching(echoes, now, weights)
+        elapsed = time.perf_counter() - started
+        line = f"{size:>12}{len(pairs):>12}{sum(w for _, _, w in pairs):>14.1f}{elapsed * 1000:>14.1f} ms"
+        if size <= exact_limit:
+            full = solve_matching(echoes, now, replace(weights, top_k=size))
+            line += f"{len(full):>16}{sum(w for _, _, w in full):>16.1f}"
+        print(line)
+
+
+class Simulation:
+    """一种匹配策略下的模拟状态"""
+
+    def __init__(self, name: str, interval: float = 0.0):
+        # interval为批量匹配间隔（秒），0表示逐条贪心
+        self.name, self.interval = name, interval
+        self.greedy = interval == 0
+        self.next_solve = interval
+        self.index = MatchIndex(max_size=10 ** 7)
+        self.pool = {}
+        self.pairs = []
+
+    def arrive(self, echo: dict) -> None:
+        if self.greedy:
+            candidate = self.index.pick(emotion_candidates(echo["emotion_tag"]), echo["user_id"])
+            if candidate is not None:
+                self._record(self.pool.pop(candidate), echo, echo["created_at"])
+                return
+            self.index.add(echo["id"], echo["emotion_tag"], echo["user_id"])
+        self.pool[echo["id"]] = echo
+
+    def advance(self, now: float, weights: SolverWeights) -> None:
+        """执行now之前所有到期的批量匹配"""
+        while not self.greedy and self.next_solve <= now:
+            self.solve(self.next_solve, weights)
+            self.next_solve += self.interval
+
+    def solve(self, now: float, weights: SolverWeights) -> None:
+        for first, second, _ in solve_matching(list(self.pool.values()), now, weights):
+            for echo in (first, second):
+                del self.pool[echo["id"]]
+                self.index.discard(echo["id"])
+            self._record(first, second, now)
+
+    def _record(self, first: dict, second: dict, now: float) -> None:
+        self.pairs.append((first, second, now))
+
+    def report(self, end: float) -> None:
+        lexicon = current_lexicon()
+        compat = [lexicon.compatibility(a["emotion_tag"], b["emotion_tag"]) for a, b, _ in self.pairs]
+        similarity = [
+            float(decode_features(a["features"]) @ decode_features(b["features"])) for a, b, _ in self.pairs
+        ]
+        waits = [(t - echo["created_at"]) / 60 for a, b, t in self.pairs for echo in (a, b)]
+        stranded = [(end - echo["created_at"]) / 3600 for echo in self.pool.values()]
+        mean = lambda values: sum(values) / len(values) if values else 0.0
+        print(
+            f"{self.name:<14}配对 {len(self.pairs):>6}  兼容度 {mean(compat):.3f}  相似度 {mean(similarity):.3f}  "
+            f"等待 p50 {percentile(waits, 0.5):6.1f} 分钟 p95 {percentile(waits, 0.95):6.1f} 分钟  "
+            f"滞留 {len(stranded):>5} 条（超过6小时 {sum(1 for h in stranded if h > 6):>5}，"
+            f"最久 {max(stranded, default=0.0):4.1f} 小时）"
+        )
+
+
+def simulate(args) -> None:
+    rng = random.Random(args.seed)
+    start = 0.0
+    end = args.hours * 3600
+    echoes = make_echoes(rng, int(args.hours * args.rate), args.users, start, end)
+    weights = SolverWeights()
+    simulations = [Simulation("逐条贪心")] + [
+        Simulation(f"每{minutes:g}分钟批量", minutes * 60) for minutes in args.intervals
+    ]
+    for echo in echoes:
+        for sim in simulations:
+            sim.advance(echo["created_at"], weights)
+            sim.arrive(echo)
+    for sim in simulations:
+        sim.advance(end, weights)
+    print(f"{len(echoes)} 条呼喊，{args.hours:g} 小时")
+    # 全部呼喊一次性求解（不剪枝、不考虑到达时间）能配出的对数，标签供需不平衡时滞留无法避免
+    offline = solve_matching(echoes, end, replace(weights, top_k=len(echoes)))
+    print(f"参照：全部呼喊一次性求解 配对 {len(offline)}，滞留 {len(echoes) - 2 * len(offline)} 条")
+    for sim in simulations:
+        sim.report(end)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,5000,20000,50000")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--exact-limit", type=int, default=5000, help="不超过该大小的池子另外求不剪枝的解作为参照")
+    parser.add_argument("--simulate", action="store_true")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--rate", type=float, default=300, help="每小时的呼喊数")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--intervals", default="1,10", help="批量匹配间隔（分钟），逗号分隔")
+    args = parser.parse_args()
+    if not similarity_available():
+        raise SystemExit("需要安装NumPy: pip install numpy")
+    if args.simulate:
+        args.intervals = [float(minutes) for minutes in args.intervals.split(",")]
+        simulate(args)
+    else:
+        bench_sizes([int(size) for size in args.sizes.split(",")], args.seed, args.exact_limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+公共列表响应缓存压测
+
+并发请求公共回音廊和最近回音列表，对比不使用缓存、进程内缓存和Redis缓存后端
+（由本地Redis替身模拟）时的吞吐和数据库往返次数，并在压测中途发布新信箱，
+检查失效后能读到新数据。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_response_cache --requests 1000 --concurrency 100 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark-anon-key")
+
+import httpx
+
+from app.core.auth import create_access_token
+from app.core.cache import MemoryBackend, RedisBackend, ResponseCache, get_response_cache
+from app.core.database import supabase_pool
+from benchmarks.postgrest_standin import PostgrestStandIn, install_sql_functions
+from benchmarks.redis_standin import RedisStandIn
+from main import app
+
+USER_ID = str(uuid.uuid4())
+
+
+class _NoCache:
+    """不缓存，每次请求都查询数据库"""
+
+    async def get_or_load(self, namespace, key, loader):
+        return await loader()
+
+    async def invalidate(self, namespace):
+        return None
+
+
+def seed(standin: PostgrestStandIn, count: int = 50) -> str:
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        stamp = (now - timedelta(minutes=i)).isoformat()
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "user_id": USER_ID,
+            "title": f"信箱{i}",
+            "content": "写给未来的自己",
+            "unlock_date": None,
+            "unlock_condition": None,
+            "status": "public",
+            "is_public": True,
+            "created_at": stamp,
+            "updated_at": stamp,
+        })
+    unlocked = dict(rows[0], id=str(uuid.uuid4()), status="unlocked", is_public=False,
+                    updated_at=now.isoformat())
+    standin.seed("time_capsules", rows + [unlocked])
+    standin.seed("echo_wall", [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": USER_ID,
+            "content": "今天有点孤独",
+            "emotion_tag": "lonely",
+            "is_matched": False,
+            "created_at": (now - timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(count)
+    ])
+    return unlocked["id"]
+
+
+async def run(cache, latency: float, total: int, concurrency: int) -> tuple:
+    standin = PostgrestStandIn(latency=latency)
+    install_sql_functions(standin)
+    unlocked_id = seed(standin)
+    supabase_pool.open(transport=standin.async_transport())
+    app.dependency_overrides[get_response_cache] = lambda: cache
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': USER_ID})}"}
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", headers=headers
+        ) as client:
+            async def one(i: int):
+                async with semaphore:
+                    path = "/api/time-capsules/public" if i % 2 else "/api/echo-wall/recent"
+                    response = await client.get(path)
+                    response.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(total // 2)))
+            # 中途发布一个信箱，之后的读取应当包含它
+            response = await client.post(f"/api/time-capsules/{unlocked_id}/publish")
+            response.raise_for_status()
+            await asyncio.gather(*(one(i) for i in range(total // 2, total)))
+            elapsed = time.perf_counter() - started
+
+            public = (await client.get("/api/time-capsules/public")).json()
+            fresh = any(c["id"] == unlocked_id for c in public)
+    finally:
+        app.dependency_overrides.pop(get_response_cache, None)
+        await supabase_pool.close()
+    return total / elapsed, standin.request_count, fresh
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟的数据库往返延迟（秒）")
+    parser.add_argument("--redis-latency", type=float, default=0.001, help="模拟的Redis往返延迟（秒）")
+    args = parser.parse_args()
+
+    redis = RedisStandIn(latency=args.redis_latency)
+    variants = (
+        ("不缓存", _NoCache()),
+        ("进程内缓存", ResponseCache(MemoryBackend(), ttl=5.0, stale_ttl=30.0)),
+        ("Redis缓存（替身）", ResponseCache(RedisBackend(client=redis), ttl=5.0, stale_ttl=30.0)),
+    )
+    for label, cache in variants:
+        rps, round_trips, fresh = await run(cache, args.latency, args.requests, args.concurrency)
+        print(f"{label:<12} {rps:8.1f} req/s  {round_trips:5d} 次数据库往返  发布后可见: {fresh}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
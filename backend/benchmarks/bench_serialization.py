@@ -0,0 +1,144 @@
+"""
+列表响应序列化压测
+
+对1000行的呼喊和信箱列表，分别比较：
+  - 响应模型校验 + FastAPI默认JSONResponse（改造前）
+  - 响应模型校验 + orjson默认响应类
+  - 跳过校验直接用orjson序列化数据库行（trusted_json）
+请求经ASGI传输直接送到应用，不经过网络。另外给出 select("*") 与按响应模型列查询时
+数据库返回的行的JSON大小。orjson未安装时后两项退回标准库json。
+
+注意：较新的FastAPI（0.130+）在未指定响应类时直接用Pydantic把响应模型序列化为JSON字节，
+这时第一项本身已经较快，而设置了默认响应类会退回先转字典再序列化，
+所以应用只在高频列表接口上用trusted_json，不设置全局默认响应类。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_serialization --rows 1000 --requests 200
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import httpx
+from fastapi import APIRouter, FastAPI, Response
+
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark-anon-key")
+
+from app.core.responses import FastJSONResponse, orjson, trusted_json
+from app.repositories.echo_wall import ECHO_PROJECTIONS
+from app.schemas import PublicEchoWall, TimeCapsule
+
+
+def _echo_rows(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "content": "今天的心情有点复杂，想找个人说说话" * 3,
+            "emotion_tag": "lonely",
+            "is_matched": i % 3 == 0,
+            "features": base64.b64encode(os.urandom(128)).decode(),
+            "created_at": (now - timedelta(seconds=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def _capsule_rows(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "title": f"写给一年后的自己 {i}",
+            "content": "亲爱的自己，" + "希望你一切都好。" * 60,
+            "unlock_date": (now + timedelta(days=365)).isoformat(),
+            "unlock_condition": None,
+            "is_public": True,
+            "status": "public",
+            "created_at": (now - timedelta(seconds=i)).isoformat(),
+            "updated_at": (now - timedelta(seconds=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def _router(echoes: List[dict], capsules: List[dict]) -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/echoes", response_model=List[PublicEchoWall])
+    async def validated_echoes():
+        return echoes
+
+    @router.get("/echoes/trusted", response_model=List[PublicEchoWall])
+    async def trusted_echoes(response: Response):
+        return trusted_json(echoes, response)
+
+    @router.get("/capsules", response_model=List[TimeCapsule])
+    async def validated_capsules():
+        return capsules
+
+    @router.get("/capsules/trusted", response_model=List[TimeCapsule])
+    async def trusted_capsules(response: Response):
+        return trusted_json(capsules, response)
+
+    return router
+
+
+async def _measure(app: FastAPI, path: str, requests: int) -> tuple:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.get(path)
+        size = len(response.content)
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get(path)
+        elapsed = time.perf_counter() - started
+    return elapsed / requests * 1000, size
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000, help="每个列表的行数")
+    parser.add_argument("--requests", type=int, default=200, help="每种方式的请求次数")
+    args = parser.parse_args()
+
+    full_echoes = _echo_rows(args.rows)
+    public_columns = [column.strip() for column in ECHO_PROJECTIONS["public"].split(",")]
+    echoes = [{column: row[column] for column in public_columns} for row in full_echoes]
+    capsules = _capsule_rows(args.rows)
+
+    def size_kb(rows):
+        return len(json.dumps(rows, ensure_ascii=False).encode()) / 1024
+
+    print(f"orjson: {'已安装' if orjson is not None else '未安装（退回标准库json）'}")
+    print(f"数据库返回的呼喊 JSON 大小: select(\"*\") {size_kb(full_echoes):.0f} KB, 公共展示列 {size_kb(echoes):.0f} KB")
+
+    default_app = FastAPI()
+    default_app.include_router(_router(echoes, capsules))
+    orjson_app = FastAPI(default_response_class=FastJSONResponse)
+    orjson_app.include_router(_router(echoes, capsules))
+
+    cases = [
+        ("呼喊 校验 + 默认JSONResponse", default_app, "/echoes"),
+        ("呼喊 校验 + orjson", orjson_app, "/echoes"),
+        ("呼喊 跳过校验 + orjson", orjson_app, "/echoes/trusted"),
+        ("信箱 校验 + 默认JSONResponse", default_app, "/capsules"),
+        ("信箱 校验 + orjson", orjson_app, "/capsules"),
+        ("信箱 跳过校验 + orjson", orjson_app, "/capsules/trusted"),
+    ]
+    for label, app, path in cases:
+        mean_ms, size = await _measure(app, path, args.requests)
+        print(f"{label:<26} {args.rows} 行  每次 {mean_ms:7.2f} ms  响应 {size / 1024:6.0f} KB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+服务进程配置压测
+
+分别以当前的单进程方式（uvicorn main:app）和生产配置（python main.py，多工作进程）
+启动后端，用多个压测进程在keep-alive连接上并发请求不依赖数据库的接口，
+对比吞吐和延迟分位数，最后发送SIGTERM记录退出耗时。
+压测进程和服务进程共用本机CPU，核数较少时多进程的收益会被压测端抵消。
+
+用法（在backend目录下）：
+    python -m benchmarks.bench_server --workers 4 --duration 10 --clients 4 --connections 32
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+_PATHS = ["/api/health", "/api/echo-wall/emotions"]
+
+# 压测只访问不依赖数据库的接口，关闭启动时的数据库预热和后台任务
+_ENV = {
+    "SUPABASE_URL": "http://postgrest.local",
+    "SUPABASE_ANON_KEY": "benchmark-anon-key",
+    "MATCH_INDEX_ENABLED": "false",
+    "RECENT_FEED_ENABLED": "false",
+    "UNLOCK_SCHEDULER_ENABLED": "false",
+    "EMOTION_LEXICON_RELOAD_INTERVAL": "0",
+}
+
+
+def _start(profile: str, port: int, workers: int) -> subprocess.Popen:
+    env = {**os.environ, **_ENV}
+    if profile == "single":
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)]
+    else:
+        command = [sys.executable, "main.py"]
+        env.update({
+            "DEBUG": "false",
+            "SERVER_HOST": "127.0.0.1",
+            "SERVER_PORT": str(port),
+            "SERVER_WORKERS": str(workers),
+        })
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _wait_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("服务未在规定时间内启动")
+
+
+async def _client_load(port: int, connections: int, duration: float) -> list:
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    latencies = []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker(index: int):
+            path = _PATHS[index % len(_PATHS)]
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.get(path)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker(i) for i in range(connections)))
+    return latencies
+
+
+def _client_process(port: int, connections: int, duration: float, results) -> None:
+    results.put(asyncio.run(_client_load(port, connections, duration)))
+
+
+def run(profile: str, args) -> None:
+    port = args.port
+    server = _start(profile, port, args.workers)
+    try:
+        _wait_ready(port)
+        results = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(target=_client_process, args=(port, args.connections, args.duration, results))
+            for _ in range(args.clients)
+        ]
+        for process in clients:
+            process.start()
+        latencies = []
+        for _ in clients:
+            latencies += results.get()
+        for process in clients:
+            process.join()
+    finally:
+        started = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutdown = time.perf_counter() - started
+
+    latencies.sort()
+    count = len(latencies)
+    p50 = latencies[count // 2] * 1000 if count else 0.0
+    p99 = latencies[min(count - 1, int(count * 0.99))] * 1000 if count else 0.0
+    label = "单进程 uvicorn main:app" if profile == "single" else f"生产配置 {args.workers} 个工作进程"
+    print(
+        f"{label:<24} 请求 {count:>7}  吞吐 {count / args.duration:>8.0f} req/s  "
+        f"p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  退出耗时 {shutdown:.2f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="生产配置的工作进程数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每种配置的压测时长（秒）")
+    parser.add_argument("--clients", type=int, default=2, help="压测进程数")
+    parser.add_argument("--connections", type=int, default=32, help="每个压测进程的并发连接数")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    run("single", args)
+    run("production", args)
+
+
+if __name__ == "__main__":
+    main()
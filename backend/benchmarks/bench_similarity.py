@@ -0,0 +1,91 @@
+"""
+按内容相似度挑选候选的基准
+
+在内存索引中放入大量未匹配呼喊（带文本特征），测量一次挑选的耗时：
+按标签权重+相似度在全部可匹配标签下打分，与只按标签和先后顺序挑选对比。
+每次挑选后把选中的呼喊放回索引，保持池子大小不变。
+
+用法（在backend目录下，需要NumPy）：
+    python -m benchmarks.bench_similarity --pool 100000 --picks 2000
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark-anon-key")
+
+from app.services.emotion import current_lexicon, emotion_candidates
+from app.services.match_index import MatchIndex
+from app.services.text_features import encode_features, similarity_available
+
+_WORDS = [
+    "今天", "一个人", "加班", "下雨", "想家", "考试", "失眠", "朋友", "妈妈", "毕业",
+    "工作", "分手", "旅行", "夜晚", "城市", "猫", "咖啡", "地铁", "海边", "未来",
+    "开心", "难过", "孤独", "紧张", "感谢", "希望", "后悔", "想念", "温暖", "迷茫",
+]
+
+
+def make_text(rng: random.Random) -> str:
+    return "".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 12)))
+
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def run(index: MatchIndex, rows: dict, queries, with_features: bool) -> list:
+    timings = []
+    for tag, user_id, features, _ in queries:
+        candidates = emotion_candidates(tag)
+        started = time.perf_counter()
+        picked = index.pick(candidates, user_id, (), features if with_features else None)
+        timings.append((time.perf_counter() - started) * 1000)
+        if picked is not None:
+            index.add(picked, *rows[picked])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pool", type=int, default=100000)
+    parser.add_argument("--picks", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if not similarity_available():
+        raise SystemExit("需要安装NumPy: pip install numpy")
+
+    rng = random.Random(args.seed)
+    tags = current_lexicon().tags
+    index = MatchIndex(max_size=args.pool)
+    started = time.perf_counter()
+    rows = {}
+    for _ in range(args.pool):
+        echo_id = str(uuid.uuid4())
+        rows[echo_id] = (rng.choice(tags), str(uuid.uuid4()), encode_features(make_text(rng)))
+        index.add(echo_id, *rows[echo_id])
+    print(f"载入 {args.pool} 条呼喊（含特征计算）: {time.perf_counter() - started:.1f} s")
+
+    queries = [
+        (rng.choice(tags), str(uuid.uuid4()), encode_features(text), text)
+        for text in (make_text(rng) for _ in range(args.picks))
+    ]
+    started = time.perf_counter()
+    for _, _, _, text in queries:
+        encode_features(text)
+    encode_us = (time.perf_counter() - started) / len(queries) * 1e6
+    print(f"单条呼喊特征计算: {encode_us:.0f} µs")
+
+    for label, with_features in (("按标签和先后顺序", False), ("标签权重+相似度", True)):
+        timings = run(index, rows, queries, with_features)
+        print(
+            f"{label}: 平均 {sum(timings) / len(timings):6.2f} ms  "
+            f"p50 {percentile(timings, 0.5):6.2f} ms  p99 {percentile(timings, 0.99):6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
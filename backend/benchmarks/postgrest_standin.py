@@ -0,0 +1,350 @@
+"""
+本地PostgREST替身
+
+用内存表模拟PostgREST的常用过滤、排序、分页和RPC语义，
+通过httpx的MockTransport挂到Supabase客户端上，并可注入固定网络延迟，
+用于在没有真实数据库的环境下压测。
+"""
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+import httpx
+
+
+def _text(value) -> str:
+    """把行内的值转为PostgREST查询参数里的文本形式"""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _split_top_level(expr: str) -> List[str]:
+    """按顶层逗号拆分，忽略括号内的逗号"""
+    parts, depth, current = [], 0, ""
+    for ch in expr:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _match(row: dict, column: str, condition: str) -> bool:
+    negate = condition.startswith("not.")
+    if negate:
+        condition = condition[4:]
+    op, _, operand = condition.partition(".")
+    operand = operand.strip('"') if op != "in" else operand
+    value = _text(row.get(column))
+    if op == "eq":
+        result = value == operand
+    elif op == "neq":
+        result = value != operand
+    elif op in ("gt", "gte", "lt", "lte"):
+        if row.get(column) is None:
+            result = False
+        else:
+            result = {
+                "gt": value > operand,
+                "gte": value >= operand,
+                "lt": value < operand,
+                "lte": value <= operand,
+            }[op]
+    elif op == "in":
+        options = [o.strip('"') for o in _split_top_level(operand.strip("()"))]
+        result = value in options
+    elif op == "is":
+        result = value == operand
+    else:
+        raise ValueError(f"unsupported operator: {op}")
+    return not result if negate else result
+
+
+def _match_or(row: dict, expr: str) -> bool:
+    # 只去掉最外层的一对括号，末尾的and(...)需要保留自己的右括号
+    if expr.startswith("(") and expr.endswith(")"):
+        expr = expr[1:-1]
+    for part in _split_top_level(expr):
+        if part.startswith("and("):
+            if all(_match_and_part(row, p) for p in _split_top_level(part[4:-1])):
+                return True
+        elif _match_and_part(row, part):
+            return True
+    return False
+
+
+def _match_and_part(row: dict, part: str) -> bool:
+    column, _, condition = part.partition(".")
+    return _match(row, column, condition)
+
+
+class PostgrestStandIn:
+    """内存版PostgREST"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[dict]] = {}
+        self.functions: Dict[str, Callable[[dict], object]] = {}
+        # 计算列（以表的行为参数的数据库函数）：表名 -> 列名 -> 函数
+        self.computed: Dict[str, Dict[str, Callable[[dict], object]]] = {}
+        self.request_count = 0
+
+    def seed(self, table: str, rows: List[dict]) -> None:
+        """批量写入初始数据"""
+        self.tables.setdefault(table, []).extend(rows)
+
+    def register_rpc(self, name: str, func: Callable[[dict], object]) -> None:
+        """注册一个RPC函数，参数为请求体字典"""
+        self.functions[name] = func
+
+    def register_computed(self, table: str, name: str, func: Callable[[dict], object]) -> None:
+        """注册一个计算列，参数为行字典"""
+        self.computed.setdefault(table, {})[name] = func
+
+    # ---------- 查询执行 ----------
+    def _filter(self, table: str, params: List[tuple]) -> List[dict]:
+        rows = self.tables.setdefault(table, [])
+        reserved = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+        for key, value in params:
+            if key in reserved:
+                continue
+            if key == "or":
+                rows = [r for r in rows if _match_or(r, value)]
+            else:
+                rows = [r for r in rows if _match(r, key, value)]
+        return rows
+
+    def _project(self, table: str, rows: List[dict], select: Optional[str]) -> List[dict]:
+        if not select or select == "*":
+            return [dict(r) for r in rows]
+        columns = []
+        for column in _split_top_level(select):
+            # 嵌入资源在替身中忽略
+            if "(" in column:
+                continue
+            if column == "*":
+                return [dict(r) for r in rows]
+            columns.append(column.split(":")[-1])
+        computed = self.computed.get(table, {})
+        return [
+            {c: computed[c](r) if c in computed else r.get(c) for c in columns}
+            for r in rows
+        ]
+
+    @staticmethod
+    def _order(rows: List[dict], order: Optional[str]) -> List[dict]:
+        if not order:
+            return rows
+        for term in reversed(order.split(",")):
+            parts = term.split(".")
+            column, desc = parts[0], "desc" in parts[1:]
+            rows = sorted(rows, key=lambda r: _text(r.get(column)), reverse=desc)
+        return rows
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """处理一个PostgREST请求"""
+        self.request_count += 1
+        path = request.url.path
+        params = parse_qsl(request.url.query.decode(), keep_blank_values=True)
+        query = dict(params)
+        body = json.loads(request.content) if request.content else None
+
+        if "/rpc/" in path:
+            name = path.rsplit("/", 1)[-1]
+            if name not in self.functions:
+                return httpx.Response(404, json={"message": f"function {name} not found"})
+            return httpx.Response(200, json=self.functions[name](body or {}))
+
+        table = path.rsplit("/", 1)[-1]
+        if request.method == "POST":
+            rows = body if isinstance(body, list) else [body]
+            created = []
+            for row in rows:
+                row = dict(row)
+                row.setdefault("id", str(uuid.uuid4()))
+                now = datetime.now(timezone.utc).isoformat()
+                row.setdefault("created_at", now)
+                if table == "echo_matches":
+                    row.setdefault("matched_at", now)
+                if table == "time_capsules":
+                    row.setdefault("updated_at", now)
+                self.tables.setdefault(table, []).append(row)
+                created.append(dict(row))
+            return self._respond(request, self._project(table, created, query.get("select")), 201)
+
+        matched = self._filter(table, params)
+        if request.method == "PATCH":
+            for row in matched:
+                row.update(body or {})
+            return self._respond(request, self._project(table, matched, query.get("select")))
+        if request.method == "DELETE":
+            ids = {id(r) for r in matched}
+            self.tables[table] = [r for r in self.tables[table] if id(r) not in ids]
+            return self._respond(request, self._project(table, matched, query.get("select")))
+
+        rows = self._order(matched, query.get("order"))
+        offset = int(query.get("offset", 0))
+        if "limit" in query:
+            rows = rows[offset:offset + int(query["limit"])]
+        else:
+            rows = rows[offset:]
+        return self._respond(request, self._project(table, rows, query.get("select")))
+
+    @staticmethod
+    def _respond(request: httpx.Request, rows: List[dict], status: int = 200) -> httpx.Response:
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            if len(rows) != 1:
+                return httpx.Response(406, json={
+                    "code": "PGRST116",
+                    "message": "JSON object requested, multiple (or no) rows returned",
+                    "details": f"Results contain {len(rows)} rows",
+                    "hint": None,
+                })
+            return httpx.Response(status, json=rows[0])
+        return httpx.Response(status, json=rows)
+
+    # ---------- 传输层 ----------
+    def async_transport(self) -> httpx.MockTransport:
+        """异步传输层，延迟通过asyncio.sleep模拟"""
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self.handle(request)
+        return httpx.MockTransport(handler)
+
+    def sync_transport(self) -> httpx.MockTransport:
+        """同步传输层，延迟通过time.sleep模拟（会阻塞调用线程）"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            if self.latency:
+                time.sleep(self.latency)
+            return self.handle(request)
+        return httpx.MockTransport(handler)
+
+
+def install_sql_functions(standin: PostgrestStandIn) -> None:
+    """注册sql/目录下数据库函数的内存实现"""
+    def create_echo_match(params: dict):
+        ids = {params["p_echo_id"], params["p_matched_echo_id"]}
+        claimed = [
+            row for row in standin.tables.setdefault("echo_wall", [])
+            if row["id"] in ids and not row.get("is_matched")
+        ]
+        if len(ids) < 2 or len(claimed) < 2:
+            return []
+        for row in claimed:
+            row["is_matched"] = True
+        match = {
+            "id": str(uuid.uuid4()),
+            "echo_id": params["p_echo_id"],
+            "matched_echo_id": params["p_matched_echo_id"],
+            "matched_at": datetime.now(timezone.utc).isoformat(),
+        }
+        standin.tables.setdefault("echo_matches", []).append(match)
+        return [match]
+
+    def create_echo_matches(params: dict):
+        echoes = {row["id"]: row for row in standin.tables.setdefault("echo_wall", [])}
+        created = []
+        for pair in params["p_pairs"]:
+            first, second = echoes.get(pair["echo_id"]), echoes.get(pair["matched_echo_id"])
+            if not first or not second or first.get("is_matched") or second.get("is_matched"):
+                continue
+            first["is_matched"] = second["is_matched"] = True
+            created.append({
+                "id": str(uuid.uuid4()),
+                "echo_id": pair["echo_id"],
+                "matched_echo_id": pair["matched_echo_id"],
+                "matched_at": datetime.now(timezone.utc).isoformat(),
+            })
+        standin.tables.setdefault("echo_matches", []).extend(created)
+        return created
+
+    def get_user_echo_matches(params: dict):
+        user_id = params["p_user_id"]
+        echoes = {row["id"]: row for row in standin.tables.setdefault("echo_wall", [])}
+        cursor = (params.get("p_cursor_matched_at"), params.get("p_cursor_id"))
+
+        def embed(echo: dict):
+            if not params.get("p_embed"):
+                return None
+            columns = ["id", "content", "emotion_tag", "is_matched", "created_at"]
+            if echo["user_id"] == user_id:
+                columns.append("user_id")
+            return {column: echo.get(column) for column in columns}
+
+        rows = []
+        for match in standin.tables.setdefault("echo_matches", []):
+            first, second = echoes[match["echo_id"]], echoes[match["matched_echo_id"]]
+            if user_id not in (first["user_id"], second["user_id"]):
+                continue
+            if cursor[0] and (match["matched_at"], match["id"]) >= cursor:
+                continue
+            rows.append({**match, "echo": embed(first), "matched_echo": embed(second)})
+        rows.sort(key=lambda m: (m["matched_at"], m["id"]), reverse=True)
+        return rows[:params.get("p_limit", 50)]
+
+    def unlock_due_capsules(params: dict):
+        now = params.get("p_now") or datetime.now(timezone.utc).isoformat()
+        due = sorted(
+            (row for row in standin.tables.setdefault("time_capsules", [])
+             if row.get("status") == "locked" and row.get("unlock_date") and not row.get("unlock_condition")
+             and datetime.fromisoformat(row["unlock_date"]) <= datetime.fromisoformat(now)),
+            key=lambda row: row["unlock_date"]
+        )[:params.get("p_limit", 500)]
+        for row in due:
+            row["status"] = "unlocked"
+            row["updated_at"] = now
+        return [row["id"] for row in due]
+
+    def count_matched_echoes(params: dict):
+        counts: Dict[str, int] = {}
+        for row in standin.tables.setdefault("echo_wall", []):
+            if row["user_id"] in params["p_user_ids"] and row.get("is_matched"):
+                counts[row["user_id"]] = counts.get(row["user_id"], 0) + 1
+        return [{"user_id": user_id, "matched": count} for user_id, count in counts.items()]
+
+    def update_capsule_checked(params: dict):
+        rows = [r for r in standin.tables.setdefault("time_capsules", []) if r["id"] == params["p_capsule_id"]]
+        if not rows:
+            return [{"outcome": "not_found", "capsule": None}]
+        row = rows[0]
+        if row["user_id"] != params["p_user_id"]:
+            return [{"outcome": "forbidden", "capsule": None}]
+        expected = params.get("p_expected_status")
+        due_before = params.get("p_due_before")
+        if (expected is not None and row["status"] not in expected) or (
+            due_before is not None and (
+                row.get("unlock_condition") or not row.get("unlock_date")
+                or datetime.fromisoformat(row["unlock_date"]) > datetime.fromisoformat(due_before)
+            )
+        ):
+            return [{"outcome": "wrong_state", "capsule": dict(row)}]
+        row.update(params.get("p_changes") or {})
+        return [{"outcome": "ok", "capsule": dict(row)}]
+
+    standin.register_rpc("create_echo_match", create_echo_match)
+    standin.register_rpc("create_echo_matches", create_echo_matches)
+    standin.register_rpc("get_user_echo_matches", get_user_echo_matches)
+    standin.register_rpc("unlock_due_capsules", unlock_due_capsules)
+    standin.register_rpc("count_matched_echoes", count_matched_echoes)
+    standin.register_rpc("update_capsule_checked", update_capsule_checked)
+
+    def content_preview(row: dict):
+        content = row.get("content") or ""
+        return content[:100] + "…" if len(content) > 100 else content
+
+    standin.register_computed("time_capsules", "content_preview", content_preview)
@@ -0,0 +1,54 @@
+"""
+本地Redis替身
+
+实现RedisBackend用到的get/set(px=)/incr/aclose子集，值按bytes保存，
+并可注入固定网络延迟，用于在没有Redis实例的环境下验证和压测Redis缓存后端。
+"""
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+
+class RedisStandIn:
+    """内存版的redis.asyncio.Redis子集"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.command_count = 0
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+
+    async def _round_trip(self) -> None:
+        self.command_count += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _live(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        await self._round_trip()
+        return self._live(key)
+
+    async def set(self, key: str, value, px: Optional[int] = None) -> bool:
+        await self._round_trip()
+        if isinstance(value, str):
+            value = value.encode()
+        expires_at = time.monotonic() + px / 1000 if px else None
+        self._data[key] = (expires_at, value)
+        return True
+
+    async def incr(self, key: str) -> int:
+        await self._round_trip()
+        value = int(self._live(key) or 0) + 1
+        self._data[key] = (None, str(value).encode())
+        return value
+
+    async def aclose(self) -> None:
+        self._data.clear()
@@ -1,23 +1,87 @@
 """
 FastAPI主应用入口
 """
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 from app.core.config import get_settings
+from app.core.cache import response_cache
+from app.core.database import supabase_pool, get_supabase_client
+from app.core.metrics import metrics
+from app.core.pagination import NEXT_CURSOR_HEADER, SINCE_CURSOR_HEADER
+from app.core.server import acquire_background_lock, server_options
 from app.api.endpoints import auth, time_capsules, echo_wall
+from app.repositories import EchoWallRepository, EchoMatchRepository, TimeCapsuleRepository
+from app.services.emotion import watch_lexicon
+from app.services.match_solver import batch_matcher
+from app.services.match_worker import match_worker
+from app.services.match_index import match_index
+from app.services.recent_feed import recent_feed
+from app.services.unlock_scheduler import unlock_scheduler
 
 # 获取配置
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时建立共享连接池和后台任务，关闭时释放"""
+    supabase_pool.open()
+    client = get_supabase_client()
+    echoes = EchoWallRepository(client)
+    background = []
+    if settings.match_index_enabled:
+        try:
+            await match_index.reconcile(echoes)
+        except Exception as e:
+            print(f"匹配索引预热失败: {str(e)}")
+        background.append(asyncio.create_task(
+            match_index.run_consistency_checks(echoes, settings.match_index_check_interval)
+        ))
+    if settings.recent_feed_enabled:
+        try:
+            await recent_feed.load(echoes)
+        except Exception as e:
+            print(f"最近回音载入失败: {str(e)}")
+        background.append(asyncio.create_task(
+            recent_feed.run_refresh(echoes, settings.recent_feed_refresh_interval)
+        ))
+    if settings.emotion_lexicon_reload_interval > 0:
+        background.append(asyncio.create_task(watch_lexicon(settings.emotion_lexicon_reload_interval)))
+    if settings.match_mode == "worker":
+        match_worker.start(echoes, EchoMatchRepository(client))
+    # 多个工作进程时，批量匹配和定时解锁只在取得文件锁的进程运行
+    leader = acquire_background_lock()
+    if settings.match_mode == "batch" and leader:
+        batch_matcher.start(echoes, EchoMatchRepository(client))
+    if settings.unlock_scheduler_enabled and leader:
+        unlock_scheduler.start(TimeCapsuleRepository(client), echoes)
+    try:
+        yield
+    finally:
+        # 先让后台匹配和解锁做完手上的工作，再关闭连接池
+        await asyncio.gather(
+            match_worker.stop(settings.background_drain_timeout),
+            batch_matcher.stop(settings.background_drain_timeout),
+            unlock_scheduler.stop(settings.background_drain_timeout),
+        )
+        for task in background:
+            task.cancel()
+        await response_cache.close()
+        await supabase_pool.close()
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="回响 - 时空信箱与情感回音壁应用",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    lifespan=lifespan
 )
 
 # 配置CORS
@@ -27,6 +91,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, SINCE_CURSOR_HEADER],
 )
 
 # 注册API路由
@@ -60,11 +125,13 @@ async def health_check():
     }
 
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """运行指标"""
+    return metrics.snapshot()
+
+
 if __name__ == "__main__":
+    # DEBUG=true时单进程自动重载，否则按生产配置启动多个工作进程
     import uvicorn
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=settings.debug
-    )
\ No newline at end of file
+    uvicorn.run("main:app", **server_options())
\ No newline at end of file
@@ -0,0 +1,52 @@
+-- 时空信箱的条件更新
+-- 在 Supabase SQL Editor 中执行，后端通过 PostgREST 的 /rpc 调用
+
+-- 在一次调用中完成“检查归属和状态 + 更新”，返回结果类型和更新后的行：
+--   ok           更新成功，capsule 为更新后的行
+--   not_found    信箱不存在
+--   forbidden    信箱不属于该用户
+--   wrong_state  状态不满足 p_expected_status，或未到 p_due_before 指定的解锁时间；capsule 为当前行
+-- p_changes 中出现的列才会被修改
+create or replace function public.update_capsule_checked(
+    p_capsule_id uuid,
+    p_user_id uuid,
+    p_changes jsonb,
+    p_expected_status text[] default null,
+    p_due_before timestamptz default null
+)
+returns table (
+    outcome text,
+    capsule jsonb
+)
+language plpgsql
+as $$
+declare
+    v_row public.time_capsules;
+begin
+    update public.time_capsules c
+       set (title, content, unlock_date, unlock_condition, is_public, status, updated_at) = (
+           select r.title, r.content, r.unlock_date, r.unlock_condition, r.is_public, r.status, r.updated_at
+             from jsonb_populate_record(c, p_changes) r
+       )
+     where c.id = p_capsule_id
+       and c.user_id = p_user_id
+       and (p_expected_status is null or c.status = any(p_expected_status))
+       and (p_due_before is null or (c.unlock_date <= p_due_before and c.unlock_condition is null))
+    returning c.* into v_row;
+
+    if found then
+        return query select 'ok'::text, to_jsonb(v_row);
+        return;
+    end if;
+
+    -- 只有失败时才需要区分原因，仍在同一次调用内完成
+    select * into v_row from public.time_capsules where id = p_capsule_id;
+    if not found then
+        return query select 'not_found'::text, null::jsonb;
+    elsif v_row.user_id <> p_user_id then
+        return query select 'forbidden'::text, null::jsonb;
+    else
+        return query select 'wrong_state'::text, to_jsonb(v_row);
+    end if;
+end;
+$$;
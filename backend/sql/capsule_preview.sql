@@ -0,0 +1,14 @@
+-- 信箱列表摘要模式（view=summary）使用的内容预览
+-- 在 Supabase SQL Editor 中执行；以表的行为参数的函数在 PostgREST 中作为计算列，
+-- 可以直接写在 select 里（select=id,title,content_preview），完整内容按需单独获取
+
+create or replace function public.content_preview(c public.time_capsules)
+returns text
+language sql
+immutable
+as $$
+    select case
+               when char_length(c.content) > 100 then left(c.content, 100) || '…'
+               else c.content
+           end;
+$$;
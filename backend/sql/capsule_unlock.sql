@@ -0,0 +1,55 @@
+-- 时空信箱定时解锁相关的数据库函数与索引
+-- 在 Supabase SQL Editor 中执行，后端通过 PostgREST 的 /rpc 调用
+
+-- 批量解锁到期且没有附加条件的信箱：一次集合更新最多处理 p_limit 个，返回被解锁的信箱ID
+-- 带 unlock_condition 的信箱由后端的条件规则批量判断后再解锁
+-- skip locked 使多个后端进程同时清扫时互不阻塞，也不会重复解锁
+create or replace function public.unlock_due_capsules(
+    p_now timestamptz default now(),
+    p_limit integer default 500
+)
+returns setof uuid
+language sql
+as $$
+    update public.time_capsules c
+       set status = 'unlocked',
+           updated_at = p_now
+     where c.id in (
+           select id
+             from public.time_capsules
+            where status = 'locked'
+              and unlock_date <= p_now
+              and unlock_condition is null
+            order by unlock_date
+            limit p_limit
+              for update skip locked
+       )
+    returning c.id;
+$$;
+
+-- 一次查询统计多个用户被匹配到的呼喊数量（解锁条件 echoes >= N 使用）
+create or replace function public.count_matched_echoes(
+    p_user_ids uuid[]
+)
+returns table (
+    user_id uuid,
+    matched integer
+)
+language sql
+stable
+as $$
+    select e.user_id, count(*)::integer
+      from public.echo_wall e
+     where e.user_id = any(p_user_ids)
+       and e.is_matched
+     group by e.user_id;
+$$;
+
+-- 启动时加载待解锁时间、清扫到期信箱都按 unlock_date 做索引范围扫描
+create index if not exists time_capsules_locked_unlock_date_idx
+    on public.time_capsules (unlock_date)
+    where status = 'locked' and unlock_date is not null;
+
+create index if not exists time_capsules_locked_condition_idx
+    on public.time_capsules (id)
+    where status = 'locked' and unlock_condition is not null;
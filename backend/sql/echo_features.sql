@@ -0,0 +1,4 @@
+-- 呼喊文本特征（字符n元组哈希向量，int8量化后base64编码，见 app/services/text_features.py）
+-- 在 Supabase SQL Editor 中执行；已有的呼喊没有特征，匹配时只按情感标签权重参与排序
+
+alter table public.echo_wall add column if not exists features text;
@@ -0,0 +1,149 @@
+-- 回音匹配相关的数据库函数
+-- 在 Supabase SQL Editor 中执行，后端通过 PostgREST 的 /rpc 调用
+
+-- 认领两条仍未匹配的呼喊并创建匹配记录，在同一事务内完成
+-- 先按ID顺序锁定双方（已被其他事务锁定的跳过，不等待），任一方已匹配或没能锁定时不创建，返回空集
+-- 多个工作进程同时选中同一条呼喊时只有一个能成功，不会产生重复的匹配记录
+create or replace function public.create_echo_match(
+    p_echo_id uuid,
+    p_matched_echo_id uuid
+)
+returns setof public.echo_matches
+language plpgsql
+as $$
+declare
+    v_claimed integer;
+begin
+    if p_echo_id = p_matched_echo_id then
+        return;
+    end if;
+
+    select count(*) into v_claimed
+      from (
+          select id
+            from public.echo_wall
+           where id in (p_echo_id, p_matched_echo_id)
+             and is_matched = false
+           order by id
+             for update skip locked
+      ) claimed;
+    if v_claimed < 2 then
+        return;
+    end if;
+
+    update public.echo_wall
+       set is_matched = true
+     where id in (p_echo_id, p_matched_echo_id);
+
+    return query
+    insert into public.echo_matches (echo_id, matched_echo_id)
+    values (p_echo_id, p_matched_echo_id)
+    returning *;
+end;
+$$;
+
+-- 批量匹配一次写入多对，p_pairs 为 [{"echo_id": ..., "matched_echo_id": ...}, ...]
+-- 锁定仍未匹配的呼喊（已被其他事务锁定的跳过），只写入双方都锁定成功的配对
+create or replace function public.create_echo_matches(p_pairs jsonb)
+returns setof public.echo_matches
+language sql
+as $$
+    with pairs as (
+        select (p->>'echo_id')::uuid as echo_id,
+               (p->>'matched_echo_id')::uuid as matched_echo_id
+          from jsonb_array_elements(p_pairs) as t(p)
+    ),
+    locked as (
+        select id
+          from public.echo_wall
+         where id in (select echo_id from pairs union all select matched_echo_id from pairs)
+           and is_matched = false
+           for update skip locked
+    ),
+    valid as (
+        select pairs.*
+          from pairs
+         where echo_id in (select id from locked)
+           and matched_echo_id in (select id from locked)
+    ),
+    marked as (
+        update public.echo_wall
+           set is_matched = true
+         where id in (select echo_id from valid union all select matched_echo_id from valid)
+    )
+    insert into public.echo_matches (echo_id, matched_echo_id)
+    select echo_id, matched_echo_id from valid
+    returning *;
+$$;
+
+-- 一次查询取出某用户参与的全部匹配（按 matched_at, id 倒序的游标分页）
+-- p_embed 为 true 时附带双方回音的展示列（不含 features 等内部列），对方回音不包含 user_id
+create or replace function public.get_user_echo_matches(
+    p_user_id uuid,
+    p_limit integer default 50,
+    p_cursor_matched_at timestamptz default null,
+    p_cursor_id uuid default null,
+    p_embed boolean default false
+)
+returns table (
+    id uuid,
+    echo_id uuid,
+    matched_echo_id uuid,
+    matched_at timestamptz,
+    echo jsonb,
+    matched_echo jsonb
+)
+language sql
+stable
+as $$
+    -- 按 echo_id 和 matched_echo_id 分别走索引各取一页再合并，避免对两张表的 or 条件做全表扫描
+    with mine as (
+        select id from public.echo_wall where user_id = p_user_id
+    ),
+    page as (
+        (select m.id, m.echo_id, m.matched_echo_id, m.matched_at
+           from public.echo_matches m
+          where m.echo_id in (select id from mine)
+            and (p_cursor_matched_at is null or (m.matched_at, m.id) < (p_cursor_matched_at, p_cursor_id))
+          order by m.matched_at desc, m.id desc
+          limit p_limit)
+        union all
+        (select m.id, m.echo_id, m.matched_echo_id, m.matched_at
+           from public.echo_matches m
+          where m.matched_echo_id in (select id from mine)
+            and m.echo_id not in (select id from mine)
+            and (p_cursor_matched_at is null or (m.matched_at, m.id) < (p_cursor_matched_at, p_cursor_id))
+          order by m.matched_at desc, m.id desc
+          limit p_limit)
+        order by matched_at desc, id desc
+        limit p_limit
+    )
+    select p.id,
+           p.echo_id,
+           p.matched_echo_id,
+           p.matched_at,
+           case when p_embed then
+               jsonb_build_object(
+                   'id', e1.id, 'content', e1.content, 'emotion_tag', e1.emotion_tag,
+                   'is_matched', e1.is_matched, 'created_at', e1.created_at
+               ) || case when e1.user_id = p_user_id then jsonb_build_object('user_id', e1.user_id) else '{}'::jsonb end
+           end,
+           case when p_embed then
+               jsonb_build_object(
+                   'id', e2.id, 'content', e2.content, 'emotion_tag', e2.emotion_tag,
+                   'is_matched', e2.is_matched, 'created_at', e2.created_at
+               ) || case when e2.user_id = p_user_id then jsonb_build_object('user_id', e2.user_id) else '{}'::jsonb end
+           end
+      from page p
+      join public.echo_wall e1 on e1.id = p.echo_id
+      join public.echo_wall e2 on e2.id = p.matched_echo_id
+     order by p.matched_at desc, p.id desc;
+$$;
+
+create index if not exists echo_wall_user_id_idx on public.echo_wall (user_id);
+-- 两个分支各自按 (matched_at, id) 倒序取一页
+create index if not exists echo_matches_echo_id_matched_at_idx
+    on public.echo_matches (echo_id, matched_at desc, id desc);
+create index if not exists echo_matches_matched_echo_id_matched_at_idx
+    on public.echo_matches (matched_echo_id, matched_at desc, id desc);
+create index if not exists echo_matches_matched_at_id_idx on public.echo_matches (matched_at desc, id desc);
@@ -0,0 +1,15 @@
+-- 列表接口游标分页所需的索引
+-- 排序键与 (created_at/updated_at, id) 倒序一致，使每页查询都是索引范围扫描
+
+create index if not exists time_capsules_user_created_idx
+    on public.time_capsules (user_id, created_at desc, id desc);
+
+create index if not exists time_capsules_public_updated_idx
+    on public.time_capsules (updated_at desc, id desc)
+    where is_public and status = 'public';
+
+create index if not exists echo_wall_user_created_idx
+    on public.echo_wall (user_id, created_at desc, id desc);
+
+create index if not exists echo_wall_created_idx
+    on public.echo_wall (created_at desc, id desc);